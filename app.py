@@ -1,531 +1,966 @@
 import os
-from flask import Flask, render_template, request
+import time
+from itertools import zip_longest
+
+import click
+from flask import (
+    Blueprint, Flask, Response, abort, get_template_attribute, jsonify, redirect, render_template,
+    request, url_for,
+)
 from dotenv import load_dotenv
 
-load_dotenv()
-app = Flask(__name__)
+import assets
+from debate_engine import (
+    ASK_OPTION, COMPARE_CHOICES, COMPARE_OPTION, GENERAL_CHALLENGER_OPTIONS,
+    STEP_FIELDS, DebateEngine, MoveError, StepView,
+    build_step, compute_role_labels, current_role_labels, determine_turn_state,
+    pick_active_index,
+)
+from debate_store import MemoryDebateStore, new_debate, open_store
+from events import EventBroker
+from export import FORMATS, export_store
+from history import History
+import metrics
+from pervasion import PervasionIndex
+from propositions import CommitmentIndex
+from relations import RelationIndex
+from replay import debates_cli
+from rooms import RoomError, clean_room_names, open_room_registry
+from search import MAX_LIMIT, QueryError, open_search_index
+import sharding
+from sharding import shards
+from state_token import BadSignature, StateTokens
+from transcript import TranscriptCache, preface_lines, step_lines
+
+bp = Blueprint("debates", __name__)
 
 # ------------------------------------------------------------
-# Constants
+# Form posts
 # ------------------------------------------------------------
-TSAR_OPTION       = "Tsar! [You contradicted yourself!]"
-ADMIT_OPT         = "I admit that I contradicted myself"
-DENY_OPT          = "I do not admit that I contradicted myself"
-ASK_OPTION        = "Ask a question"
-COMPARE_OPTION    = "Compare phenomena"
-NEW_CONSEQ_OPT    = "Write a new consequence"
-WHY_OPTION        = "Why?"
+def rehydrate_steps(form):
+    """Rebuild every step from a full form post (no stored debate)."""
+    steps = []
+    step_count = int(form.get("step_count", 1))
+    for i in range(step_count):
+        steps.append(build_step({
+            field: form.get(f"{field}_{i}", default).strip()
+            for field, default in STEP_FIELDS.items()
+        }))
+    return steps
+
+
+def postback_fields(step, in_panel=False):
+    """The raw fields the rendered page posts back for ``step``.
+
+    Mirrors templates/index.html: inputs that the card (or the Turn Panel,
+    when ``in_panel``) doesn't render post nothing and fall back to their
+    defaults, and selects post "" when the stored value isn't an option.
+    """
+    if step.role_switch:
+        return dict(STEP_FIELDS, role_switch="1")
+    f = step.form_fields()
+
+    mode = determine_turn_state(step)["mode"] if in_panel else ""
+    choice = step.challenger_choice
+    menu_shown = (step.challenger_options and not step.need_reason) or mode == "challenger_menu"
+    compare_shown = bool(step.compare_a and step.compare_b) and \
+        (choice == COMPARE_OPTION or step.compare_locked)
+
+    if f["copula"] not in ("is", "are"):
+        f["copula"] = "is"
+    if f["defender_choice"] not in [label for label, _ in step.defender_explanations]:
+        f["defender_choice"] = ""
+    if not (menu_shown and choice in step.challenger_options):
+        f["challenger_choice"] = ""
+    if not (step.need_reason or (menu_shown and choice and choice not in GENERAL_CHALLENGER_OPTIONS)):
+        f["challenger_reason"] = ""
+    if not f["question_text"]:
+        f["answer_text"] = ""
+    if not (choice == COMPARE_OPTION or compare_shown):
+        f["compare_a"] = f["compare_b"] = ""
+    locked_card = step.compare_locked and mode != "compare_choice"
+    if not (compare_shown and (f["compare_option"] in COMPARE_CHOICES or locked_card)):
+        f["compare_option"] = ""
+    if not (compare_shown and mode != "compare_choice"):
+        f["compare_locked"] = "0"
+    return f
+
+
+def token_inputs(step):
+    """The fields templates/_cards.html renders as inputs for ``step`` (in
+    its card or the Turn Panel) when the page carries a state token.
+
+    In token mode that page renders no hidden bookkeeping inputs: the flags,
+    locked diagrams and decided Tsars come from the signed token alone, so a
+    posted value for any other field is ignored.
+    """
+    if step.role_switch:
+        return ()
+    fields = {"subject", "copula", "predicate", "reason"}
+    choice = step.challenger_choice
+    if step.defender_explanations:
+        fields.add("defender_choice")
+    if step.need_reason:
+        fields.add("challenger_reason")
+    if choice == ASK_OPTION or step.question_text or step.answer_text:
+        fields.add("question_text")
+        if step.question_text:
+            fields.add("answer_text")
+    if choice == COMPARE_OPTION and not (step.compare_a and step.compare_b):
+        fields.update(("compare_a", "compare_b"))
+    if choice == COMPARE_OPTION and step.compare_a and step.compare_b and not step.compare_locked:
+        fields.add("compare_option")
+    if step.contradiction_options:
+        fields.add("contradiction_choice")
+    if step.challenger_options and not step.need_reason:
+        fields.add("challenger_choice")
+        if choice and choice not in GENERAL_CHALLENGER_OPTIONS:
+            fields.add("challenger_reason")
+    return fields
+
+
+def apply_form_delta(steps, form, replay=(), panel=-1, editable=None):
+    """Overlay the posted "<field>_<i>" keys onto stored steps.
+
+    ``replay`` lists the steps whose rendering changed on the last response;
+    for those, fields the page no longer rendered are dropped just as a full
+    form post would drop them. With ``editable`` (step -> the fields a post
+    may set, see token_inputs) any other posted field is ignored. Only steps
+    that received fields or lost some are rebuilt, and the set of their
+    indices is returned.
+    """
+    posted = {}
+    for key in form.keys():
+        field, _, idx = key.rpartition("_")
+        if field in STEP_FIELDS and idx.isdigit() and int(idx) < len(steps):
+            if editable is not None and field not in editable(steps[int(idx)]):
+                continue
+            posted.setdefault(int(idx), {})[field] = form.get(key, "").strip()
+
+    touched = set()
+    for i in set(posted) | {i for i in replay if i < len(steps)}:
+        stored = steps[i].form_fields()
+        merged = postback_fields(steps[i], i == panel) if i in replay else dict(stored)
+        merged.update(posted.get(i, {}))
+        if i in posted or merged != stored:
+            steps[i] = build_step(merged)
+            touched.add(i)
+    return touched
+
+
+# Set up by create_app(). DEBATE_STORE=token leaves the store, index and
+# room registry None.
+debate_store = None
+search_index = None
+room_registry = None
+state_tokens = None
+broker = EventBroker()
+
+
+def engine_for(debate, changed=()):
+    """A DebateEngine over a stored debate, reusing its cached TurnIndex."""
+    engine = DebateEngine(debate["steps"], debate["flipped"], changed, index=debate.get("_index"))
+    debate["_index"] = engine.index
+    return engine
+
+
+def history_for(debate):
+    """The debate's History (see history.py), started from its current steps."""
+    history = debate.get("_history")
+    if history is None:
+        history = debate["_history"] = History(debate["steps"])
+    return history
+
+
+def transcript_cache(debate):
+    cache = debate.get("_transcript")
+    if cache is None:
+        cache = debate["_transcript"] = TranscriptCache()
+    return cache
+
+
+def commitment_index(debate, dirty=()):
+    """The debate's CommitmentIndex, re-filing the steps in ``dirty``."""
+    index = debate.get("_commitments")
+    if index is None:
+        index = debate["_commitments"] = CommitmentIndex()
+    return index.update(debate["steps"], dirty)
+
+
+def pervasion_index(debate, dirty=()):
+    """The debate's PervasionIndex, re-filing the steps in ``dirty``."""
+    index = debate.get("_pervasions")
+    if index is None:
+        index = debate["_pervasions"] = PervasionIndex()
+    return index.update(debate["steps"], dirty)
+
+
+def relation_index(debate, dirty=()):
+    """The debate's RelationIndex, re-checking the steps in ``dirty``."""
+    index = debate.get("_relations")
+    if index is None:
+        index = debate["_relations"] = RelationIndex()
+    return index.update(debate["steps"], dirty)
+
+
+def annotate_turn(debate, turn, i):
+    """``turn`` plus what the indexes say about step ``i``: the Tsar to
+    suggest if the defender just contradicted an earlier answer, whether
+    the consequence is circular or has established consequences, and what
+    earlier Compare diagrams imply for this one."""
+    steps = debate["steps"]
+    if turn["mode"] == "challenger_menu":
+        found = commitment_index(debate).tsar_suggestion(steps, i)
+        if found:
+            turn["contradiction"] = found
+    if turn["mode"] in ("defender_choice", "challenger_menu"):
+        turn.update(pervasion_index(debate).hints(steps[i]))
+    if turn["mode"] in ("compare_choice", "challenger_menu"):
+        turn.update(relation_index(debate).hints(steps[i], i))
+    return turn
+
+
+def load_debate_or_404(debate_id):
+    if debate_store is None:
+        abort(404)
+    debate = debate_store.load(debate_id)
+    if debate is None:
+        abort(404)
+    return debate
+
+
+def load_state_or_400(token):
+    """The debate a token-mode page posted back (None before the first move)."""
+    if not token:
+        return None
+    try:
+        return state_tokens.loads(token)
+    except BadSignature:
+        abort(400, "The debate state was modified or signed with another key")
+
+
+def save_debate(debate_id, debate, dirty, panel, event="move"):
+    """Persist a move's dirty steps, re-index them for search and return the debate id.
+
+    Also remembers which cards the next response renders differently
+    (``replay``) and which step sits in the Turn Panel (``panel``, -1 when
+    there is none) so the next delta post can be replayed against them.
+    Watching pages get ``event``: "move" patches the changed cards in,
+    "reload" makes them fetch the page again.
+    """
+    debate["replay"] = sorted((dirty | {panel, debate.get("panel", -1)}) - {-1})
+    debate["panel"] = panel
+    if state_tokens is not None:
+        return ""  # page_context() puts the debate into the page instead
+    history_for(debate).commit(debate["steps"], dirty)
+    if not debate_id:
+        debate_id = debate_store.create(debate, shards.new_id())
+        with metrics.phase("index"):
+            search_index.update(debate_id, debate["steps"])
+        return debate_id
+    debate_store.save(debate_id, debate, dirty=dirty)
+    with metrics.phase("index"):
+        search_index.update(debate_id, debate["steps"], dirty)
+    if broker.has_subscribers(debate_id):
+        with metrics.phase("publish"):
+            data = move_event(debate_id, debate) if event == "move" else {"rev": debate["rev"]}
+            broker.publish(debate_id, debate["rev"], event, data)
+    watchers = watch_channel(debate_id)
+    if broker.has_subscribers(watchers):
+        with metrics.phase("publish"):
+            data = watch_event(debate) if event == "move" else {"rev": debate["rev"]}
+            broker.publish(watchers, debate["rev"], event, data)
+    return debate_id
+
+
+def checkout(debate_id, debate, version):
+    """Make a History version the debate's current steps, and save that."""
+    steps = debate["steps"]
+    restored = version.steps.tolist()
+    dirty = {i for i, st in enumerate(restored) if i >= len(steps) or steps[i] is not st}
+    steps[:] = restored
+    compute_role_labels(steps, debate["flipped"])
+    # The derived indexes only ever re-file or append steps; rebuild them
+    for key in ("_index", "_commitments", "_pervasions", "_relations"):
+        debate.pop(key, None)
+    transcript_cache(debate).invalidate(dirty)
+    save_debate(debate_id, debate, dirty, engine_for(debate).active_index(), event="reload")
+
+
+def apply_history_action(debate_id, debate, action, name="", step=None):
+    """Undo, redo, switch to branch ``name`` or fork a new one (at step
+    index ``step``, or at the current version). Returns False when there
+    was nothing to do; raises ValueError for a bad branch or step."""
+    history = history_for(debate)
+    if action == "undo":
+        version = history.undo()
+    elif action == "redo":
+        version = history.redo()
+    elif action == "switch":
+        version = history.switch(name) if name and name != history.branch else None
+    elif action == "fork":
+        version = history.fork(name or history.new_branch_name(), step)
+    else:
+        raise ValueError(f"Unknown history action: {action!r}")
+    if version is None:
+        return False
+    checkout(debate_id, debate, version)
+    return True
+
+
+def move_event(debate_id, debate):
+    """What the other player's page needs after a move: the changed cards."""
+    steps = debate["steps"]
+    current_idx = engine_for(debate).active_index()
+    current_cha_lab, current_def_lab = current_role_labels(steps, debate["flipped"])
+    context = page_context(debate_id, debate, "", current_idx, current_cha_lab, current_def_lab)
+    return render_fragments(debate, context)
+
+
+def render_fragments(debate, context):
+    """The cards listed in ``replay`` and the turn bar, rendered for patching."""
+    step_card = get_template_attribute("_cards.html", "step_card")
+    turnbar = get_template_attribute("_cards.html", "turnbar")
+    steps = context["steps"]
+    current_idx = context["current_idx"]
+    turn_state = context["turn_state"]
+    transcript = context["transcript"]
+    return dict(
+        rev=debate["rev"],
+        turn=dict(turn_state, index=current_idx, player=context["turn_player"]),
+        cards=[
+            [i, str(step_card(steps[i], i, i == current_idx, turn_state, transcript))]
+            for i in debate["replay"] if i < len(steps)
+        ],
+        turnbar=str(turnbar(steps[current_idx], current_idx, turn_state,
+                            context["current_cha_lab"], context["current_def_lab"],
+                            transcript, context["debate_id"], context["history"])),
+        step_count=len(steps),
+    )
+
 
 # ------------------------------------------------------------
-# Helpers
+# Tournament rooms
 # ------------------------------------------------------------
-def build_defender_explanations(subject, predicate, reason, copula):
-    if subject and predicate and not reason:
-        return [("I accept", ""), (WHY_OPTION, "")]
-    if subject and predicate and reason:
-        return [
-            ("I accept", ""),
-            ("The reason is not established", f"({subject} {copula} not {reason})"),
-            ("There is no pervasion",
-             f"(Whoever or whatever {copula} {reason} is not necessarily {predicate})"),
-            ("I don't know this right now / That is an improper consequence", ""),
-        ]
-    return []
-
-
-def build_challenger_options(choice, subject, predicate, reason, copula):
-    base = []
-    if choice == "The reason is not established":
-        base = [
-            f"{subject} {copula} {reason}, because of being…",
-            f"{subject} {copula} not {reason}, because of being…",
-        ]
-    elif choice == "There is no pervasion":
-        base = [
-            f"Whoever or whatever {copula} {reason} is necessarily {predicate}, because of being…",
-            f"Whoever or whatever {copula} {reason} is not necessarily {predicate}, because of being…",
-        ]
-    if choice:
-        base.extend([ASK_OPTION, COMPARE_OPTION, NEW_CONSEQ_OPT, TSAR_OPTION])
-    return base
-
-
-def general_challenger_options():
-    return [ASK_OPTION, COMPARE_OPTION, NEW_CONSEQ_OPT, TSAR_OPTION]
-
-
-def make_transcript(steps, preface=""):
-    lines = []
-    if preface.strip():
-        lines.append("Preface / Discussion Summary:")
-        lines.append(preface.strip())
-        lines.append("")
-
-    for idx, st in enumerate(steps, 1):
-        # Role-switch marker line
-        if st.get("role_switch") == "1":
-            lines.append(f"— Roles switched: From here on, {st['switch_to_cha']} and {st['switch_to_def']}.")
+def watch_channel(debate_id):
+    """The broker channel of a room's spectators; players stream on the debate id."""
+    return ("watch", debate_id)
+
+
+def watch_event(debate):
+    """What a spectator's page needs after a move: the changed cards, read-only."""
+    steps = debate["steps"]
+    watch_card = get_template_attribute("_cards.html", "watch_card")
+    watch_status = get_template_attribute("_cards.html", "watch_status")
+    turn = engine_for(debate).turn_state()
+    return dict(
+        rev=debate["rev"],
+        turn=turn,
+        cards=[
+            [i, str(watch_card(i, step_lines(i + 1, steps[i]), i == turn["index"]))]
+            for i in debate["replay"] if i < len(steps)
+        ],
+        status=str(watch_status(turn, len(steps))),
+        step_count=len(steps),
+    )
+
+
+def room_view(room, debate):
+    """A room with its live state, as the room list and /api/rooms show it."""
+    steps = debate["steps"]
+    debate_id = room["id"]
+    return dict(
+        room,
+        rev=debate["rev"],
+        step_count=len(steps),
+        turn=engine_for(debate).turn_state(),
+        players=broker.subscriber_count(debate_id),
+        spectators=broker.subscriber_count(watch_channel(debate_id)),
+        watch_url=url_for("debates.watch_room", debate_id=debate_id),
+        player_urls=[url_for("debates.debate_page", debate_id=debate_id, player=p) for p in (1, 2)],
+    )
+
+
+def local_rooms(tournament=None):
+    """The rooms this shard owns."""
+    views = []
+    for room in room_registry.list(tournament):
+        if shards.owner(room["id"]) != shards.index:
             continue
+        debate = debate_store.load(room["id"])
+        if debate is not None:  # the memory store forgets debates on restart
+            views.append(room_view(room, debate))
+    return views
 
-        cha = st.get("cha_label", "Player 1 (Challenger)")
-        deff = st.get("def_label", "Player 2 (Defender)")
-
-        # Consequence
-        if st["subject"] and st["predicate"] and st["reason"]:
-            lines.append(f"{idx}. It follows that {st['subject']} {st['copula']} "
-                         f"{st['predicate']}, because of being {st['reason']}.")
-        elif st["subject"] and st["predicate"] and not st["reason"]:
-            lines.append(f"{idx}. It follows that {st['subject']} {st['copula']} {st['predicate']} (reason pending).")
-
-        # Defender response
-        if st["defender_choice"]:
-            lines.append(f"   {deff}: {st['defender_choice']}")
-
-        # Why? pending
-        if st["need_reason"] == "1" and not st["reason"]:
-            lines.append(f"   {cha}: (awaiting completion of the reason)")
-
-        # Ask — persist regardless of later moves
-        if st.get("question_text") or st.get("answer_text"):
-            if st.get("question_text"):
-                lines.append(f"   {cha} — Question: {st['question_text']}")
-            if st.get("answer_text"):
-                lines.append(f"   {deff} — Answer: {st['answer_text']}")
-
-        # Generic challenger follow-ups (not Tsar/Ask)
-        if st["challenger_choice"] and st["challenger_choice"] not in [TSAR_OPTION, ASK_OPTION]:
-            msg = st["challenger_choice"]
-            if st["challenger_reason"]:
-                msg += f" — because of being {st['challenger_reason']}"
-            lines.append(f"   {cha}: {msg}")
-
-        # Compare — persist regardless of later moves
-        if st["compare_a"] or st["compare_b"]:
-            lines.append(f"   {cha} — Compare: "
-                         f"What is the relationship between {st['compare_a']} and {st['compare_b']}?")
-        if st["compare_option"]:
-            lines.append(f"   {deff} — Diagram choice: {st['compare_option']}")
-
-        # Tsar — persist regardless of later moves
-        if st.get("tsar_called") == "1" or st["challenger_choice"] == TSAR_OPTION or st["contradiction_choice"]:
-            lines.append(f"   {cha}: Tsar! You contradicted yourself.")
-            if st["contradiction_choice"]:
-                lines.append(f"   {deff}: {st['contradiction_choice']}")
-
-    return lines
-
-
-def determine_turn_state(st):
-    if st.get("role_switch") == "1":
-        return {"who": "challenger", "mode": "role_flip_marker", "label": "Roles switched"}
-
-    if st.get("need_reason") == "1" and not st["reason"]:
-        return {"who": "challenger", "mode": "need_reason", "label": "Complete the reasoning"}
-
-    if st["challenger_choice"] == ASK_OPTION:
-        if not st["question_text"]:
-            return {"who": "challenger", "mode": "ask_question", "label": "Ask a question"}
-        if st["question_text"] and not st["answer_text"]:
-            return {"who": "defender", "mode": "answer_question", "label": "Answer the question"}
-        return {"who": "challenger", "mode": "challenger_menu", "label": "Choose next move"}
-
-    if st["challenger_choice"] == COMPARE_OPTION:
-        if not (st["compare_a"] and st["compare_b"]):
-            return {"who": "challenger", "mode": "compare_names", "label": "Enter items to compare"}
-        if not st["compare_option"]:
-            return {"who": "defender", "mode": "compare_choice", "label": "Choose a diagram"}
-        return {"who": "challenger", "mode": "challenger_menu", "label": "Choose next move"}
-
-    if st["challenger_choice"] == TSAR_OPTION:
-        if not st["contradiction_choice"]:
-            return {"who": "defender", "mode": "tsar_decide", "label": "Admit or deny the Tsar"}
-        return {"who": "challenger", "mode": "challenger_menu", "label": "Choose next move"}
-
-    if not st["subject"] and not st["predicate"] and not st["reason"]:
-        return {"who": "challenger", "mode": "new_consequence", "label": "Propose a consequence"}
-
-    if st["subject"] and st["predicate"] and not st["defender_choice"]:
-        return {"who": "defender", "mode": "defender_choice", "label": "Respond to the consequence"}
-
-    if st["defender_choice"]:
-        if st["challenger_choice"] and (st["challenger_choice"] not in [ASK_OPTION, COMPARE_OPTION, TSAR_OPTION, NEW_CONSEQ_OPT]) and not st["challenger_reason"]:
-            return {"who": "challenger", "mode": "challenger_menu", "label": "Complete the reasoning"}
-        return {"who": "challenger", "mode": "challenger_menu", "label": "Choose next move"}
-
-    return {"who": "challenger", "mode": "new_consequence", "label": "Propose a consequence"}
-
-
-def pick_active_index(steps):
-    priority = [
-        "need_reason",
-        "ask_question",
-        "answer_question",
-        "compare_names",
-        "compare_choice",
-        "tsar_decide",
-        "defender_choice",
-        "new_consequence",
-        "challenger_menu",
-    ]
-    for mode in priority:
-        for i in range(len(steps) - 1, -1, -1):
-            if determine_turn_state(steps[i])["mode"] == mode:
-                return i
-    for i in range(len(steps) - 1, -1, -1):
-        if determine_turn_state(steps[i])["mode"] != "role_flip_marker":
-            return i
-    return max(0, len(steps) - 1)
-
-
-def compute_role_labels(steps, initial_flipped_flag):
-    base_flip = 1 if (initial_flipped_flag == "1") else 0
-    parity = base_flip
-    for st in steps:
-        if parity == 0:
-            cha = "Player 1 (Challenger)"
-            deff = "Player 2 (Defender)"
-        else:
-            cha = "Player 2 (Challenger)"
-            deff = "Player 1 (Defender)"
-        st["cha_label"] = cha
-        st["def_label"] = deff
-        st["effective_flipped"] = "1" if parity == 1 else "0"
-
-        if st.get("role_switch") == "1":
-            next_parity = parity ^ 1
-            if next_parity == 0:
-                to_cha = "Player 1 becomes Challenger"
-                to_def = "Player 2 becomes Defender"
-            else:
-                to_cha = "Player 2 becomes Challenger"
-                to_def = "Player 1 becomes Defender"
-            st["switch_to_cha"] = to_cha
-            st["switch_to_def"] = to_def
 
-        if st.get("role_switch") == "1":
-            parity ^= 1
+def all_rooms(tournament=None):
+    """Every shard's rooms, oldest first."""
+    rooms = local_rooms(tournament)
+    if shards.count > 1:
+        query = {"local": 1} if tournament is None else {"local": 1, "tournament": tournament}
+        for result in sharding.gather(url_for("debates.api_rooms", **query)):
+            rooms.extend(result["rooms"])
+        rooms.sort(key=lambda room: (room["created"], room["id"]))
+    return rooms
 
-    if parity == 0:
-        return "Player 1 (Challenger)", "Player 2 (Defender)"
-    else:
-        return "Player 2 (Challenger)", "Player 1 (Defender)"
+
+def create_room(name, tournament="", flipped="0", preface=""):
+    """Start a debate and register it as a room; raises RoomError for a bad name."""
+    name, tournament = clean_room_names(name, tournament)
+    steps = [build_step({})]
+    compute_role_labels(steps, flipped)
+    debate = new_debate(steps, flipped=flipped, preface=preface)
+    debate_id = save_debate("", debate, {0}, -1)
+    return room_view(room_registry.create(debate_id, name, tournament), debate)
+
+
+def rooms_or_404():
+    if room_registry is None:
+        abort(404)
+    return room_registry
 
 
 # ------------------------------------------------------------
-# Route
+# Routes
 # ------------------------------------------------------------
-@app.route("/", methods=["GET", "POST"])
-def home():
-    steps, transcript = [], ""
-    flipped_initial = "0"
-    preface_text = ""
-
-    if request.method == "POST":
-        flipped_initial = request.form.get("flipped", "0")
-        preface_text = request.form.get("preface_text", "").strip()
-
-        step_count = int(request.form.get("step_count", 1))
-        did_submit_continue = "submit_continue" in request.form
-        wants_transcript = "generate_transcript" in request.form
-        wants_return = "close_transcript" in request.form
-        did_switch_roles = "switch_roles" in request.form
-
-        # Rehydrate
-        for i in range(step_count):
-            g = lambda field, default="": request.form.get(f"{field}_{i}", default).strip()
-
-            subject, copula = g("subject"), g("copula", "is")
-            predicate, reason = g("predicate"), g("reason")
-
-            defender_choice     = g("defender_choice")
-            challenger_choice   = g("challenger_choice")
-            challenger_reason   = g("challenger_reason")
-
-            contradiction_choice = g("contradiction_choice")
-
-            # Ask
-            question_text = g("question_text")
-            answer_text   = g("answer_text")
-
-            # Compare
-            compare_a      = g("compare_a")
-            compare_b      = g("compare_b")
-            compare_option = g("compare_option")
-            compare_locked = g("compare_locked")
-
-            # Tsar persistence flag
-            tsar_called = g("tsar_called", "0")
-            if challenger_choice == TSAR_OPTION or contradiction_choice:
-                tsar_called = "1"
-
-            # "Why?"
-            need_reason = g("need_reason", "0")
-            if defender_choice == WHY_OPTION and not reason:
-                need_reason = "1"
-
-            # Role switch marker
-            role_switch = g("role_switch", "0")
-
-            defender_expl = build_defender_explanations(subject, predicate, reason, copula)
-
-            # Base challenger options
-            challenger_opts = []
-            if defender_choice and need_reason != "1":
-                challenger_opts = build_challenger_options(defender_choice, subject, predicate, reason, copula)
-
-            # Special flows surface general menu when resolved
-            if need_reason != "1":
-                if (challenger_choice == ASK_OPTION and question_text and answer_text) or \
-                   (challenger_choice == COMPARE_OPTION and compare_a and compare_b and compare_option) or \
-                   (challenger_choice == TSAR_OPTION and contradiction_choice) or \
-                   (defender_choice == "I accept"):
-                    challenger_opts = general_challenger_options()
-
-            steps.append({
-                "subject": subject, "copula": copula,
-                "predicate": predicate, "reason": reason,
-                "consequence": (
-                    f"It follows that {subject} {copula} {predicate}, because of being {reason}."
-                    if subject and predicate and reason else ""
-                ),
-
-                "defender_choice": defender_choice,
-                "defender_explanations": defender_expl,
-
-                "challenger_options": challenger_opts,
-                "challenger_choice": challenger_choice,
-                "challenger_reason": challenger_reason,
-
-                # Tsar
-                "contradiction_options": (
-                    [ADMIT_OPT, DENY_OPT]
-                    if challenger_choice == TSAR_OPTION and not contradiction_choice else []
-                ),
-                "contradiction_choice": contradiction_choice,
-                "tsar_called": tsar_called,
-
-                # Ask
-                "question_text": question_text,
-                "answer_text": answer_text,
-
-                # Compare
-                "compare_a": compare_a,
-                "compare_b": compare_b,
-                "compare_option": compare_option,
-                "compare_locked": compare_locked,
-
-                # Why?
-                "need_reason": need_reason,
-
-                # Role switch marker
-                "role_switch": role_switch,
-            })
-
-        # 🔎 Determine which step was actually active on this submit
-        active_idx = pick_active_index(steps)
-        cur = steps[active_idx] if steps else None
-
-        # --- Per-turn transitions (apply to the active step, not just the last) ---
-        if cur:
-            # Complete "Why?"
-            if cur["need_reason"] == "1" and cur["challenger_reason"]:
-                cur["reason"] = cur["challenger_reason"].strip()
-                cur["need_reason"] = "0"
-                cur["consequence"] = (
-                    f"It follows that {cur['subject']} {cur['copula']} {cur['predicate']}, "
-                    f"because of being {cur['reason']}."
-                )
-                cur["defender_choice"] = ""
-                cur["defender_explanations"] = build_defender_explanations(
-                    cur["subject"], cur["predicate"], cur["reason"], cur["copula"]
-                )
-                cur["challenger_choice"] = ""
-                cur["challenger_options"] = []
-
-            # Compare: lock when submitted (to persist choice/diagram)
-            compare_done = (
-                cur["challenger_choice"] == COMPARE_OPTION
-                and bool(cur["compare_a"]) and bool(cur["compare_b"])
-                and bool(cur["compare_option"])
+def handle_post(form, debate_id="", debate=None, player=""):
+    """Apply one form post to ``debate`` and return (debate_id, debate, page context).
+
+    Without a debate (the first move, before anything is stored) the post
+    must be a full form, which is rehydrated into a new one.
+    """
+    did_submit_continue = "submit_continue" in form
+    wants_transcript = "generate_transcript" in form
+    wants_return = "close_transcript" in form
+    did_switch_roles = "switch_roles" in form
+    transcript = ""
+
+    # Apply only what this move posted to a stored debate;
+    # fall back to a full rehydrate when there is nothing stored.
+    with metrics.phase("apply"):
+        if debate is not None:
+            if debate_store is not None:
+                history_for(debate)  # so this move can be undone
+            steps = debate["steps"]
+            if "preface_text" in form:
+                debate["preface"] = form["preface_text"].strip()
+            touched = apply_form_delta(steps, form, debate.get("replay", ()), debate.get("panel", -1),
+                                       editable=token_inputs if state_tokens is not None else None)
+        else:
+            if state_tokens is not None:
+                # Nothing signed yet: the first page's inputs on a fresh step
+                steps = [build_step({})]
+                apply_form_delta(steps, form, editable=token_inputs)
+            else:
+                steps = rehydrate_steps(form) or [build_step({})]
+            debate = new_debate(
+                steps,
+                flipped=form.get("flipped", "0"),
+                preface=form.get("preface_text", "").strip(),
             )
-            if compare_done and did_submit_continue:
-                cur["compare_locked"] = "1"
-                if cur["need_reason"] != "1":
-                    cur["challenger_options"] = general_challenger_options()
-
-            # Ask answered -> general menu (keep Q/A)
-            if cur["challenger_choice"] == ASK_OPTION and cur["answer_text"] and cur["need_reason"] != "1":
-                cur["challenger_options"] = general_challenger_options()
-
-            # Tsar decided -> general menu (preserve tsar_called)
-            if cur["challenger_choice"] == TSAR_OPTION and cur["contradiction_choice"] and cur["need_reason"] != "1":
-                cur["tsar_called"] = "1"
-                cur["challenger_options"] = general_challenger_options()
-
-            # Defender accepted -> challenger menu
-            if cur["defender_choice"] == "I accept" and cur["need_reason"] != "1":
-                cur["challenger_options"] = general_challenger_options()
-
-            # Autogenerated follow-up consequence
-            if (
-                cur["defender_choice"] in ["The reason is not established", "There is no pervasion"]
-                and cur["challenger_choice"]
-                and cur["challenger_choice"] not in [ASK_OPTION, COMPARE_OPTION, TSAR_OPTION, NEW_CONSEQ_OPT]
-                and cur["challenger_reason"].strip()
-            ):
-                choice_txt = cur["challenger_choice"].strip()
-                new_subject = cur["subject"]
-                new_copula  = cur["copula"]
-                new_predicate = cur["predicate"]
-                new_reason = cur["challenger_reason"].strip()
-
-                if cur["defender_choice"] == "The reason is not established":
-                    if choice_txt.startswith(f"{cur['subject']} {cur['copula']} not {cur['reason']}"):
-                        new_predicate = f"not {cur['reason']}"
-                    else:
-                        new_predicate = cur["reason"]
-                elif cur["defender_choice"] == "There is no pervasion":
-                    new_subject = f"Whoever or whatever {cur['copula']} {cur['reason']}"
-                    if "not necessarily" in choice_txt:
-                        new_predicate = f"not necessarily {cur['predicate']}"
-                    else:
-                        new_predicate = f"necessarily {cur['predicate']}"
-
-                steps.append({
-                    "subject": new_subject, "copula": new_copula,
-                    "predicate": new_predicate, "reason": new_reason,
-                    "consequence": f"It follows that {new_subject} {new_copula} {new_predicate}, because of being {new_reason}.",
-
-                    "defender_choice": "",
-                    "defender_explanations": build_defender_explanations(new_subject, new_predicate, new_reason, new_copula),
-
-                    "challenger_options": [],
-                    "challenger_choice": "",
-                    "challenger_reason": "",
-
-                    "contradiction_options": [],
-                    "contradiction_choice": "",
-                    "tsar_called": "0",
-
-                    "question_text": "",
-                    "answer_text": "",
-
-                    "compare_a": "",
-                    "compare_b": "",
-                    "compare_option": "",
-                    "compare_locked": "",
-
-                    "need_reason": "0",
-                    "role_switch": "0",
-                })
-
-            # ✅ Handle "Write a new consequence" from the active step
-            elif cur["challenger_choice"] == NEW_CONSEQ_OPT and cur["need_reason"] != "1":
-                steps.append({
-                    "subject": "", "copula": "is",
-                    "predicate": "", "reason": "",
-                    "consequence": "",
-
-                    "defender_choice": "",
-                    "defender_explanations": [],
-
-                    "challenger_options": [],
-                    "challenger_choice": "",
-                    "challenger_reason": "",
-
-                    "contradiction_options": [],
-                    "contradiction_choice": "",
-                    "tsar_called": "0",
-
-                    "question_text": "",
-                    "answer_text": "",
-
-                    "compare_a": "",
-                    "compare_b": "",
-                    "compare_option": "",
-                    "compare_locked": "",
-
-                    "need_reason": "0",
-                    "role_switch": "0",
-                })
-
-        # Normalize earlier Why? steps if reason filled later
-        for s in steps:
-            if s["defender_choice"] == WHY_OPTION and s["reason"]:
-                s["need_reason"] = "0"
-                s["defender_choice"] = ""
-                s["defender_explanations"] = build_defender_explanations(
-                    s["subject"], s["predicate"], s["reason"], s["copula"]
-                )
-                s["challenger_choice"] = ""
-                s["challenger_options"] = []
-
-        # Append a role-switch marker step if requested
+            debate_id = ""
+            touched = set(range(len(steps)))
+
+    # Run this move's transitions on the active step
+    with metrics.phase("transitions"):
+        engine = engine_for(debate, changed=touched)
+        engine.advance(submitted=did_submit_continue)
         if did_switch_roles:
-            steps.append({
-                "subject": "", "copula": "is",
-                "predicate": "", "reason": "",
-                "consequence": "",
-                "defender_choice": "",
-                "defender_explanations": [],
-                "challenger_options": [],
-                "challenger_choice": "",
-                "challenger_reason": "",
-                "contradiction_options": [],
-                "contradiction_choice": "",
-                "tsar_called": "0",
-                "question_text": "",
-                "answer_text": "",
-                "compare_a": "",
-                "compare_b": "",
-                "compare_option": "",
-                "compare_locked": "",
-                "need_reason": "0",
-                "role_switch": "1",
-            })
-
-        # Build per-step role labels and get current labels for Turn Bar
-        current_cha_lab, current_def_lab = compute_role_labels(steps, flipped_initial)
-
-        # Transcript
-        if wants_transcript and not wants_return:
-            transcript = "\n".join(make_transcript(steps, preface=preface_text))
+            engine.switch_roles()
+        transcript_cache(debate).invalidate(engine.dirty)
+        commitment_index(debate, engine.dirty)
+        pervasion_index(debate, engine.dirty)
+        relation_index(debate, engine.dirty)
+        current_idx = engine.active_index()
+
+    # Build per-step role labels and get current labels for Turn Bar
+    with metrics.phase("labels"):
+        current_cha_lab, current_def_lab = compute_role_labels(steps, debate["flipped"])
+
+    # Transcript (cached per step; only changed steps are re-rendered)
+    if wants_transcript and not wants_return:
+        with metrics.phase("transcript"):
+            transcript = "\n".join(transcript_cache(debate).lines(steps, debate["preface"]))
+
+    with metrics.phase("save"):
+        debate_id = save_debate(debate_id, debate, engine.dirty, -1 if transcript else current_idx)
+    metrics.observe_steps(len(steps))
+
+    return debate_id, debate, page_context(
+        debate_id, debate, transcript, current_idx, current_cha_lab, current_def_lab, player
+    )
 
-    # First load
-    if not steps:
-        steps.append({
-            "subject": "", "copula": "is", "predicate": "", "reason": "",
-            "consequence": "",
-            "defender_choice": "", "defender_explanations": [],
-            "challenger_options": [], "challenger_choice": "", "challenger_reason": "",
-            "contradiction_options": [], "contradiction_choice": "",
-            "tsar_called": "0",
-            "question_text": "", "answer_text": "",
-            "compare_a": "", "compare_b": "", "compare_option": "", "compare_locked": "",
-            "need_reason": "0",
-            "role_switch": "0",
-        })
-        compute_role_labels(steps, flipped_initial)
-        current_cha_lab, current_def_lab = steps[0]["cha_label"], steps[0]["def_label"]
-
-    current_idx = pick_active_index(steps)
-    turn_state = determine_turn_state(steps[current_idx])
 
-    return render_template(
-        "index.html",
-        steps=steps,
+def page_context(debate_id, debate, transcript, current_idx, current_cha_lab, current_def_lab,
+                 player=""):
+    steps = debate["steps"]
+    turn_state = annotate_turn(debate, determine_turn_state(steps[current_idx]), current_idx)
+    history = None
+    if debate_id and debate_store is not None:
+        history = history_for(debate).summary()
+        history["action"] = url_for("debates.debate_history", debate_id=debate_id, player=player or None)
+    return dict(
+        debate_id=debate_id,
+        rev=debate["rev"],
+        state_token=state_tokens.dumps(debate) if state_tokens else "",
+        player=player,
+        steps=[StepView(st) for st in steps],
         step_count=len(steps),
-        flipped_initial=flipped_initial,
+        flipped_initial=debate["flipped"],
         transcript=transcript,
-        preface_text=preface_text,
+        preface_text=debate["preface"],
         ASK_OPTION=ASK_OPTION,
         COMPARE_OPTION=COMPARE_OPTION,
         current_idx=current_idx,
         turn_state=turn_state,
+        turn_player=current_cha_lab if turn_state["who"] == "challenger" else current_def_lab,
         current_cha_lab=current_cha_lab,
         current_def_lab=current_def_lab,
+        history=history,
+    )
+
+
+@bp.route("/", methods=["GET", "POST"])
+def home():
+    if request.method == "POST":
+        with metrics.phase("parse"):
+            form = request.form
+        debate_id = form.get("debate_id", "")
+        with metrics.phase("load"):
+            if state_tokens is not None:
+                debate = load_state_or_400(form.get("state", ""))
+            else:
+                debate = debate_store.load(debate_id) if debate_id else None
+                if debate_id and debate is None:
+                    # Evicted, lost in a restart, or never stored here. The post only
+                    # carries what this move changed, so it can't rebuild the debate.
+                    abort(409, "This debate is no longer stored; reload to start a new one")
+        _, _, context = handle_post(form, debate_id, debate)
+        with metrics.phase("render"):
+            return render_template("index.html", **context)
+
+    # First load
+    steps = [build_step({})]
+    compute_role_labels(steps, "0")
+    debate = new_debate(steps)
+    context = page_context("", debate, "", pick_active_index(steps),
+                           steps[0].cha_label, steps[0].def_label)
+    return render_template("index.html", **context)
+
+
+def player_arg():
+    """The ?player= a two-device page belongs to ("1" or "2"), else ""."""
+    player = request.args.get("player", "")
+    return player if player in ("1", "2") else ""
+
+
+@bp.route("/debates/<debate_id>", methods=["GET", "POST"])
+def debate_page(debate_id):
+    """A stored debate's full page; ?player=1|2 makes it one player's device."""
+    player = player_arg()
+    if request.method == "POST":
+        with metrics.phase("parse"):
+            form = request.form
+        with metrics.phase("load"):
+            debate = load_debate_or_404(debate_id)
+        _, _, context = handle_post(form, debate_id, debate, player)
+        with metrics.phase("render"):
+            return render_template("index.html", **context)
+
+    debate = load_debate_or_404(debate_id)
+    steps = debate["steps"]
+    current_cha_lab, current_def_lab = compute_role_labels(steps, debate["flipped"])
+    context = page_context(debate_id, debate, "", engine_for(debate).active_index(),
+                           current_cha_lab, current_def_lab, player)
+    return render_template("index.html", **context)
+
+
+@bp.post("/debates/<debate_id>/fragments")
+def debate_fragments(debate_id):
+    """Apply a form post and return only the cards it changed.
+
+    The page patches ``cards`` into place by index, appending any new ones,
+    and swaps in ``turnbar``. The cards sent are the ones save_debate()
+    lists in ``replay``: every dirty step plus the old and new Turn Panel
+    step, whose in-card inputs are hidden or shown with the panel. A post
+    from a page older than the stored revision (the other device moved
+    first) is refused with 409.
+    """
+    with metrics.phase("parse"):
+        form = request.form
+    with metrics.phase("load"):
+        debate = load_debate_or_404(debate_id)
+    if form.get("rev", str(debate["rev"])) != str(debate["rev"]):
+        return jsonify(error="The debate changed since this page was loaded", rev=debate["rev"]), 409
+    _, _, context = handle_post(form, debate_id, debate)
+
+    with metrics.phase("render"):
+        return jsonify(render_fragments(debate, context))
+
+
+@bp.post("/debates/<debate_id>/history")
+def debate_history(debate_id):
+    """The page's Undo, Redo and branch buttons; the page is then reloaded."""
+    debate = load_debate_or_404(debate_id)
+    form = request.form
+    step = form.get("branch_from", "").strip()
+    try:
+        apply_history_action(debate_id, debate, form.get("history", ""), form.get("branch", ""),
+                             int(step) - 1 if step.isdigit() else None)
+    except ValueError as e:
+        abort(400, str(e))
+    return redirect(url_for("debates.debate_page", debate_id=debate_id, player=player_arg() or None), 303)
+
+
+def event_stream(channel, debate):
+    """An SSE response for ``channel``, resuming after Last-Event-ID or ?rev=."""
+    since = request.headers.get("Last-Event-ID") or request.args.get("rev", "")
+    since = int(since) if since.isdigit() else debate["rev"]
+    response = Response(broker.stream(channel, since, debate["rev"]),
+                        mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@bp.get("/debates/<debate_id>/events")
+def debate_events(debate_id):
+    """Server-Sent Events: one "move" event (see move_event) per saved move."""
+    return event_stream(debate_id, load_debate_or_404(debate_id))
+
+
+# ------------------------------------------------------------
+# JSON API
+# ------------------------------------------------------------
+def json_object():
+    """The posted JSON object, {} if nothing (or no JSON) was posted; any
+    other JSON answers 400."""
+    data = request.get_json(silent=True)
+    if data is None:
+        return {}
+    if not isinstance(data, dict):
+        response = jsonify(error="Expected a JSON object")
+        response.status_code = 400
+        abort(response)
+    return data
+
+
+def api_turn(debate, engine):
+    turn = engine.turn_state()
+    return annotate_turn(debate, turn, turn["index"])
+
+
+@bp.post("/api/debates")
+def api_create_debate():
+    if debate_store is None:
+        abort(404)
+    data = json_object()
+    flipped = "1" if str(data.get("flipped", "0")) in ("1", "true", "True") else "0"
+    steps = [build_step({})]
+    compute_role_labels(steps, flipped)
+    debate = new_debate(steps, flipped=flipped, preface=str(data.get("preface", "")).strip())
+    debate_id = save_debate("", debate, {0}, -1)
+    return jsonify(debate_id=debate_id, turn=engine_for(debate).turn_state(),
+                   steps=[st.to_dict(menus=True) for st in steps]), 201
+
+
+@bp.get("/api/debates/<debate_id>")
+def api_get_debate(debate_id):
+    debate = load_debate_or_404(debate_id)
+    engine = engine_for(debate)
+    return jsonify(
+        debate_id=debate_id,
+        preface=debate["preface"],
+        turn=api_turn(debate, engine),
+        history=history_for(debate).summary(),
+        steps=[st.to_dict(menus=True) for st in debate["steps"]],
+    )
+
+
+@bp.post("/api/debates/<debate_id>/moves")
+def api_apply_move(debate_id):
+    debate = load_debate_or_404(debate_id)
+    move = request.get_json(silent=True)
+    if not isinstance(move, dict):
+        return jsonify(error="Expected a JSON object describing one move"), 400
+
+    steps = debate["steps"]
+    history_for(debate)  # so this move can be undone
+    engine = engine_for(debate)
+    try:
+        with metrics.phase("transitions"):
+            engine.apply(move)
+    except MoveError as e:
+        return jsonify(error=str(e), turn=api_turn(debate, engine)), 400
+    transcript_cache(debate).invalidate(engine.dirty)
+    commitment_index(debate, engine.dirty)
+    pervasion_index(debate, engine.dirty)
+    relation_index(debate, engine.dirty)
+    with metrics.phase("save"):
+        save_debate(debate_id, debate, engine.dirty, -1)
+    metrics.observe_steps(len(steps))
+
+    return jsonify(
+        turn=api_turn(debate, engine),
+        changed=[
+            dict(steps[i].to_dict(menus=True), index=i)
+            for i in sorted(engine.changed) if i < engine.appended_from
+        ],
+        appended=[st.to_dict(menus=True) for st in steps[engine.appended_from:]],
+        step_count=len(steps),
     )
 
 
+def api_history_response(debate_id, debate, action, name="", step=None, status=200):
+    try:
+        done = apply_history_action(debate_id, debate, action, name, step)
+    except ValueError as e:
+        return jsonify(error=str(e), history=history_for(debate).summary()), 400
+    if not done and action in ("undo", "redo"):
+        return jsonify(error=f"Nothing to {action}", history=history_for(debate).summary()), 400
+    return jsonify(
+        history=history_for(debate).summary(),
+        turn=api_turn(debate, engine_for(debate)),
+        steps=[st.to_dict(menus=True) for st in debate["steps"]],
+    ), status
+
+
+@bp.post("/api/debates/<debate_id>/undo")
+def api_undo(debate_id):
+    return api_history_response(debate_id, load_debate_or_404(debate_id), "undo")
+
+
+@bp.post("/api/debates/<debate_id>/redo")
+def api_redo(debate_id):
+    return api_history_response(debate_id, load_debate_or_404(debate_id), "redo")
+
+
+@bp.get("/api/debates/<debate_id>/branches")
+def api_branches(debate_id):
+    return jsonify(history_for(load_debate_or_404(debate_id)).summary())
+
+
+@bp.post("/api/debates/<debate_id>/branches")
+def api_fork(debate_id):
+    """Start a branch: {"name": ..., "step": i} rewinds to step index i
+    (see History.rewind_point); without "step" it forks the current version."""
+    debate = load_debate_or_404(debate_id)
+    data = json_object()
+    step = data.get("step")
+    if step is not None and not isinstance(step, int):
+        return jsonify(error="step must be a step index"), 400
+    return api_history_response(debate_id, debate, "fork", str(data.get("name", "")), step, 201)
+
+
+@bp.post("/api/debates/<debate_id>/branches/<name>/checkout")
+def api_checkout(debate_id, name):
+    return api_history_response(debate_id, load_debate_or_404(debate_id), "switch", name)
+
+
+# ------------------------------------------------------------
+# Tournament rooms
+# ------------------------------------------------------------
+@bp.route("/rooms", methods=["GET", "POST"])
+def rooms_page():
+    """The tournament hub: every room, who is on move, and a form for a new one."""
+    rooms_or_404()
+    error = ""
+    tournament = request.args.get("tournament") or None
+    if request.method == "POST":
+        try:
+            room = create_room(request.form.get("name", ""), request.form.get("tournament", ""))
+        except RoomError as e:
+            error = str(e)
+        else:
+            return redirect(url_for("debates.rooms_page", tournament=room["tournament"] or None), 303)
+    return render_template("rooms.html", rooms=all_rooms(tournament), tournament=tournament,
+                           error=error, form=request.form), 400 if error else 200
+
+
+@bp.get("/rooms/<debate_id>")
+def watch_room(debate_id):
+    """A spectator's read-only view of a room, kept current by /rooms/<id>/events."""
+    room = rooms_or_404().get(debate_id)
+    if room is None:
+        abort(404)
+    debate = load_debate_or_404(debate_id)
+    steps = debate["steps"]
+    compute_role_labels(steps, debate["flipped"])
+    return render_template(
+        "watch.html",
+        room=room,
+        rev=debate["rev"],
+        preface=debate["preface"].strip(),
+        cards=list(transcript_cache(debate).step_lines(steps)),
+        turn=engine_for(debate).turn_state(),
+        step_count=len(steps),
+    )
+
+
+@bp.get("/rooms/<debate_id>/events")
+def room_events(debate_id):
+    """Server-Sent Events for spectators: one "move" event (see watch_event) per move."""
+    if rooms_or_404().get(debate_id) is None:
+        abort(404)
+    return event_stream(watch_channel(debate_id), load_debate_or_404(debate_id))
+
+
+@bp.post("/api/rooms")
+def api_create_room():
+    rooms_or_404()
+    data = json_object()
+    flipped = "1" if str(data.get("flipped", "0")) in ("1", "true", "True") else "0"
+    try:
+        room = create_room(str(data.get("name", "")), str(data.get("tournament", "")),
+                           flipped, str(data.get("preface", "")).strip())
+    except RoomError as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(room), 201
+
+
+@bp.get("/api/rooms")
+def api_rooms():
+    """Every room (?tournament= for one tournament); ?local=1 for this shard's only."""
+    rooms_or_404()
+    tournament = request.args.get("tournament")
+    rooms = local_rooms(tournament) if request.args.get("local") else all_rooms(tournament)
+    return jsonify(rooms=rooms)
+
+
+# ------------------------------------------------------------
+# Search
+# ------------------------------------------------------------
+@bp.get("/search")
+def search():
+    """Steps of stored debates matching ``q`` (see search.py for the syntax);
+    ?local=1 for this shard's index only."""
+    if search_index is None:
+        abort(404)
+    query = request.args.get("q", "")
+    limit = max(1, min(request.args.get("limit", 50, type=int), MAX_LIMIT))
+    try:
+        with metrics.phase("search"):
+            results = search_index.search(query, limit)
+    except QueryError as e:
+        return jsonify(error=str(e)), 400
+    # An in-memory index only holds the debates its own shard saved
+    if shards.count > 1 and search_index.path == ":memory:" and not request.args.get("local"):
+        found = [results] + [result["results"] for result in sharding.gather(
+            url_for("debates.search", q=query, limit=limit, local=1))]
+        # Each shard's results are newest first; take them in turns
+        results = [result for batch in zip_longest(*found) for result in batch if result][:limit]
+    for result in results:
+        result["url"] = url_for("debates.debate_page", debate_id=result["debate_id"]) + f"#step-{result['step']}"
+    return jsonify(query=query, results=results)
+
+
+# ------------------------------------------------------------
+# Downloads
+# ------------------------------------------------------------
+@bp.get("/debates/<debate_id>/transcript.txt")
+def download_transcript(debate_id):
+    """Stream the transcript (of ?branch= if given); unchanged debates
+    answer 304 by ETag."""
+    debate = load_debate_or_404(debate_id)
+    history = history_for(debate)
+    branch = request.args.get("branch", history.branch)
+    if branch not in history.branches:
+        abort(404)
+    etag = f"{debate_id}-{debate['rev']}-{history.branches[branch].number}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    preface = debate["preface"]
+    if branch == history.branch:
+        steps = list(debate["steps"])
+        step_chunks = transcript_cache(debate).step_lines(steps)
+    else:
+        steps = history.steps(branch, debate["flipped"])
+        step_chunks = (step_lines(i, st) for i, st in enumerate(steps, 1))
+
+    def generate():
+        head = preface_lines(preface)
+        if head:
+            yield "\n".join(head) + "\n"
+        for lines in step_chunks:
+            if lines:
+                yield "\n".join(lines) + "\n"
+
+    response = Response(generate(), mimetype="text/plain")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Content-Disposition"] = f'attachment; filename="debate-{debate_id}.txt"'
+    return response
+
+
+# ------------------------------------------------------------
+# CLI
+# ------------------------------------------------------------
+@debates_cli.command("export")
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.option("--format", "formats", multiple=True, type=click.Choice(list(FORMATS)),
+              help="Only this format (repeatable; default: all of them).")
+@click.option("--workers", "-w", type=int, default=None,
+              help="Worker processes (default: one per CPU; 1 renders in this process).")
+def export_debates(directory, formats, workers):
+    """Write every stored debate as JSONL, CSV and Markdown (see export.py)."""
+    if debate_store is None:
+        raise click.ClickException("DEBATE_STORE=token keeps no debates to export")
+    if isinstance(debate_store, MemoryDebateStore):
+        # A fresh one, not the one the server's workers hold in memory
+        raise click.ClickException("The memory store keeps debates inside the server's workers; "
+                                   "export needs DEBATE_STORE=sqlite or movelog")
+    start = time.perf_counter()
+    count = export_store(debate_store, directory, formats or tuple(FORMATS), workers)
+    click.echo(f"Exported {count:,} debates to {directory} in {time.perf_counter() - start:.2f}s")
+
+
+# ------------------------------------------------------------
+# App factory
+# ------------------------------------------------------------
+def create_app():
+    """Build the app and open the stores selected by the environment.
+
+    Also precompiles the templates and builds the static files (see
+    assets.py), so it is meant to run once per deployment:
+
+        gunicorn --preload "app:create_app()"   # see gunicorn.conf.py
+
+    runs it in the master, and the workers fork with everything loaded.
+    The SQLite stores reconnect in each worker, and each worker serves
+    one shard of the debates (see sharding.py).
+    """
+    global debate_store, search_index, room_registry, state_tokens
+    load_dotenv()
+    # DEBATE_STORE=token keeps nothing server-side: the page carries the whole
+    # debate in a signed "state" field (see state_token.py) and the routes that
+    # need a stored debate answer 404.
+    if os.environ.get("DEBATE_STORE", "").lower() == "token":
+        if not os.environ.get("SECRET_KEY"):
+            raise RuntimeError("DEBATE_STORE=token needs SECRET_KEY, shared by every worker")
+        debate_store = search_index = room_registry = None
+        state_tokens = StateTokens(os.environ["SECRET_KEY"])
+    else:
+        debate_store = open_store()
+        search_index = open_search_index()
+        if isinstance(debate_store, MemoryDebateStore):
+            # Evicted debates are gone for good; so are their search hits
+            debate_store.on_evict = search_index.delete
+        room_registry = open_room_registry()
+        state_tokens = None
+
+    app = Flask(__name__, static_folder=None)
+    app.register_blueprint(bp)
+    app.jinja_env.globals["STATE_TOKENS"] = state_tokens is not None
+    metrics.init_app(app)
+    if debate_store is not None:
+        sharding.init_app(app)
+    app.cli.add_command(debates_cli)
+    assets.init_app(app)
+    return app
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,141 @@
+"""Fingerprinted static files and precompiled templates.
+
+init_app() gets an app ready to answer its first request quickly:
+
+- Each file in static/ is copied to a build directory (DEBATE_ASSET_DIR,
+  default static/build) under a name that carries a hash of its content,
+  app.css -> app.3f2a9c1d0b.css, next to .gz and .br compressed copies.
+  Templates link them with asset_url("app.css"). Because a new version
+  gets a new name, they are served with a one-year immutable
+  Cache-Control, and a browser asks for each version once. A client that
+  accepts brotli or gzip is sent the compressed copy as it is, with no
+  compression at request time.
+- Jinja writes compiled templates to a bytecode cache on disk
+  (DEBATE_TEMPLATE_CACHE, default instance/template-cache), and every
+  template is loaded once up front. A process that finds the cache warm
+  skips Jinja's compiler. Under gunicorn --preload this happens once, in
+  the master, and every worker forks with the templates in memory.
+
+Building only writes files whose hash is new, so it is cheap to repeat
+on every start. brotli is optional: without it there are no .br copies.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+from flask import abort, current_app, request, send_from_directory, url_for
+from jinja2 import FileSystemBytecodeCache
+
+try:
+    import brotli
+except ImportError:  # gzip copies only
+    brotli = None
+
+ONE_YEAR = 365 * 24 * 3600
+MANIFEST = "manifest.json"
+
+# Content-Encoding -> suffix of the precompressed copy, best first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def fingerprint(name, data):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _write(path, data):
+    """Write ``path`` atomically, so workers building at once never serve half a file."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def compressed(data):
+    """(suffix, bytes) for each precompressed copy worth keeping."""
+    out = [(".gz", gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        out.append((".br", brotli.compress(data, quality=11)))
+    return [(suffix, packed) for suffix, packed in out if len(packed) < len(data)]
+
+
+def build(source_dir, build_dir):
+    """Fingerprint and compress every file in ``source_dir``; returns the
+    manifest, {source name: fingerprinted name}."""
+    os.makedirs(build_dir, exist_ok=True)
+    manifest = {}
+    for entry in sorted(os.scandir(source_dir), key=lambda e: e.name):
+        if not entry.is_file() or entry.name.startswith("."):
+            continue
+        with open(entry.path, "rb") as f:
+            data = f.read()
+        name = manifest[entry.name] = fingerprint(entry.name, data)
+        target = os.path.join(build_dir, name)
+        if os.path.exists(target):
+            continue
+        for suffix, packed in compressed(data):
+            _write(target + suffix, packed)
+        _write(target, data)  # last: its presence means the build is complete
+    _write(os.path.join(build_dir, MANIFEST), json.dumps(manifest, indent=1).encode())
+    return manifest
+
+
+class Assets:
+    def __init__(self, source_dir, build_dir):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.manifest = build(source_dir, build_dir)
+        self.served = set(self.manifest.values())
+
+    def url(self, name):
+        """The fingerprinted URL of static file ``name``."""
+        if current_app.debug:  # pick up edits without a restart
+            self.manifest = build(self.source_dir, self.build_dir)
+            self.served = set(self.manifest.values())
+        return url_for("static", filename=self.manifest[name])
+
+    def serve(self, filename):
+        if filename not in self.served:
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        encoding, suffix = None, ""
+        for name, ext in ENCODINGS:
+            if request.accept_encodings[name] and os.path.exists(os.path.join(self.build_dir, filename + ext)):
+                encoding, suffix = name, ext
+                break
+        response = send_from_directory(self.build_dir, filename + suffix, mimetype=mimetype,
+                                       max_age=ONE_YEAR)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+
+def precompile_templates(app):
+    """Load every template now instead of on the request that first needs it."""
+    env = app.jinja_env
+    for name in env.list_templates():
+        env.get_template(name)
+
+
+def init_app(app):
+    """Serve fingerprinted static files and precompile the templates.
+
+    The app must be created with static_folder=None; its sources are
+    still read from ``static/``.
+    """
+    root = app.root_path
+    assets = Assets(os.path.join(root, "static"),
+                    os.environ.get("DEBATE_ASSET_DIR") or os.path.join(root, "static", "build"))
+    app.add_url_rule("/static/<path:filename>", "static", assets.serve)
+    app.jinja_env.globals["asset_url"] = assets.url
+    app.extensions["assets"] = assets
+
+    cache_dir = os.environ.get("DEBATE_TEMPLATE_CACHE") or os.path.join(app.instance_path, "template-cache")
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+    precompile_templates(app)
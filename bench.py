@@ -0,0 +1,243 @@
+"""Microbenchmarks for the per-request hot paths.
+
+    python bench.py                          # 10, 100, 1,000 and 10,000 steps
+    python bench.py --sizes 10 100 --out before.json
+    python bench.py --baseline before.json   # also print the ratio to an older run
+    python bench.py --startup                # cold start instead, see below
+
+Each benchmark runs against a synthetic debate (see synthetic.py) and
+records min/median/mean wall time per call. Results are written as JSON
+so two versions can be compared run against run.
+
+--startup times a fresh interpreter from its first line to its first
+response (STARTUP_PROBE), in phases: importing app, create_app(), the
+first GET / and, as a gunicorn --preload worker would see it, a process
+forked after create_app() answering its first GET /. "cold" runs start
+with an empty template cache and static build directory, "warm" runs
+with the ones the previous run left.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from app import create_app, page_context, rehydrate_steps
+from debate_engine import compute_role_labels, pick_active_index
+from debate_store import new_debate
+from flask import render_template
+from pervasion import PervasionIndex
+from propositions import CommitmentIndex
+from synthetic import synthetic_debate
+from transcript import make_transcript
+
+SIZES = (10, 100, 1_000, 10_000)
+PREFACE = "We agreed to debate whether sound is impermanent."
+
+
+def full_form(steps, flipped="0"):
+    """The form a full (non-delta) post of ``steps`` sends."""
+    form = {"step_count": str(len(steps)), "flipped": flipped, "preface_text": PREFACE}
+    for i, st in enumerate(steps):
+        for field, value in st.form_fields().items():
+            form[f"{field}_{i}"] = value
+    return form
+
+
+def render_page(app, steps):
+    debate = new_debate(steps, preface=PREFACE)
+    cha, deff = compute_role_labels(steps, "0")
+    with app.test_request_context("/"):
+        context = page_context("bench", debate, "", pick_active_index(steps), cha, deff)
+        return render_template("index.html", **context)
+
+
+def benchmarks(app, steps):
+    """(name, callable) pairs over one synthetic debate."""
+    form = full_form(steps)
+    commitments = CommitmentIndex().update(steps)
+    pervasions = PervasionIndex(corpus=None).update(steps)
+    last = len(steps) - 1
+    return [
+        ("rehydrate_steps", lambda: rehydrate_steps(form)),
+        ("pick_active_index", lambda: pick_active_index(steps)),
+        ("compute_role_labels", lambda: compute_role_labels(steps, "0")),
+        ("check_contradiction", lambda: commitments.update(steps, (last,)).conflict(steps, last)),
+        ("pervasion_hints", lambda: pervasions.update(steps, (last,)).hints(steps[last])),
+        ("make_transcript", lambda: make_transcript(steps, PREFACE)),
+        ("render_index", lambda: render_page(app, steps)),
+    ]
+
+
+def time_call(fn, min_time=0.2, min_runs=3, max_runs=1000):
+    """Call ``fn`` until ``min_time`` seconds have passed; return per-call seconds."""
+    fn()  # warm caches and the Jinja template
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_runs and (len(times) < min_runs or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                             capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return out.stdout.strip()
+
+
+def run(sizes=SIZES, seed=0, min_time=0.2):
+    app = create_app()
+    results = []
+    for n in sizes:
+        steps = synthetic_debate(n, seed=seed)
+        for name, fn in benchmarks(app, steps):
+            times = time_call(fn, min_time=min_time)
+            results.append({
+                "name": name,
+                "steps": n,
+                "runs": len(times),
+                "min_ms": min(times) * 1e3,
+                "median_ms": statistics.median(times) * 1e3,
+                "mean_ms": statistics.fmean(times) * 1e3,
+            })
+            print(f"{name:<20} {n:>6} steps  {results[-1]['median_ms']:10.3f} ms  "
+                  f"({len(times)} runs)", file=sys.stderr)
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "seed": seed,
+            "sizes": list(sizes),
+        },
+        "results": results,
+    }
+
+
+STARTUP_PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+r, w = os.pipe()
+if os.fork() == 0:
+    app.test_client().get("/")
+    os.write(w, str(time.perf_counter() - created).encode())
+    os._exit(0)
+os.wait()
+forked = float(os.read(r, 64))
+client = app.test_client()
+before = time.perf_counter()
+assert client.get("/").status_code == 200
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "create_app": created - imported,
+                  "first_response": done - before, "forked_first_response": forked,
+                  "end": time.time()}))
+"""
+STARTUP_PHASES = ("total", "import", "create_app", "first_response", "forked_first_response")
+
+
+def startup_once(env):
+    began = time.time()
+    out = subprocess.run([sys.executable, "-c", STARTUP_PROBE], env=env, capture_output=True,
+                         text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    timings = json.loads(out.stdout.splitlines()[-1])
+    timings["total"] = timings.pop("end") - began
+    return timings
+
+
+def run_startup(runs=5):
+    """Startup phases over ``runs`` fresh processes each, with cold and warm caches."""
+    results = []
+    env = dict(os.environ, DEBATE_STORE="memory")
+    env.pop("DEBATE_METRICS", None)
+    for cache in ("cold", "warm"):
+        samples = {phase: [] for phase in STARTUP_PHASES}
+        with tempfile.TemporaryDirectory() as tmp:
+            for run in range(runs + (cache == "warm")):
+                if cache == "cold":
+                    env["DEBATE_TEMPLATE_CACHE"] = os.path.join(tmp, f"templates-{run}")
+                    env["DEBATE_ASSET_DIR"] = os.path.join(tmp, f"static-{run}")
+                else:
+                    env["DEBATE_TEMPLATE_CACHE"] = os.path.join(tmp, "templates")
+                    env["DEBATE_ASSET_DIR"] = os.path.join(tmp, "static")
+                timings = startup_once(env)
+                if cache == "warm" and run == 0:
+                    continue  # this one fills the caches
+                for phase in STARTUP_PHASES:
+                    samples[phase].append(timings[phase])
+        for phase in STARTUP_PHASES:
+            times = samples[phase]
+            results.append({
+                "name": f"startup_{cache}_{phase}",
+                "steps": 1,
+                "runs": len(times),
+                "min_ms": min(times) * 1e3,
+                "median_ms": statistics.median(times) * 1e3,
+                "mean_ms": statistics.fmean(times) * 1e3,
+            })
+            print(f"{cache:<5} {phase:<22} {results[-1]['median_ms']:10.3f} ms  "
+                  f"({len(times)} runs)", file=sys.stderr)
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "runs": runs,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    """Print median time relative to ``baseline`` (>1.0 means slower now)."""
+    old = {(r["name"], r["steps"]): r for r in baseline["results"]}
+    print(f"vs {baseline['meta'].get('revision') or 'baseline'}:")
+    for r in report["results"]:
+        b = old.get((r["name"], r["steps"]))
+        if b and b["median_ms"]:
+            print(f"  {r['name']:<20} {r['steps']:>6}  {r['median_ms'] / b['median_ms']:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="seconds to spend on each benchmark (default 0.2)")
+    parser.add_argument("--out", default="bench-results.json")
+    parser.add_argument("--baseline", help="an earlier results file to compare against")
+    parser.add_argument("--startup", action="store_true",
+                        help="time import to first response in fresh processes instead")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="fresh processes per cache state with --startup (default 5)")
+    args = parser.parse_args(argv)
+
+    if args.startup:
+        report = run_startup(args.runs)
+    else:
+        report = run(args.sizes, args.seed, args.min_time)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.out}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,709 @@
+"""Debate rules: option menus, turn logic and the move engine.
+
+Steps are slotted Step dataclasses (see Step and build_step); the web layer
+in app.py only turns form posts and JSON into calls on DebateEngine.
+"""
+
+import os
+import sys
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from heapq import heappop, heappush
+from enum import StrEnum
+
+# ------------------------------------------------------------
+# Constants
+# ------------------------------------------------------------
+class DefenderChoice(StrEnum):
+    ACCEPT                 = "I accept"
+    WHY                    = "Why?"
+    REASON_NOT_ESTABLISHED = "The reason is not established"
+    NO_PERVASION           = "There is no pervasion"
+    DONT_KNOW              = "I don't know this right now / That is an improper consequence"
+
+
+class ChallengerChoice(StrEnum):
+    """The challenger's fixed moves; reasoning replies stay plain strings."""
+    ASK             = "Ask a question"
+    COMPARE         = "Compare phenomena"
+    NEW_CONSEQUENCE = "Write a new consequence"
+    TSAR            = "Tsar! [You contradicted yourself!]"
+
+
+class TsarReply(StrEnum):
+    ADMIT = "I admit that I contradicted myself"
+    DENY  = "I do not admit that I contradicted myself"
+
+
+class Diagram(StrEnum):
+    MUTUALLY_INCLUSIVE = "Mutually inclusive"
+    MUTUALLY_EXCLUSIVE = "Mutually exclusive"
+    THREE_DOWN         = "3 possibilities (down)"
+    THREE_UP           = "3 possibilities (up)"
+    FOUR               = "4 possibilities"
+
+
+TSAR_OPTION       = ChallengerChoice.TSAR
+ADMIT_OPT         = TsarReply.ADMIT
+DENY_OPT          = TsarReply.DENY
+ASK_OPTION        = ChallengerChoice.ASK
+COMPARE_OPTION    = ChallengerChoice.COMPARE
+NEW_CONSEQ_OPT    = ChallengerChoice.NEW_CONSEQUENCE
+WHY_OPTION        = DefenderChoice.WHY
+COMPARE_CHOICES   = tuple(Diagram)
+
+# Shared option tuples; steps point at these instead of copying them
+GENERAL_CHALLENGER_OPTIONS = tuple(ChallengerChoice)
+CONTRADICTION_OPTIONS      = tuple(TsarReply)
+UNREASONED_EXPLANATIONS    = ((DefenderChoice.ACCEPT, ""), (WHY_OPTION, ""))
+
+# ------------------------------------------------------------
+# Helpers
+# ------------------------------------------------------------
+# Menu text only depends on the consequence's wording, which repeats
+# heavily within and across debates, so the formatted tuples are cached
+# and shared between steps. Size with MENU_CACHE_SIZE (0 disables).
+MENU_CACHE_SIZE = int(os.environ.get("MENU_CACHE_SIZE", "4096"))
+
+
+def _defender_menu(subject, predicate, reason, copula):
+    return (
+        (DefenderChoice.ACCEPT, ""),
+        (DefenderChoice.REASON_NOT_ESTABLISHED, f"({subject} {copula} not {reason})"),
+        (DefenderChoice.NO_PERVASION,
+         f"(Whoever or whatever {copula} {reason} is not necessarily {predicate})"),
+        (DefenderChoice.DONT_KNOW, ""),
+    )
+
+
+def _challenger_menu(choice, subject, predicate, reason, copula):
+    if choice == DefenderChoice.REASON_NOT_ESTABLISHED:
+        return (
+            f"{subject} {copula} {reason}, because of being…",
+            f"{subject} {copula} not {reason}, because of being…",
+        ) + GENERAL_CHALLENGER_OPTIONS
+    return (
+        f"Whoever or whatever {copula} {reason} is necessarily {predicate}, because of being…",
+        f"Whoever or whatever {copula} {reason} is not necessarily {predicate}, because of being…",
+    ) + GENERAL_CHALLENGER_OPTIONS
+
+
+def configure_menu_cache(maxsize=MENU_CACHE_SIZE):
+    """Replace the menu caches with empty ones holding up to ``maxsize`` entries each."""
+    global _cached_defender_menu, _cached_challenger_menu
+    _cached_defender_menu = lru_cache(maxsize)(_defender_menu)
+    _cached_challenger_menu = lru_cache(maxsize)(_challenger_menu)
+
+
+def menu_cache_info():
+    """Hit/miss counters for the menu caches."""
+    return {
+        "defender": _cached_defender_menu.cache_info()._asdict(),
+        "challenger": _cached_challenger_menu.cache_info()._asdict(),
+    }
+
+
+configure_menu_cache()
+
+
+def build_defender_explanations(subject, predicate, reason, copula):
+    if subject and predicate and not reason:
+        return UNREASONED_EXPLANATIONS
+    if subject and predicate and reason:
+        return _cached_defender_menu(subject, predicate, reason, copula)
+    return ()
+
+
+def build_challenger_options(choice, subject, predicate, reason, copula):
+    # Key on the enum member and only the fields the text uses, so
+    # equal menus share one cache entry
+    if choice == DefenderChoice.REASON_NOT_ESTABLISHED:
+        return _cached_challenger_menu(DefenderChoice.REASON_NOT_ESTABLISHED,
+                                       subject, "", reason, copula)
+    if choice == DefenderChoice.NO_PERVASION:
+        return _cached_challenger_menu(DefenderChoice.NO_PERVASION,
+                                       "", predicate, reason, copula)
+    if choice:
+        return GENERAL_CHALLENGER_OPTIONS
+    return ()
+
+
+def general_challenger_options():
+    return GENERAL_CHALLENGER_OPTIONS
+
+
+def determine_turn_state(st):
+    if st.role_switch:
+        return {"who": "challenger", "mode": "role_flip_marker", "label": "Roles switched"}
+
+    if st.need_reason and not st.reason:
+        return {"who": "challenger", "mode": "need_reason", "label": "Complete the reasoning"}
+
+    if st.challenger_choice == ASK_OPTION:
+        if not st.question_text:
+            return {"who": "challenger", "mode": "ask_question", "label": "Ask a question"}
+        if st.question_text and not st.answer_text:
+            return {"who": "defender", "mode": "answer_question", "label": "Answer the question"}
+        return {"who": "challenger", "mode": "challenger_menu", "label": "Choose next move"}
+
+    if st.challenger_choice == COMPARE_OPTION:
+        if not (st.compare_a and st.compare_b):
+            return {"who": "challenger", "mode": "compare_names", "label": "Enter items to compare"}
+        if not st.compare_option:
+            return {"who": "defender", "mode": "compare_choice", "label": "Choose a diagram"}
+        return {"who": "challenger", "mode": "challenger_menu", "label": "Choose next move"}
+
+    if st.challenger_choice == TSAR_OPTION:
+        if not st.contradiction_choice:
+            return {"who": "defender", "mode": "tsar_decide", "label": "Admit or deny the Tsar"}
+        return {"who": "challenger", "mode": "challenger_menu", "label": "Choose next move"}
+
+    if not st.subject and not st.predicate and not st.reason:
+        return {"who": "challenger", "mode": "new_consequence", "label": "Propose a consequence"}
+
+    if st.subject and st.predicate and not st.defender_choice:
+        return {"who": "defender", "mode": "defender_choice", "label": "Respond to the consequence"}
+
+    if st.defender_choice:
+        if st.challenger_choice and (st.challenger_choice not in GENERAL_CHALLENGER_OPTIONS) and not st.challenger_reason:
+            return {"who": "challenger", "mode": "challenger_menu", "label": "Complete the reasoning"}
+        return {"who": "challenger", "mode": "challenger_menu", "label": "Choose next move"}
+
+    return {"who": "challenger", "mode": "new_consequence", "label": "Propose a consequence"}
+
+
+# Turn modes in the order the active step is picked (latest step first
+# within a mode)
+TURN_PRIORITY = (
+    "need_reason",
+    "ask_question",
+    "answer_question",
+    "compare_names",
+    "compare_choice",
+    "tsar_decide",
+    "defender_choice",
+    "new_consequence",
+    "challenger_menu",
+)
+
+
+_PRIORITY_RANK = {mode: rank for rank, mode in enumerate(TURN_PRIORITY)}
+
+
+def pick_active_index(steps):
+    # One pass from the end: the latest step of each mode is the first one
+    # seen, so keep the best-ranked and stop early at the top mode
+    best, best_rank = None, len(TURN_PRIORITY)
+    for i in range(len(steps) - 1, -1, -1):
+        rank = _PRIORITY_RANK.get(determine_turn_state(steps[i])["mode"], best_rank)
+        if rank < best_rank:
+            best, best_rank = i, rank
+            if rank == 0:
+                break
+    if best is not None:
+        return best
+    # Only role-switch markers
+    return max(0, len(steps) - 1)
+
+
+class TurnIndex:
+    """Step indices bucketed by turn mode, kept current as steps change.
+
+    Gives the same answer as pick_active_index() without rescanning: each
+    bucket is a max-heap of indices, and entries whose step has since moved
+    to another mode are dropped lazily when they surface.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.modes = []
+        self.buckets = {mode: [] for mode in TURN_PRIORITY}
+        for i in range(len(steps)):
+            self.update(i)
+
+    def update(self, i):
+        """Re-file step ``i`` after it changed (or was appended)."""
+        mode = determine_turn_state(self.steps[i])["mode"]
+        if i < len(self.modes):
+            if self.modes[i] == mode:
+                return
+            self.modes[i] = mode
+        else:
+            self.modes.append(mode)
+        if mode in self.buckets:
+            heappush(self.buckets[mode], -i)
+
+    def active(self):
+        for mode in TURN_PRIORITY:
+            bucket = self.buckets[mode]
+            while bucket and self.modes[-bucket[0]] != mode:
+                heappop(bucket)
+            if bucket:
+                return -bucket[0]
+        # Only role-switch markers left
+        return max(0, len(self.steps) - 1)
+
+
+def label_step(st, parity):
+    """Set one step's role labels for ``parity``; returns the parity after it."""
+    if parity == 0:
+        cha = "Player 1 (Challenger)"
+        deff = "Player 2 (Defender)"
+    else:
+        cha = "Player 2 (Challenger)"
+        deff = "Player 1 (Defender)"
+    st.cha_label = cha
+    st.def_label = deff
+    st.effective_flipped = parity == 1
+
+    if st.role_switch:
+        next_parity = parity ^ 1
+        if next_parity == 0:
+            to_cha = "Player 1 becomes Challenger"
+            to_def = "Player 2 becomes Defender"
+        else:
+            to_cha = "Player 2 becomes Challenger"
+            to_def = "Player 1 becomes Defender"
+        st.switch_to_cha = to_cha
+        st.switch_to_def = to_def
+        return next_parity
+    return parity
+
+
+# (challenger, defender) labels for each parity
+CURRENT_LABELS = (
+    ("Player 1 (Challenger)", "Player 2 (Defender)"),
+    ("Player 2 (Challenger)", "Player 1 (Defender)"),
+)
+
+
+def compute_role_labels(steps, initial_flipped_flag):
+    parity = 1 if (initial_flipped_flag == "1") else 0
+    for st in steps:
+        parity = label_step(st, parity)
+    return CURRENT_LABELS[parity]
+
+
+def current_role_labels(steps, initial_flipped_flag):
+    """What compute_role_labels() returns, read off already-labelled steps."""
+    if not steps:
+        return CURRENT_LABELS[1 if initial_flipped_flag == "1" else 0]
+    last = steps[-1]
+    return CURRENT_LABELS[int(last.effective_flipped) ^ int(last.role_switch)]
+
+
+# ------------------------------------------------------------
+# Steps
+# ------------------------------------------------------------
+# Raw per-step fields as they post back in "<field>_<i>", with their defaults.
+STEP_FIELDS = {
+    "subject": "", "copula": "is", "predicate": "", "reason": "",
+    "defender_choice": "", "challenger_choice": "", "challenger_reason": "",
+    "contradiction_choice": "",
+    "question_text": "", "answer_text": "",
+    "compare_a": "", "compare_b": "", "compare_option": "", "compare_locked": "0",
+    "tsar_called": "0", "need_reason": "0", "role_switch": "0",
+}
+FLAG_FIELDS = ("compare_locked", "tsar_called", "need_reason", "role_switch")
+CHOICE_FIELDS = {
+    "defender_choice": DefenderChoice,
+    "challenger_choice": ChallengerChoice,
+    "contradiction_choice": TsarReply,
+    "compare_option": Diagram,
+}
+LABEL_FIELDS = ("cha_label", "def_label", "effective_flipped", "switch_to_cha", "switch_to_def")
+
+
+# Enum class -> {value: member}; a dict lookup is much cheaper than Enum(value)
+_MEMBERS = {enum_cls: {m.value: m for m in enum_cls} for enum_cls in CHOICE_FIELDS.values()}
+
+
+def _choice(enum_cls, value):
+    """Known choices become enum members; anything else is interned text."""
+    member = _MEMBERS[enum_cls].get(value)
+    return member if member is not None else sys.intern(value)
+
+
+@dataclass(slots=True, eq=False)
+class Step:
+    """One card of the debate.
+
+    Text fields are interned, choices are enum members where the value is
+    one of the fixed options, and the menus are shared tuples rebuilt by
+    refresh() whenever the fields they depend on change.
+    """
+    subject: str = ""
+    copula: str = "is"
+    predicate: str = ""
+    reason: str = ""
+
+    defender_choice: str = ""
+    challenger_choice: str = ""
+    challenger_reason: str = ""
+
+    # Tsar
+    contradiction_choice: str = ""
+    tsar_called: bool = False
+
+    # Ask
+    question_text: str = ""
+    answer_text: str = ""
+
+    # Compare
+    compare_a: str = ""
+    compare_b: str = ""
+    compare_option: str = ""
+    compare_locked: bool = False
+
+    # Why?
+    need_reason: bool = False
+
+    # Role switch marker
+    role_switch: bool = False
+
+    # Menus, derived from the fields above by refresh()
+    defender_explanations: tuple = ()
+    challenger_options: tuple = ()
+    contradiction_options: tuple = ()
+
+    # Role labels, set by label_step()
+    cha_label: str = "Player 1 (Challenger)"
+    def_label: str = "Player 2 (Defender)"
+    effective_flipped: bool = False
+    switch_to_cha: str = ""
+    switch_to_def: str = ""
+
+    @property
+    def consequence(self):
+        if self.subject and self.predicate and self.reason:
+            return f"It follows that {self.subject} {self.copula} {self.predicate}, because of being {self.reason}."
+        return ""
+
+    def refresh(self):
+        """Rebuild the menus from the current fields."""
+        self.defender_explanations = build_defender_explanations(
+            self.subject, self.predicate, self.reason, self.copula
+        )
+
+        # Base challenger options
+        challenger_opts = ()
+        if self.defender_choice and not self.need_reason:
+            challenger_opts = build_challenger_options(
+                self.defender_choice, self.subject, self.predicate, self.reason, self.copula
+            )
+
+        # Special flows surface general menu when resolved
+        choice = self.challenger_choice
+        if not self.need_reason:
+            if (choice == ASK_OPTION and self.question_text and self.answer_text) or \
+               (choice == COMPARE_OPTION and self.compare_a and self.compare_b and self.compare_option) or \
+               (choice == TSAR_OPTION and self.contradiction_choice) or \
+               (self.defender_choice == DefenderChoice.ACCEPT):
+                challenger_opts = GENERAL_CHALLENGER_OPTIONS
+        self.challenger_options = challenger_opts
+
+        self.contradiction_options = (
+            CONTRADICTION_OPTIONS
+            if choice == TSAR_OPTION and not self.contradiction_choice else ()
+        )
+        return self
+
+    @classmethod
+    def from_fields(cls, fields):
+        """Build a step from raw form-style strings (flags as "0"/"1")."""
+        st = cls()
+        for field, value in fields.items():
+            if field in FLAG_FIELDS:
+                value = value == "1"
+            elif field in CHOICE_FIELDS:
+                value = _choice(CHOICE_FIELDS[field], value)
+            else:
+                value = sys.intern(value)
+            setattr(st, field, value)
+        return st
+
+    def form_fields(self):
+        """The raw fields as form-style strings."""
+        f = {field: getattr(self, field) for field in STEP_FIELDS}
+        for field in FLAG_FIELDS:
+            f[field] = "1" if f[field] else "0"
+        return f
+
+    def to_dict(self, menus=False):
+        """JSON-ready fields and role labels (plus the menus if asked)."""
+        d = {field: getattr(self, field) for field in STEP_FIELDS}
+        d.update((field, getattr(self, field)) for field in LABEL_FIELDS)
+        if menus:
+            d.update(
+                consequence=self.consequence,
+                defender_explanations=self.defender_explanations,
+                challenger_options=self.challenger_options,
+                contradiction_options=self.contradiction_options,
+            )
+        return d
+
+    @classmethod
+    def from_dict(cls, data):
+        st = cls()
+        for field in STEP_FIELDS:
+            if field in data:
+                value = data[field]
+                if field in CHOICE_FIELDS:
+                    value = _choice(CHOICE_FIELDS[field], value)
+                elif field not in FLAG_FIELDS:
+                    value = sys.intern(value)
+                setattr(st, field, value)
+        for field in LABEL_FIELDS:
+            if field in data:
+                setattr(st, field, data[field])
+        return st.refresh()
+
+
+class StepView:
+    """Read-only adapter that shows a Step to templates the old way.
+
+    Flags read as "1"/"0", so checks like ``step.need_reason == '1'`` and
+    the hidden inputs keep working unchanged.
+    """
+    __slots__ = ("_step",)
+
+    def __init__(self, step):
+        self._step = step
+
+    def __getattr__(self, name):
+        value = getattr(self._step, name)
+        if value is True:
+            return "1"
+        if value is False:
+            return "0"
+        return value
+
+
+def build_step(fields):
+    """Build a full step (with derived menus) from its raw form fields."""
+    f = dict(STEP_FIELDS)
+    f.update(fields)
+
+    # Tsar persistence flag
+    if f["challenger_choice"] == TSAR_OPTION or f["contradiction_choice"]:
+        f["tsar_called"] = "1"
+
+    # "Why?"
+    if f["defender_choice"] == WHY_OPTION and not f["reason"]:
+        f["need_reason"] = "1"
+
+    return Step.from_fields(f).refresh()
+
+
+# ------------------------------------------------------------
+# Engine
+# ------------------------------------------------------------
+class MoveError(ValueError):
+    """A move that doesn't fit the debate's current turn."""
+
+
+# Move type -> (turn mode it answers, {move key: step field})
+MOVES = {
+    "consequence": ("new_consequence", {
+        "subject": "subject", "copula": "copula", "predicate": "predicate", "reason": "reason",
+    }),
+    "respond":         ("defender_choice", {"choice": "defender_choice"}),
+    "complete_reason": ("need_reason",     {"reason": "challenger_reason"}),
+    "challenge":       ("challenger_menu", {"choice": "challenger_choice", "reason": "challenger_reason"}),
+    "ask":             ("ask_question",    {"question": "question_text"}),
+    "answer":          ("answer_question", {"answer": "answer_text"}),
+    "compare":         ("compare_names",   {"a": "compare_a", "b": "compare_b"}),
+    "diagram":         ("compare_choice",  {"option": "compare_option"}),
+    "tsar_reply":      ("tsar_decide",     {"choice": "contradiction_choice"}),
+}
+
+
+class DebateEngine:
+    """Applies moves to one debate's step list, in place.
+
+    Only the active step and any steps appended by the move are touched;
+    ``changed`` and ``appended_from`` tell the caller what to persist and
+    re-render. Pass the debate's previous ``index`` to avoid rebuilding it;
+    steps listed in ``changed`` are re-filed in it.
+    """
+
+    def __init__(self, steps, flipped="0", changed=(), index=None):
+        self.steps = steps
+        self.flipped = flipped
+        self.changed = set(changed)
+        self.appended_from = len(steps)
+        if index is None or index.steps is not steps:
+            self.index = TurnIndex(steps)
+        else:
+            self.index = index
+            for i in self.changed:
+                index.update(i)
+
+    @property
+    def dirty(self):
+        return self.changed | set(range(self.appended_from, len(self.steps)))
+
+    def active_index(self):
+        return self.index.active()
+
+    def turn_state(self):
+        """The active turn, naming the player who has it under the current roles."""
+        i = self.active_index()
+        state = dict(determine_turn_state(self.steps[i]), index=i)
+        cha, deff = current_role_labels(self.steps, self.flipped)
+        state["player"] = cha if state["who"] == "challenger" else deff
+        return state
+
+    # --- Moves ---------------------------------------------------------
+    def apply(self, move):
+        """Apply one typed move, e.g. {"type": "respond", "choice": "Why?"}."""
+        kind = move.get("type")
+        if kind == "switch_roles":
+            self.switch_roles()
+            return
+        if not isinstance(kind, str) or kind not in MOVES:
+            raise MoveError(f"Unknown move type: {kind!r}")
+
+        mode, keys = MOVES[kind]
+        i = self.active_index()
+        st = self.steps[i]
+        current = determine_turn_state(st)["mode"]
+        if current != mode:
+            raise MoveError(f"A {kind!r} move doesn't answer the current turn ({current!r})")
+
+        fields = {field: str(move[key]).strip() for key, field in keys.items() if move.get(key) is not None}
+        self._check(kind, st, fields)
+        self.update_fields(i, fields)
+        self.advance()
+
+    def _check(self, kind, st, fields):
+        if kind == "consequence":
+            if not (fields.get("subject") and fields.get("predicate")):
+                raise MoveError("A consequence needs a subject and a predicate")
+            if fields.get("copula", "is") not in ("is", "are"):
+                raise MoveError("The copula must be 'is' or 'are'")
+        elif kind == "respond":
+            if fields.get("defender_choice") not in [label for label, _ in st.defender_explanations]:
+                raise MoveError("Not one of the defender's answers")
+        elif kind == "challenge":
+            if fields.get("challenger_choice", st.challenger_choice) not in st.challenger_options:
+                raise MoveError("Not one of the challenger's options")
+        elif kind == "diagram":
+            if fields.get("compare_option") not in COMPARE_CHOICES:
+                raise MoveError("Not one of the diagram choices")
+        elif kind == "tsar_reply":
+            if fields.get("contradiction_choice") not in st.contradiction_options:
+                raise MoveError(f"Answer the Tsar with {ADMIT_OPT.value!r} or {DENY_OPT.value!r}")
+        elif not any(fields.values()):
+            raise MoveError(f"A {kind!r} move needs some text")
+
+    def update_fields(self, i, fields):
+        """Overlay raw fields onto step ``i`` and rebuild its menus."""
+        raw = self.steps[i].form_fields()
+        raw.update(fields)
+        self.steps[i] = build_step(raw)
+        self._label(i)
+        self.changed.add(i)
+        self.index.update(i)
+
+    def switch_roles(self):
+        self._append(build_step({"role_switch": "1"}))
+
+    def advance(self, submitted=True):
+        """Run the per-turn transitions on the active step.
+
+        ``submitted`` is False for utility posts (Switch roles, Generate
+        Transcript), which must not lock a Compare diagram.
+        """
+        steps = self.steps
+        active_idx = self.active_index()
+        cur = steps[active_idx] if steps else None
+
+        # --- Per-turn transitions (apply to the active step, not just the last) ---
+        if cur:
+            # Work on a copy: the stored step may be shared with earlier
+            # versions of the debate (see history.py)
+            cur = steps[active_idx] = replace(cur)
+            self.changed.add(active_idx)
+
+            # Complete "Why?"
+            if cur.need_reason and cur.challenger_reason:
+                cur.reason = cur.challenger_reason.strip()
+                cur.need_reason = False
+                cur.defender_choice = ""
+                cur.challenger_choice = ""
+
+            # Compare: lock when submitted (to persist choice/diagram)
+            compare_done = (
+                cur.challenger_choice == COMPARE_OPTION
+                and bool(cur.compare_a) and bool(cur.compare_b)
+                and bool(cur.compare_option)
+            )
+            if compare_done and submitted:
+                cur.compare_locked = True
+
+            # Tsar decided (preserve tsar_called)
+            if cur.challenger_choice == TSAR_OPTION and cur.contradiction_choice and not cur.need_reason:
+                cur.tsar_called = True
+
+            # Resolved Ask/Compare/Tsar and "I accept" surface the general menu
+            cur.refresh()
+            self.index.update(active_idx)
+
+            # Autogenerated follow-up consequence
+            if (
+                cur.defender_choice in (DefenderChoice.REASON_NOT_ESTABLISHED, DefenderChoice.NO_PERVASION)
+                and cur.challenger_choice
+                and cur.challenger_choice not in GENERAL_CHALLENGER_OPTIONS
+                and cur.challenger_reason.strip()
+            ):
+                choice_txt = cur.challenger_choice.strip()
+                new_subject = cur.subject
+                new_copula  = cur.copula
+                new_predicate = cur.predicate
+                new_reason = cur.challenger_reason.strip()
+
+                if cur.defender_choice == DefenderChoice.REASON_NOT_ESTABLISHED:
+                    if choice_txt.startswith(f"{cur.subject} {cur.copula} not {cur.reason}"):
+                        new_predicate = f"not {cur.reason}"
+                    else:
+                        new_predicate = cur.reason
+                elif cur.defender_choice == DefenderChoice.NO_PERVASION:
+                    new_subject = f"Whoever or whatever {cur.copula} {cur.reason}"
+                    if "not necessarily" in choice_txt:
+                        new_predicate = f"not necessarily {cur.predicate}"
+                    else:
+                        new_predicate = f"necessarily {cur.predicate}"
+
+                self._append(build_step({
+                    "subject": new_subject, "copula": new_copula,
+                    "predicate": new_predicate, "reason": new_reason,
+                }))
+
+            # ✅ Handle "Write a new consequence" from the active step
+            elif cur.challenger_choice == NEW_CONSEQ_OPT and not cur.need_reason:
+                self._append(build_step({}))
+
+        # Normalize earlier Why? steps if reason filled later (only steps
+        # changed by this move can have changed since they were stored)
+        for i in self.changed:
+            s = steps[i]
+            if s.defender_choice == WHY_OPTION and s.reason:
+                s.need_reason = False
+                s.defender_choice = ""
+                s.challenger_choice = ""
+                s.refresh()
+                self.index.update(i)
+
+    def _append(self, st):
+        self.steps.append(st)
+        self._label(len(self.steps) - 1)
+        self.index.update(len(self.steps) - 1)
+
+    def _label(self, i):
+        if i == 0:
+            parity = 1 if self.flipped == "1" else 0
+        else:
+            prev = self.steps[i - 1]
+            parity = int(prev.effective_flipped) ^ int(prev.role_switch)
+        label_step(self.steps[i], parity)
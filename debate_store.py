@@ -0,0 +1,495 @@
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from debate_engine import STEP_FIELDS, Step, compute_role_labels
+
+# ------------------------------------------------------------
+# Server-side debate storage
+#
+# A debate record is a plain dict:
+#   {"steps": [step, ...], "flipped": "0", "preface": "", "rev": 0, ...}
+# Steps are debate_engine.Step objects; any other keys are small
+# bookkeeping values stored alongside them, except "_"-prefixed ones,
+# which are per-process caches and never written out.
+# ------------------------------------------------------------
+
+
+def new_debate_id():
+    return uuid.uuid4().hex
+
+
+def new_debate(steps, flipped="0", preface=""):
+    return {"steps": steps, "flipped": flipped, "preface": preface, "rev": 0}
+
+
+class MemoryDebateStore:
+    """Keeps debates in process memory (each gunicorn worker holds its own
+    shard; see sharding.py).
+
+    Past ``max_debates`` the least recently used debate is evicted.
+    ``on_evict``, if set, is called with the id of every debate evicted or
+    deleted, so whatever else refers to it (the search index) can let go.
+    """
+
+    def __init__(self, max_debates=10000, on_evict=None):
+        self.max_debates = max_debates
+        self.on_evict = on_evict
+        self._debates = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, debate, debate_id=None):
+        debate_id = debate_id or new_debate_id()
+        self.save(debate_id, debate)
+        return debate_id
+
+    def load(self, debate_id):
+        with self._lock:
+            debate = self._debates.get(debate_id)
+            if debate is not None:
+                self._debates.move_to_end(debate_id)
+            return debate
+
+    def save(self, debate_id, debate, dirty=None):
+        with self._lock:
+            debate["rev"] = debate.get("rev", 0) + 1
+            self._debates[debate_id] = debate
+            self._debates.move_to_end(debate_id)
+            evicted = []
+            while len(self._debates) > self.max_debates:
+                evicted.append(self._debates.popitem(last=False)[0])
+        self._evicted(evicted)
+
+    def delete(self, debate_id):
+        with self._lock:
+            found = self._debates.pop(debate_id, None) is not None
+        self._evicted([debate_id] if found else [])
+
+    def _evicted(self, debate_ids):
+        # Outside the lock: the callback may take locks of its own
+        if self.on_evict is not None:
+            for debate_id in debate_ids:
+                self.on_evict(debate_id)
+
+    def ids(self):
+        """The ids of every stored debate, least recently used first."""
+        with self._lock:
+            return list(self._debates)
+
+
+def _paged_ids(pool, table, page=1000):
+    """Yield ``table``'s ids in order, one short query per ``page`` of them,
+    so a long export never holds a read lock (or a connection) that would
+    block saves."""
+    last = ""
+    while True:
+        with pool.connection() as conn:
+            rows = conn.execute(f"SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?",
+                                (last, page)).fetchall()
+        for (debate_id,) in rows:
+            yield debate_id
+        if len(rows) < page:
+            return
+        last = rows[-1][0]
+
+
+class ConnectionPool:
+    """SQLite connections that a store's requests borrow and give back.
+
+    A request holds a connection only for one load or save, so connections
+    are reused whether requests run on threads or, under the gevent worker,
+    on greenlets (where threading.local would open one per greenlet and
+    never close it). Up to ``size`` idle connections are kept; any more are
+    closed as they come back.
+
+    gunicorn --preload opens the store in the master and then forks the
+    workers; an SQLite connection must not be used on both sides of a fork,
+    so a forked process drops the idle ones it inherited.
+    """
+
+    def __init__(self, path, size=8, pragmas=()):
+        self.path = path
+        self.size = size
+        self.pragmas = pragmas
+        self._idle = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    @contextmanager
+    def connection(self):
+        conn = self._take()
+        try:
+            yield conn
+        finally:
+            self._give(conn)
+
+    def _take(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._idle = []  # the parent's: neither use nor close them
+            if self._idle:
+                return self._idle.pop()
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def _give(self, conn):
+        if conn.in_transaction:  # an error left a write half done
+            conn.rollback()
+        with self._lock:
+            if self._pid == os.getpid() and len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+
+class SQLiteDebateStore:
+    """Keeps debates in a local SQLite file, one row per step.
+
+    ``save`` only rewrites the steps listed in ``dirty``, and ``load`` serves
+    from a per-process cache as long as the stored revision has not moved,
+    so a move costs the same whether the debate has 5 steps or 500.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS debates (
+            id      TEXT PRIMARY KEY,
+            rev     INTEGER NOT NULL DEFAULT 0,
+            meta    TEXT NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS steps (
+            debate_id TEXT NOT NULL,
+            idx       INTEGER NOT NULL,
+            data      TEXT NOT NULL,
+            PRIMARY KEY (debate_id, idx)
+        );
+    """
+
+    def __init__(self, path, cache_size=1000):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ConnectionPool(path)
+        with self._pool.connection() as conn, conn:
+            conn.executescript(self.SCHEMA)
+
+    def _remember(self, debate_id, debate):
+        with self._lock:
+            self._cache[debate_id] = debate
+            self._cache.move_to_end(debate_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def create(self, debate, debate_id=None):
+        debate_id = debate_id or new_debate_id()
+        self.save(debate_id, debate)
+        return debate_id
+
+    def load(self, debate_id):
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT rev, meta FROM debates WHERE id = ?", (debate_id,)).fetchone()
+            if row is None:
+                return None
+            rev, meta = row
+
+            with self._lock:
+                cached = self._cache.get(debate_id)
+            if cached is not None and cached["rev"] == rev:
+                return cached
+
+            steps = [
+                Step.from_dict(json.loads(data))
+                for (data,) in conn.execute(
+                    "SELECT data FROM steps WHERE debate_id = ? ORDER BY idx", (debate_id,)
+                )
+            ]
+        debate = json.loads(meta)
+        debate.update(steps=steps, rev=rev)
+        self._remember(debate_id, debate)
+        return debate
+
+    def save(self, debate_id, debate, dirty=None):
+        steps = debate["steps"]
+        indices = range(len(steps)) if dirty is None else sorted(i for i in dirty if i < len(steps))
+        debate["rev"] = debate.get("rev", 0) + 1
+
+        meta = {k: v for k, v in debate.items() if k not in ("steps", "rev") and not k.startswith("_")}
+
+        with self._pool.connection() as conn, conn:
+            conn.execute(
+                "INSERT INTO debates (id, rev, meta, updated) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET rev = excluded.rev, meta = excluded.meta, "
+                "updated = excluded.updated",
+                (debate_id, debate["rev"], json.dumps(meta), time.time()),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO steps (debate_id, idx, data) VALUES (?, ?, ?)",
+                [(debate_id, i, json.dumps(steps[i].to_dict())) for i in indices],
+            )
+            conn.execute(
+                "DELETE FROM steps WHERE debate_id = ? AND idx >= ?", (debate_id, len(steps))
+            )
+        self._remember(debate_id, debate)
+
+    def delete(self, debate_id):
+        with self._pool.connection() as conn, conn:
+            conn.execute("DELETE FROM steps WHERE debate_id = ?", (debate_id,))
+            conn.execute("DELETE FROM debates WHERE id = ?", (debate_id,))
+        with self._lock:
+            self._cache.pop(debate_id, None)
+
+    def ids(self):
+        """Yield the id of every stored debate, without reading them all first."""
+        return _paged_ids(self._pool, "debates")
+
+
+# Fields a step stores when they differ from a fresh Step; role labels are
+# left out and recomputed on load.
+_BLANK_STEP = Step()
+
+
+def pack_step(st):
+    """A step's non-default fields, for compact snapshots and log records."""
+    return {
+        field: getattr(st, field)
+        for field in STEP_FIELDS
+        if getattr(st, field) != getattr(_BLANK_STEP, field)
+    }
+
+
+def _meta(debate):
+    return {k: v for k, v in debate.items() if k not in ("steps", "rev") and not k.startswith("_")}
+
+
+class MoveLogDebateStore:
+    """Keeps debates as an append-only move log in SQLite, with snapshots.
+
+    Every save appends one record to ``moves``: the steps it changed, the new
+    step count and, when it changed, the debate's bookkeeping. Every
+    ``snapshot_every`` revisions a compressed copy of the whole step list
+    goes to ``snapshots``, so loading a debate reads its latest snapshot and
+    replays at most ``snapshot_every`` records, however long the debate.
+
+    Writes are queued and committed by one background thread, which
+    drains the queue into a single transaction at most every
+    ``commit_interval`` seconds. Many debates saving at once therefore
+    share a commit. The database runs in WAL mode, so loads are not
+    blocked by the writer.
+
+    Up to ``commit_interval`` of saves can be lost if the process dies.
+    flush() waits for everything queued so far. Loads are served from a
+    per-process cache unless the stored revision is newer.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS debate_heads (
+            id      TEXT PRIMARY KEY,
+            rev     INTEGER NOT NULL,
+            updated REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS moves (
+            debate_id TEXT NOT NULL,
+            rev       INTEGER NOT NULL,
+            data      TEXT NOT NULL,
+            PRIMARY KEY (debate_id, rev)
+        );
+        CREATE TABLE IF NOT EXISTS snapshots (
+            debate_id TEXT NOT NULL,
+            rev       INTEGER NOT NULL,
+            data      BLOB NOT NULL,
+            PRIMARY KEY (debate_id, rev)
+        );
+    """
+
+    def __init__(self, path, snapshot_every=50, commit_interval=0.05, batch_size=500,
+                 cache_size=1000):
+        self.path = path
+        self.snapshot_every = snapshot_every
+        self.commit_interval = commit_interval
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ConnectionPool(path, pragmas=("PRAGMA synchronous=NORMAL",))
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_pid = None
+        with self._pool.connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                conn.executescript(self.SCHEMA)
+
+    def _remember(self, debate_id, debate):
+        with self._lock:
+            self._cache[debate_id] = debate
+            self._cache.move_to_end(debate_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --- Writes ---------------------------------------------------------
+    def create(self, debate, debate_id=None):
+        debate_id = debate_id or new_debate_id()
+        self.save(debate_id, debate)
+        return debate_id
+
+    def save(self, debate_id, debate, dirty=None):
+        steps = debate["steps"]
+        debate["rev"] = rev = debate.get("rev", 0) + 1
+        meta = _meta(debate)
+
+        if rev - debate.get("_snapshot_rev", 0) >= self.snapshot_every or rev == 1:
+            data = {"meta": meta, "steps": [pack_step(st) for st in steps]}
+            self._enqueue(("snapshot", debate_id, rev, zlib.compress(json.dumps(data).encode())))
+            debate["_snapshot_rev"] = rev
+        else:
+            indices = range(len(steps)) if dirty is None else sorted(i for i in dirty if i < len(steps))
+            record = {"n": len(steps), "steps": {i: pack_step(steps[i]) for i in indices}}
+            if meta != debate.get("_logged_meta"):
+                record["meta"] = meta
+            self._enqueue(("move", debate_id, rev, json.dumps(record)))
+        debate["_logged_meta"] = meta
+        self._remember(debate_id, debate)
+
+    def delete(self, debate_id):
+        self._enqueue(("delete", debate_id, 0, None))
+        with self._lock:
+            self._cache.pop(debate_id, None)
+
+    def flush(self):
+        """Block until every save queued so far is committed."""
+        if self._writer is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def _enqueue(self, item):
+        # Started lazily so a worker forked after import gets its own thread
+        if self._writer_pid != os.getpid():
+            self._writer_pid = os.getpid()
+            self._writer = threading.Thread(target=self._write_loop, name="move-log", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+        self._queue.put(item)
+
+    def _write_loop(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.commit_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit(conn, batch)
+
+    def _commit(self, conn, batch):
+        waiters = []
+        heads = {}
+        with conn:
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                    continue
+                kind, debate_id, rev, data = item
+                if kind == "delete":
+                    heads.pop(debate_id, None)
+                    for table, column in (("moves", "debate_id"), ("snapshots", "debate_id"),
+                                          ("debate_heads", "id")):
+                        conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (debate_id,))
+                    continue
+                table = "snapshots" if kind == "snapshot" else "moves"
+                conn.execute(f"INSERT OR REPLACE INTO {table} (debate_id, rev, data) VALUES (?, ?, ?)",
+                             (debate_id, rev, data))
+                heads[debate_id] = rev
+            now = time.time()
+            conn.executemany(
+                "INSERT INTO debate_heads (id, rev, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET rev = excluded.rev, updated = excluded.updated",
+                [(debate_id, rev, now) for debate_id, rev in heads.items()],
+            )
+        for done in waiters:
+            done.set()
+
+    # --- Reads ----------------------------------------------------------
+    def ids(self):
+        """Yield the id of every stored debate (saves still queued included)."""
+        self.flush()
+        return _paged_ids(self._pool, "debate_heads")
+
+    def load(self, debate_id):
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT rev FROM debate_heads WHERE id = ?", (debate_id,)).fetchone()
+            with self._lock:
+                cached = self._cache.get(debate_id)
+            # The cache may be ahead of the database (saves still queued)
+            if cached is not None and (row is None or cached["rev"] >= row[0]):
+                return cached
+            if row is None:
+                return None
+
+            snap = conn.execute(
+                "SELECT rev, data FROM snapshots WHERE debate_id = ? ORDER BY rev DESC LIMIT 1",
+                (debate_id,),
+            ).fetchone()
+            if snap is None:
+                return None
+            moves = conn.execute(
+                "SELECT rev, data FROM moves WHERE debate_id = ? AND rev > ? ORDER BY rev",
+                (debate_id, snap[0]),
+            ).fetchall()
+        snapshot_rev, data = snap
+        data = json.loads(zlib.decompress(data))
+        meta = data["meta"]
+        steps = [Step.from_dict(d) for d in data["steps"]]
+
+        rev = snapshot_rev
+        for rev, record in moves:
+            record = json.loads(record)
+            del steps[record["n"]:]
+            for i, packed in sorted(record["steps"].items(), key=lambda kv: int(kv[0])):
+                i = int(i)
+                st = Step.from_dict(packed)
+                if i < len(steps):
+                    steps[i] = st
+                else:
+                    steps.append(st)
+            meta = record.get("meta", meta)
+
+        compute_role_labels(steps, meta.get("flipped", "0"))
+        debate = dict(meta, steps=steps, rev=rev, _snapshot_rev=snapshot_rev, _logged_meta=meta)
+        self._remember(debate_id, debate)
+        return debate
+
+
+def open_store(kind=None, path=None):
+    """Build the store selected by DEBATE_STORE ("memory", "sqlite" or "movelog")."""
+    kind = (kind or os.environ.get("DEBATE_STORE", "memory")).lower()
+    if kind == "memory":
+        return MemoryDebateStore(int(os.environ.get("DEBATE_STORE_MAX", "10000")))
+    if kind == "sqlite":
+        return SQLiteDebateStore(path or os.environ.get("DEBATE_DB", "debates.sqlite3"))
+    if kind == "movelog":
+        return MoveLogDebateStore(
+            path or os.environ.get("DEBATE_DB", "debates.sqlite3"),
+            snapshot_every=int(os.environ.get("DEBATE_SNAPSHOT_EVERY", "50")),
+            commit_interval=int(os.environ.get("DEBATE_COMMIT_MS", "50")) / 1000,
+        )
+    raise ValueError(f"Unknown DEBATE_STORE backend: {kind!r}")
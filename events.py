@@ -0,0 +1,111 @@
+"""Server-Sent Event streams that push each move to the other player.
+
+Every save of a watched debate publishes one event, and every open
+stream for that debate receives it. The event id is the debate's
+revision, so a reconnecting EventSource resumes from its Last-Event-ID.
+
+A channel keeps a short backlog of encoded events, and all of its
+streams wait on the same Condition. A publish therefore encodes the
+event once and wakes the waiting streams; nothing is copied per client.
+Streams are plain generators that block on that Condition. Under the
+gevent worker (see gunicorn.conf.py) each open stream is a greenlet, not a
+thread, so one worker can hold many of them.
+
+Channels live in process memory, like MemoryDebateStore. A debate's
+players and spectators must all reach the same worker process; with
+several workers, sharding.py sends them to the one that owns the debate.
+"""
+import json
+import threading
+from collections import deque
+
+KEEPALIVE_SECONDS = 15
+RETRY_MS = 3000
+
+
+def encode_event(event_id, name, data):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Channel:
+    def __init__(self, backlog):
+        self.events = deque(maxlen=backlog)  # (event_id, encoded)
+        self.last_id = 0
+        self.subscribers = 0
+        self.cond = threading.Condition()
+
+
+class EventBroker:
+    """Per-debate fan-out of encoded events to any number of streams."""
+
+    def __init__(self, backlog=64, keepalive=KEEPALIVE_SECONDS):
+        self.backlog = backlog
+        self.keepalive = keepalive
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def has_subscribers(self, debate_id):
+        return debate_id in self._channels
+
+    def subscriber_count(self, debate_id=None):
+        with self._lock:
+            if debate_id is not None:
+                channel = self._channels.get(debate_id)
+                return channel.subscribers if channel else 0
+            return sum(c.subscribers for c in self._channels.values())
+
+    def publish(self, debate_id, event_id, name, data):
+        """Send one event to every stream open on ``debate_id``."""
+        channel = self._channels.get(debate_id)
+        if channel is None:
+            return
+        encoded = encode_event(event_id, name, data)
+        with channel.cond:
+            channel.events.append((event_id, encoded))
+            channel.last_id = max(channel.last_id, event_id)
+            channel.cond.notify_all()
+
+    def _join(self, debate_id, current_id):
+        with self._lock:
+            channel = self._channels.get(debate_id)
+            if channel is None:
+                channel = self._channels[debate_id] = Channel(self.backlog)
+            channel.subscribers += 1
+        with channel.cond:
+            channel.last_id = max(channel.last_id, current_id)
+        return channel
+
+    def _leave(self, debate_id, channel):
+        with self._lock:
+            channel.subscribers -= 1
+            if channel.subscribers == 0 and self._channels.get(debate_id) is channel:
+                del self._channels[debate_id]
+
+    def stream(self, debate_id, since, current_id):
+        """Yield the SSE stream for ``debate_id``, starting after event ``since``.
+
+        ``current_id`` is the debate's revision right now. If the client is
+        behind and the backlog no longer covers the gap, it gets a
+        ``reload`` event and should fetch the page again.
+        """
+        channel = self._join(debate_id, current_id)
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            cursor = since
+            while True:
+                with channel.cond:
+                    ready = channel.cond.wait_for(lambda: channel.last_id > cursor, self.keepalive)
+                    pending = [e for e in channel.events if e[0] > cursor] if ready else None
+                if pending is None:
+                    yield ": keepalive\n\n"
+                    continue
+                if not pending or pending[0][0] > cursor + 1:
+                    # Missed events (before we joined, or the backlog overflowed)
+                    cursor = channel.last_id
+                    yield encode_event(cursor, "reload", {"rev": cursor})
+                    continue
+                for event_id, encoded in pending:
+                    yield encoded
+                cursor = pending[-1][0]
+        finally:
+            self._leave(debate_id, channel)
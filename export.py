@@ -0,0 +1,170 @@
+"""Bulk export of stored debates as JSONL, CSV and Markdown.
+
+    flask debates export exports/                   # all three formats
+    flask debates export exports/ --format csv -w 4
+
+writes, one debate after another,
+- debates.jsonl: one record per debate (id, rev, flipped, preface and
+  the steps as pack_step() dicts);
+- steps.csv: one row per step with its role labels, as
+  compute_role_labels() assigns them;
+- transcripts.md: each debate's transcript as Markdown.
+
+Everything is a generator: debate ids are paged out of the store, each
+debate is loaded, rendered and dropped, and output is written chunk by
+chunk, so memory stays flat however many debates there are. With more
+than one worker, chunks of ids go to a process pool. Each worker opens
+its own connection to the store's file and returns rendered text; the
+parent only writes it, in order. The memory store lives in one process,
+so it is always rendered in-process.
+"""
+import csv
+import io
+import json
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from debate_engine import STEP_FIELDS, compute_role_labels
+from debate_store import pack_step
+from transcript import step_lines
+
+# Format -> file it is written to
+FORMATS = {
+    "jsonl": "debates.jsonl",
+    "csv": "steps.csv",
+    "md": "transcripts.md",
+}
+CSV_COLUMNS = ("debate_id", "step", "cha_label", "def_label", *STEP_FIELDS)
+CHUNK_SIZE = 32
+
+_MD_SPECIAL = re.compile(r"([\\`*_\[\]<>#|])")
+
+
+def debate_json(debate_id, debate):
+    return json.dumps({
+        "id": debate_id,
+        "rev": debate["rev"],
+        "flipped": debate["flipped"],
+        "preface": debate["preface"],
+        "steps": [pack_step(st) for st in debate["steps"]],
+    }, separators=(",", ":")) + "\n"
+
+
+def debate_csv(debate_id, debate):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for i, st in enumerate(debate["steps"], 1):
+        writer.writerow((debate_id, i, st.cha_label, st.def_label, *st.form_fields().values()))
+    return buf.getvalue()
+
+
+def md_escape(text):
+    return _MD_SPECIAL.sub(r"\\\1", text)
+
+
+def debate_markdown(debate_id, debate):
+    """The transcript as Markdown: consequences as a numbered list, the
+    players' replies nested under them, role switches in italics."""
+    out = [f"## Debate {debate_id}", ""]
+    preface = debate["preface"].strip()
+    if preface:
+        out += ["**Preface / Discussion Summary:**", ""]
+        out += [f"> {md_escape(line)}" if line.strip() else ">" for line in preface.splitlines()] + [""]
+    indent = "   "  # replies nest under the text of the last "N." item
+    for idx, st in enumerate(debate["steps"], 1):
+        for line in step_lines(idx, st):
+            if st.role_switch:
+                out += ["", f"*{md_escape(line)}*", ""]
+            elif line.startswith("   "):
+                out.append(f"{indent}- {md_escape(line.strip())}")
+            else:
+                number, _, rest = line.partition(" ")
+                indent = " " * (len(number) + 1)
+                out.append(f"{number} {md_escape(rest)}")
+    out.append("")
+    return "\n".join(out) + "\n"
+
+
+RENDERERS = {"jsonl": debate_json, "csv": debate_csv, "md": debate_markdown}
+
+
+def render_debates(store, ids, formats):
+    """Render the debates ``ids`` from ``store``: (how many, {format: text})."""
+    count = 0
+    parts = {fmt: [] for fmt in formats}
+    for debate_id in ids:
+        debate = store.load(debate_id)
+        if debate is None:  # deleted since it was listed
+            continue
+        count += 1
+        compute_role_labels(debate["steps"], debate["flipped"])
+        for fmt in formats:
+            parts[fmt].append(RENDERERS[fmt](debate_id, debate))
+    return count, {fmt: "".join(texts) for fmt, texts in parts.items()}
+
+
+# Worker processes open their own store on the same file
+_worker_store = None
+
+
+def _init_worker(store_cls, path):
+    global _worker_store
+    _worker_store = store_cls(path)
+
+
+def _render_in_worker(ids, formats):
+    return render_debates(_worker_store, ids, formats)
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_store(store, formats, workers=None, chunk_size=CHUNK_SIZE):
+    """Yield render_debates() results for every stored debate, a chunk at
+    a time, in the order the store lists them."""
+    chunks = chunked(store.ids(), chunk_size)
+    path = getattr(store, "path", None)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or path in (None, ":memory:"):
+        for ids in chunks:
+            yield render_debates(store, ids, formats)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(type(store), path)) as pool:
+        pending = deque()
+        for ids in chunks:
+            pending.append(pool.submit(_render_in_worker, ids, formats))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def export_store(store, directory, formats=tuple(FORMATS), workers=None):
+    """Write ``formats`` of every debate in ``store`` under ``directory``;
+    returns how many debates were written."""
+    os.makedirs(directory, exist_ok=True)
+    files = {fmt: open(os.path.join(directory, FORMATS[fmt]), "w", encoding="utf-8", newline="")
+             for fmt in formats}
+    count = 0
+    try:
+        if "csv" in files:
+            csv.writer(files["csv"]).writerow(CSV_COLUMNS)
+        for n, rendered in render_store(store, formats, workers):
+            count += n
+            for fmt, text in rendered.items():
+                files[fmt].write(text)
+    finally:
+        for f in files.values():
+            f.close()
+    return count
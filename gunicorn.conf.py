@@ -0,0 +1,62 @@
+"""gunicorn settings (read automatically from the working directory).
+
+The app is created once, in the master, and the workers are forked from
+it with the app imported, its templates compiled and its static files
+built (see create_app() and assets.py). A worker that is restarted
+later forks just as quickly.
+
+gevent has to patch the standard library before anything else imports
+it. With preload_app the app is imported in the master, before the
+gevent worker would patch, so the patching happens here.
+
+Each worker is one shard of the debates (see sharding.py). The hooks
+below number the workers, and each worker also serves the app on a Unix
+socket in a shared directory, where the other workers forward the
+requests for debates it owns.
+"""
+import os
+import shutil
+import socket
+import tempfile
+
+from gevent import monkey
+
+monkey.patch_all()
+
+wsgi_app = "app:create_app()"
+preload_app = True
+worker_class = "gevent"
+worker_connections = 1000
+
+
+def on_starting(server):
+    server.shard_dir = tempfile.mkdtemp(prefix="debate-shards-")
+
+
+def on_exit(server):
+    shutil.rmtree(server.shard_dir, ignore_errors=True)
+
+
+def pre_fork(server, worker):
+    # A worker started to replace one that died takes over its shard
+    taken = {w.shard for w in server.WORKERS.values()}
+    worker.shard = min(set(range(server.num_workers)) - taken, default=len(taken))
+    worker.shard_count = server.num_workers
+    worker.shard_dir = server.shard_dir
+
+
+def post_worker_init(worker):
+    import sharding
+    from gevent.pywsgi import WSGIServer
+
+    sharding.shards.join(worker.shard, worker.shard_count, worker.shard_dir)
+    if worker.shard_count == 1:
+        return
+    path = sharding.shards.socket_path(worker.shard)
+    if os.path.exists(path):
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1024)
+    worker.shard_server = WSGIServer(listener, worker.wsgi, log=None)
+    worker.shard_server.start()
@@ -0,0 +1,250 @@
+"""Undo, redo and named branches over a debate's steps.
+
+Every saved move becomes a Version: the step list it left behind, and
+the version it came from. The step lists are PVectors, persistent
+vectors that share structure: a 32-way trie of tuples where changing or
+appending one step copies only the path to it (two or three small
+tuples for a debate of a thousand steps). A version therefore costs
+memory in proportion to the steps its move touched, and every earlier
+version stays intact.
+
+Versions form a tree. A branch is a name pointing at one version (its
+head). Undo moves the head to the parent version, keeping the undone
+heads for redo until the next move. Forking creates a branch at an
+existing version and copies nothing. fork(step=k) rewinds to the first
+point at which step k's consequence was waiting for the defender, so the
+defender can answer it differently.
+
+Steps stored in a version are shared, never modified: DebateEngine
+replaces a step instead of changing it in place (role labels excepted,
+and those are the same in every version that holds the step). The
+history lives with the debate in process memory, like the derived
+indexes; a debate loaded afresh from a file store starts a new one.
+"""
+from debate_engine import compute_role_labels, determine_turn_state
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+MAIN = "main"
+
+
+class PVector:
+    """An immutable list. set() and append() return a new vector that
+    shares all untouched nodes with this one."""
+
+    __slots__ = ("count", "shift", "root")
+
+    def __init__(self, items=()):
+        items = list(items)
+        nodes = [tuple(items[i:i + WIDTH]) for i in range(0, len(items), WIDTH)] or [()]
+        shift = 0
+        while len(nodes) > 1:
+            nodes = [tuple(nodes[i:i + WIDTH]) for i in range(0, len(nodes), WIDTH)]
+            shift += BITS
+        self.count, self.shift, self.root = len(items), shift, nodes[0]
+
+    @classmethod
+    def _make(cls, count, shift, root):
+        vec = cls.__new__(cls)
+        vec.count, vec.shift, vec.root = count, shift, root
+        return vec
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("PVector index out of range")
+        node = self.root
+        for level in range(self.shift, 0, -BITS):
+            node = node[(i >> level) & MASK]
+        return node[i & MASK]
+
+    def set(self, i, value):
+        if not 0 <= i < self.count:
+            raise IndexError("PVector index out of range")
+        return self._make(self.count, self.shift, _set(self.root, self.shift, i, value))
+
+    def append(self, value):
+        count, shift = self.count, self.shift
+        if count == WIDTH << shift:  # root full: grow a level
+            return self._make(count + 1, shift + BITS, (self.root, _path(shift, value)))
+        return self._make(count + 1, shift, _push(self.root, shift, count, value))
+
+    def tolist(self):
+        out = []
+        _collect(self.root, self.shift, out)
+        return out
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+
+def _set(node, level, i, value):
+    node = list(node)
+    if level == 0:
+        node[i & MASK] = value
+    else:
+        j = (i >> level) & MASK
+        node[j] = _set(node[j], level - BITS, i, value)
+    return tuple(node)
+
+
+def _push(node, level, i, value):
+    if level == 0:
+        return node + (value,)
+    j = (i >> level) & MASK
+    if j < len(node):
+        return node[:j] + (_push(node[j], level - BITS, i, value),)
+    return node + (_path(level - BITS, value),)
+
+
+def _path(level, value):
+    """A fresh spine down to a leaf holding just ``value``."""
+    node = (value,)
+    for _ in range(level // BITS):
+        node = (node,)
+    return node
+
+
+def _collect(node, level, out):
+    if level == 0:
+        out.extend(node)
+    else:
+        for child in node:
+            _collect(child, level - BITS, out)
+
+
+class Version:
+    __slots__ = ("steps", "parent", "number")
+
+    def __init__(self, steps, parent=None, number=0):
+        self.steps = steps      # PVector of Step
+        self.parent = parent
+        self.number = number    # unique within the debate's history
+
+
+def _same_step(a, b):
+    return a is b or a.form_fields() == b.form_fields()
+
+
+class History:
+    """A debate's version tree and its named branches."""
+
+    def __init__(self, steps):
+        self.branches = {MAIN: Version(PVector(steps))}
+        self.redo_stack = {MAIN: []}
+        self.branch = MAIN
+        self.versions = 1
+
+    @property
+    def head(self):
+        return self.branches[self.branch]
+
+    def _advance_to(self, version, redo=None):
+        self.branches[self.branch] = version
+        self.redo_stack[self.branch] = [] if redo is None else redo
+
+    def commit(self, steps, dirty):
+        """Record the steps a move left behind, given the indices it touched.
+
+        Returns whether that made a new version; a move that changed no
+        step's fields (say, Generate Transcript) doesn't.
+        """
+        vec = self.head.steps
+        if len(steps) < len(vec):
+            vec = PVector(steps)  # moves only append; a shorter list is a reset
+        else:
+            for i in sorted(i for i in dirty if i < len(vec)):
+                if not _same_step(vec[i], steps[i]):
+                    vec = vec.set(i, steps[i])
+            for i in range(len(vec), len(steps)):
+                vec = vec.append(steps[i])
+        if vec is self.head.steps:
+            return False
+        self._advance_to(Version(vec, self.head, self.versions))
+        self.versions += 1
+        return True
+
+    def undo(self):
+        """Step the current branch back one version; None if at its start."""
+        head = self.head
+        if head.parent is None:
+            return None
+        self._advance_to(head.parent, self.redo_stack[self.branch] + [head])
+        return self.head
+
+    def redo(self):
+        stack = self.redo_stack[self.branch]
+        if not stack:
+            return None
+        self._advance_to(stack[-1], stack[:-1])
+        return self.head
+
+    def can_undo(self):
+        return self.head.parent is not None
+
+    def can_redo(self):
+        return bool(self.redo_stack[self.branch])
+
+    def rewind_point(self, k):
+        """The version the current branch had when step ``k`` was first
+        waiting for the defender (else when it first existed)."""
+        if k < 0 or k >= len(self.head.steps):
+            raise ValueError(f"There is no step {k + 1}")
+        found = first = None
+        version = self.head
+        while version is not None and len(version.steps) > k:
+            first = version
+            if determine_turn_state(version.steps[k])["mode"] == "defender_choice":
+                found = version
+            version = version.parent
+        return found or first
+
+    def fork(self, name, step=None):
+        """Create branch ``name`` at the head (or rewound to ``step``) and switch to it."""
+        name = name.strip()
+        if not name:
+            raise ValueError("A branch needs a name")
+        if name in self.branches:
+            raise ValueError(f"There is already a branch called {name!r}")
+        start = self.head if step is None else self.rewind_point(step)
+        self.branches[name] = start
+        self.redo_stack[name] = []
+        self.branch = name
+        return start
+
+    def switch(self, name):
+        if name not in self.branches:
+            raise ValueError(f"There is no branch called {name!r}")
+        self.branch = name
+        return self.head
+
+    def new_branch_name(self):
+        n = len(self.branches) + 1
+        while f"branch {n}" in self.branches:
+            n += 1
+        return f"branch {n}"
+
+    def steps(self, name=None, flipped="0"):
+        """A branch's steps as a new, labelled list."""
+        version = self.branches[name or self.branch]
+        steps = version.steps.tolist()
+        compute_role_labels(steps, flipped)
+        return steps
+
+    def summary(self):
+        return {
+            "branch": self.branch,
+            "branches": [
+                {"name": name, "version": v.number, "step_count": len(v.steps)}
+                for name, v in self.branches.items()
+            ],
+            "version": self.head.number,
+            "can_undo": self.can_undo(),
+            "can_redo": self.can_redo(),
+        }
@@ -0,0 +1,173 @@
+"""Per-request phase timings: Server-Timing headers and a /metrics endpoint.
+
+Set DEBATE_METRICS=1 to turn it on. Code marks its phases with
+
+    with metrics.phase("render"):
+        ...
+
+and each response then carries a Server-Timing header listing them. The
+same numbers go into histograms, together with step counts and payload
+sizes, and are served in Prometheus text format on /metrics.
+
+When it is off, phase() hands back one shared no-op context manager and
+init_app() installs no hooks or routes, so all that's left is a flag check.
+Histograms live in process memory, so each gunicorn worker reports its own.
+"""
+import os
+import threading
+from contextlib import nullcontext
+from time import perf_counter
+
+from flask import Response, g, request
+
+from debate_engine import menu_cache_info
+
+ENABLED = False
+
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+STEP_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """A Prometheus-style histogram with one series per label value."""
+
+    def __init__(self, name, help, buckets, label=None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=""):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def exposition(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((k, list(s[0]), s[1], s[2]) for k, s in self._series.items())
+        for label_value, counts, total, count in snapshot:
+            labels = f'{self.label}="{_escape(label_value)}",' if self.label else ""
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {count}')
+            suffix = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+PHASE_SECONDS = Histogram(
+    "debate_phase_seconds", "Time spent in each phase of a request.", SECONDS_BUCKETS, "phase")
+REQUEST_SECONDS = Histogram(
+    "debate_request_seconds", "Total time per request.", SECONDS_BUCKETS, "endpoint")
+DEBATE_STEPS = Histogram(
+    "debate_steps", "Steps in the debate a request worked on.", STEP_BUCKETS)
+REQUEST_BYTES = Histogram(
+    "debate_request_bytes", "Request body size.", BYTE_BUCKETS, "endpoint")
+RESPONSE_BYTES = Histogram(
+    "debate_response_bytes", "Response body size (streamed responses excluded).",
+    BYTE_BUCKETS, "endpoint")
+HISTOGRAMS = (PHASE_SECONDS, REQUEST_SECONDS, DEBATE_STEPS, REQUEST_BYTES, RESPONSE_BYTES)
+
+
+class _Phase:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        phases = g.setdefault("metrics_phases", [])
+        phases.append((self.name, perf_counter() - self.start))
+
+
+def phase(name):
+    """Time the enclosed block as phase ``name`` of the current request."""
+    if not ENABLED:
+        return _NOOP
+    return _Phase(name)
+
+
+def observe_steps(count):
+    if ENABLED:
+        DEBATE_STEPS.observe(count)
+
+
+def _start_timer():
+    g.metrics_start = perf_counter()
+
+
+def _finish(response):
+    total = perf_counter() - g.pop("metrics_start", perf_counter())
+    phases = g.pop("metrics_phases", [])
+    endpoint = request.endpoint or "unmatched"
+
+    timing = [f"{name};dur={seconds * 1e3:.2f}" for name, seconds in phases]
+    timing.append(f"total;dur={total * 1e3:.2f}")
+    response.headers["Server-Timing"] = ", ".join(timing)
+
+    for name, seconds in phases:
+        PHASE_SECONDS.observe(seconds, name)
+    REQUEST_SECONDS.observe(total, endpoint)
+    if request.content_length is not None:
+        REQUEST_BYTES.observe(request.content_length, endpoint)
+    if not response.is_streamed and response.content_length is not None:
+        RESPONSE_BYTES.observe(response.content_length, endpoint)
+    return response
+
+
+def exposition():
+    """All metrics in Prometheus text format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.exposition())
+    for kind in ("hits", "misses"):
+        name = f"debate_menu_cache_{kind}_total"
+        lines.append(f"# HELP {name} Menu cache {kind} (see debate_engine.menu_cache_info).")
+        lines.append(f"# TYPE {name} counter")
+        for menu, info in sorted(menu_cache_info().items()):
+            lines.append(f'{name}{{menu="{menu}"}} {info[kind]}')
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app, enabled=None):
+    """Install the timing hooks and /metrics on ``app`` if metrics are enabled.
+
+    ``enabled`` defaults to the DEBATE_METRICS environment variable.
+    """
+    global ENABLED
+    if enabled is None:
+        enabled = os.environ.get("DEBATE_METRICS", "0").lower() in ("1", "true", "yes", "on")
+    ENABLED = bool(enabled)
+    if not ENABLED:
+        return
+    app.before_request(_start_timer)
+    app.after_request(_finish)
+
+    @app.get("/metrics")
+    def metrics():
+        return Response(exposition(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,420 @@
+"""Reason -> predicate pervasions and their transitive closure.
+
+Accepting "It follows that S is P, because of being R" (or a follow-up
+"Whoever or whatever is R is necessarily P") establishes that R pervades
+P. Chains of these are what a challenger builds on: if product pervades
+impermanent and impermanent pervades a thing, whatever is a product is
+necessarily a thing. A consequence whose predicate already pervades its
+reason argues in a circle.
+
+Terms are interned to small integer ids, and the closure is kept as one
+int bitset per term: ``reach[t]`` has a bit set for every term t pervades,
+``back[t]`` for every term that pervades t. Adding an edge ORs the new
+reach into each term that reaches its source, so lookups are a shift and
+a mask. Removing an edge (an answer edited away) recomputes only the rows
+of the terms that reached its source.
+
+Each debate has a PervasionIndex, kept between moves like the commitment
+index. The edges a debate establishes are also counted in CORPUS, per
+process, which suggests them to every other debate. An answer edited or
+undone away takes its edge back out, and so does a debate this process
+lets go of (deleted, evicted from a store's cache, or its index rebuilt
+after a checkout). An edge that contradicts the corpus (R -> P where
+R -> not P holds) is kept in its own debate but not added to the corpus.
+"""
+import threading
+import weakref
+from collections import deque
+
+from debate_engine import DefenderChoice
+from propositions import normalize_term, thesis
+
+MAX_SUGGESTIONS = 5
+
+
+def negate(term):
+    return term[4:] if term.startswith("not ") else f"not {term}"
+
+
+def to_bits(ids):
+    """The bitset with the bits ``ids`` set."""
+    if not ids:
+        return 0
+    buf = bytearray((max(ids) >> 3) + 1)
+    for i in ids:
+        buf[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buf, "little")
+
+
+def iter_bits(bits):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class TermTable:
+    """Interns terms to integer ids; release() frees an id for reuse."""
+
+    def __init__(self):
+        self.ids = {}
+        self.terms = []
+        self.free = []
+
+    def intern(self, term):
+        tid = self.ids.get(term)
+        if tid is None:
+            if self.free:
+                tid = self.free.pop()
+                self.terms[tid] = term
+            else:
+                tid = len(self.terms)
+                self.terms.append(term)
+            self.ids[term] = tid
+        return tid
+
+    def release(self, tid):
+        del self.ids[self.terms[tid]]
+        self.terms[tid] = None
+        self.free.append(tid)
+
+    def __len__(self):
+        return len(self.terms)
+
+
+class PervasionGraph:
+    """Pervasion edges between terms, with the transitive closure as bitsets."""
+
+    def __init__(self):
+        self.terms = TermTable()
+        self.edges = {}  # (reason id, predicate id) -> how many steps establish it
+        self.succ = []   # id -> ids it has an edge to
+        self.pred = []   # id -> ids with an edge to it
+        self.reach = []
+        self.back = []
+        self.cyclic = 0  # bitset of the terms that reach themselves
+
+    def add(self, reason, predicate):
+        r, p = self.intern(reason), self.intern(predicate)
+        count = self.edges.get((r, p), 0)
+        self.edges[(r, p)] = count + 1
+        if not count:
+            self.succ[r].add(p)
+            self.pred[p].add(r)
+            self._close(r, p)
+        return not count
+
+    def remove(self, reason, predicate):
+        """Drop one count of the edge; returns whether that removed it."""
+        ids = self.terms.ids
+        r, p = ids[reason], ids[predicate]
+        if self.edges[(r, p)] > 1:
+            self.edges[(r, p)] -= 1
+            return False
+        del self.edges[(r, p)]
+        self.succ[r].discard(p)
+        self.pred[p].discard(r)
+        self._unclose(r, p)
+        return True
+
+    def has_edge(self, reason, predicate):
+        ids = self.terms.ids
+        return (ids.get(reason), ids.get(predicate)) in self.edges
+
+    def pervades(self, reason, predicate):
+        """Whether whatever is ``reason`` is necessarily ``predicate``."""
+        ids = self.terms.ids
+        r, p = ids.get(reason), ids.get(predicate)
+        if r is None or p is None:
+            return False
+        return bool(self.reach[r] >> p & 1)
+
+    def consequences(self, reason, limit=None):
+        """The terms ``reason`` pervades (the first ``limit`` of them, by id)."""
+        r = self.terms.ids.get(reason)
+        if r is None:
+            return []
+        terms = self.terms.terms
+        return [terms[t] for t, _ in zip(iter_bits(self.reach[r]), range(limit or len(terms)))]
+
+    def intern(self, term):
+        tid = self.terms.intern(term)
+        if tid == len(self.reach):
+            self.reach.append(0)
+            self.back.append(0)
+            self.succ.append(set())
+            self.pred.append(set())
+        return tid
+
+    def up(self, tid):
+        """Bitset of term ``tid`` and every term it pervades."""
+        return self.reach[tid] | 1 << tid
+
+    def down(self, tid):
+        """Bitset of term ``tid`` and every term that pervades it."""
+        return self.back[tid] | 1 << tid
+
+    def _close(self, r, p):
+        reach, back = self.reach, self.back
+        ahead = 1 << p | reach[p]
+        behind = 1 << r | back[r]
+        for t in iter_bits(behind):
+            reach[t] |= ahead
+        for t in iter_bits(ahead):
+            back[t] |= behind
+        self.cyclic |= behind & ahead
+
+    def _unclose(self, r, p):
+        """Recompute the closure after removing r -> p.
+
+        Only the terms that reach r can have reached anything through the
+        edge. Unless a cycle runs through them, r's row is recomputed from
+        its successors' rows, then the row of each term with an edge to a
+        row that lost bits, until none does; the lost bits are cleared from
+        the back rows in one go.
+        """
+        reach, succ, pred = self.reach, self.succ, self.pred
+        behind = 1 << r | self.back[r]
+        if behind & self.cyclic:
+            self._rederive(behind)
+            return
+        lost = {}  # term -> ids of the rows that no longer reach it
+        queue, queued = deque([r]), {r}
+        while queue:
+            t = queue.popleft()
+            queued.discard(t)
+            row = 0
+            for q in succ[t]:
+                row |= 1 << q | reach[q]
+            gone = reach[t] & ~row
+            if not gone:
+                continue
+            reach[t] = row
+            for x in iter_bits(gone):
+                lost.setdefault(x, []).append(t)
+            for s in pred[t]:
+                if s not in queued:
+                    queued.add(s)
+                    queue.append(s)
+        back = self.back
+        for x, ids in lost.items():
+            back[x] &= ~to_bits(ids)
+
+    def _rederive(self, behind):
+        """Recompute the rows in ``behind`` one strongly connected component
+        at a time, each after the components it has edges to: every term of
+        a component reaches what the component's edges lead to."""
+        reach, succ = self.reach, self.succ
+        rows = list(iter_bits(behind))
+        old = {t: reach[t] for t in rows}
+        for t in rows:
+            reach[t] = 0
+        cyclic = []
+        for component in self._components(rows):
+            row = 0
+            for t in component:
+                for q in succ[t]:
+                    row |= 1 << q | reach[q]
+            for t in component:
+                reach[t] = row
+            if len(component) > 1 or component[0] in succ[component[0]]:
+                cyclic.extend(component)
+        lost = {}
+        for t in rows:
+            gone = old[t] & ~reach[t]
+            if gone:
+                for x in iter_bits(gone):
+                    lost.setdefault(x, []).append(t)
+        back = self.back
+        for x, ids in lost.items():
+            back[x] &= ~to_bits(ids)
+        self.cyclic = self.cyclic & ~behind | to_bits(cyclic)
+
+    def _components(self, rows):
+        """The strongly connected components among ``rows``, each one after
+        every component it has an edge to (Tarjan's algorithm)."""
+        succ = self.succ
+        inside = set(rows)
+        index, low, stack, on_stack = {}, {}, [], set()
+        for root in rows:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(succ[root]))]
+            while work:
+                t, edges = work[-1]
+                for q in edges:
+                    if q not in inside:
+                        continue
+                    if q not in index:
+                        index[q] = low[q] = len(index)
+                        stack.append(q)
+                        on_stack.add(q)
+                        work.append((q, iter(succ[q])))
+                        break
+                    if q in on_stack:
+                        low[t] = min(low[t], index[q])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[t])
+                    if low[t] == index[t]:
+                        component = []
+                        while True:
+                            q = stack.pop()
+                            on_stack.discard(q)
+                            component.append(q)
+                            if q == t:
+                                break
+                        yield component
+
+
+class CorpusGraph(PervasionGraph):
+    """The pervasions established by the debates this process holds.
+
+    An edge's count is the number of debates establishing it; removing one
+    recomputes just the closure rows it went through, and a term left with
+    no edges gives its id back. Indexes that are garbage collected hand
+    their edges to release(), which only queues them (a finalizer may run
+    in the middle of another call); the queue is drained under the lock
+    before the next lookup or change.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self._released = deque()
+
+    def establish(self, reason, predicate):
+        """Count one more debate holding reason -> predicate. Returns False,
+        counting nothing, if the corpus holds that reason -> not predicate."""
+        with self.lock:
+            self._drain()
+            if PervasionGraph.pervades(self, reason, negate(predicate)):
+                return False
+            self.add(reason, predicate)
+            return True
+
+    def retract(self, reason, predicate):
+        with self.lock:
+            self._drain()
+            self.remove(reason, predicate)
+
+    def release(self, edges):
+        """Retract ``edges`` before the next call; safe from a finalizer."""
+        self._released.append(edges)
+
+    def remove(self, reason, predicate):
+        ids = self.terms.ids
+        r, p = ids[reason], ids[predicate]
+        gone = super().remove(reason, predicate)
+        if gone:
+            for t in {r, p}:
+                if not (self.succ[t] or self.pred[t]):
+                    self.terms.release(t)
+        return gone
+
+    def pervades(self, reason, predicate):
+        with self.lock:
+            self._drain()
+            return super().pervades(reason, predicate)
+
+    def consequences(self, reason, limit=None):
+        with self.lock:
+            self._drain()
+            return super().consequences(reason, limit)
+
+    def _drain(self):
+        while self._released:
+            for edge in self._released.popleft():
+                self.remove(*edge)
+
+
+CORPUS = CorpusGraph()
+
+
+def step_pervasion(st):
+    """The (reason, predicate) terms of the pervasion accepted on ``st``, if any."""
+    if st.role_switch or st.defender_choice != DefenderChoice.ACCEPT:
+        return None
+    prop = thesis(st.subject, st.predicate) if st.subject and st.predicate else None
+    if prop is None:
+        return None
+    if prop.kind == "pervades":
+        return (prop.a, prop.b) if prop.holds else None
+    reason = normalize_term(st.reason)
+    if not reason:
+        return None
+    return reason, prop.b if prop.holds else f"not {prop.b}"
+
+
+def consequence_terms(st):
+    """The normalized (reason, predicate) of the consequence on ``st``, if any."""
+    if st.role_switch or not (st.subject and st.predicate and st.reason):
+        return None
+    prop = thesis(st.subject, st.predicate)
+    if prop is None or prop.kind != "is":
+        return None
+    return normalize_term(st.reason), prop.b if prop.holds else f"not {prop.b}"
+
+
+class PervasionIndex:
+    """One debate's pervasion graph, fed from the steps' accepted answers."""
+
+    def __init__(self, corpus=CORPUS):
+        self.graph = PervasionGraph()
+        self.corpus = corpus
+        self.edges = []  # per step: (reason, predicate) or None
+        self.shared = set()  # the edges the corpus counts for this debate
+        if corpus is not None:
+            weakref.finalize(self, corpus.release, self.shared)
+
+    def update(self, steps, indices=()):
+        for i in indices:
+            if i < len(self.edges):
+                self._file(i, step_pervasion(steps[i]))
+        for i in range(len(self.edges), len(steps)):
+            self.edges.append(None)
+            self._file(i, step_pervasion(steps[i]))
+        return self
+
+    def _file(self, i, edge):
+        old = self.edges[i]
+        if old == edge:
+            return
+        if old is not None and self.graph.remove(*old) and old in self.shared:
+            self.shared.discard(old)
+            self.corpus.retract(*old)
+        self.edges[i] = edge
+        if edge is not None and self.graph.add(*edge) and self.corpus is not None:
+            if self.corpus.establish(*edge):
+                self.shared.add(edge)
+
+    def hints(self, st):
+        """Circular reasoning and established consequences for the consequence on ``st``."""
+        terms = consequence_terms(st)
+        if terms is None:
+            return {}
+        reason, predicate = terms
+        hints = {}
+        graphs = [self.graph] + ([self.corpus] if self.corpus is not None else [])
+        if reason == predicate:
+            hints["circular"] = f"the reason is the predicate itself ({reason})"
+        elif any(g.pervades(predicate, reason) for g in graphs):
+            hints["circular"] = f"whoever or whatever is {predicate} is already necessarily {reason}"
+        follows = []
+        for graph in graphs:
+            # Two of them may be the predicate and reason themselves
+            for term in graph.consequences(reason, MAX_SUGGESTIONS + 2 + len(follows)):
+                if len(follows) < MAX_SUGGESTIONS and term not in (predicate, reason) \
+                        and term not in follows and negate(term) not in follows \
+                        and not self.graph.pervades(reason, negate(term)):
+                    follows.append(term)
+        if follows:
+            hints["consequences"] = [
+                f"{st.subject} {st.copula} {term}, because of being {st.reason}" for term in follows
+            ]
+        return hints
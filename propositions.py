@@ -0,0 +1,133 @@
+"""The defender's commitments, and the contradictions between them.
+
+Each answer the defender gives commits them to one proposition:
+
+    I accept                       -> the thesis ("sound is impermanent")
+    The reason is not established  -> the subject is not the reason
+    There is no pervasion          -> whoever is the reason is not necessarily
+                                      the predicate
+
+Propositions are normalized (case, spacing, "is"/"are", a leading "not",
+and the "Whoever or whatever is R is necessarily P" follow-ups), so the
+same claim made on different steps gets the same key. CommitmentIndex
+files each step's commitment under that key, and an answer is checked
+against the opposite claim with a dict lookup instead of a rescan.
+"""
+from collections import namedtuple
+
+from debate_engine import TSAR_OPTION, DefenderChoice
+
+PERVADER = "whoever or whatever "
+
+
+def normalize_term(text):
+    return " ".join(text.casefold().split())
+
+
+class Proposition(namedtuple("Proposition", "kind a b holds")):
+    """``a`` is ``b`` (kind "is"), or whoever is ``a`` is necessarily ``b``
+    (kind "pervades"); ``holds`` is False for the negation."""
+    __slots__ = ()
+
+    def negated(self):
+        return self._replace(holds=not self.holds)
+
+    def __str__(self):
+        if self.kind == "pervades":
+            necessity = "necessarily" if self.holds else "not necessarily"
+            return f"whoever or whatever is {self.a} is {necessity} {self.b}"
+        return f"{self.a} is {'' if self.holds else 'not '}{self.b}"
+
+
+def thesis(subject, predicate):
+    """The proposition "<subject> is/are <predicate>" states, or None."""
+    s, p = normalize_term(subject), normalize_term(predicate)
+    for copula in ("is ", "are "):
+        if s.startswith(PERVADER + copula):
+            reason = s[len(PERVADER + copula):]
+            if p.startswith("necessarily "):
+                return Proposition("pervades", reason, p[len("necessarily "):], True)
+            if p.startswith("not necessarily "):
+                return Proposition("pervades", reason, p[len("not necessarily "):], False)
+    if p.startswith("not "):
+        p, holds = p[len("not "):], False
+    else:
+        holds = True
+    if not (s and p):
+        return None
+    return Proposition("is", s, p, holds)
+
+
+def step_commitment(st):
+    """What the defender's answer on ``st`` commits them to (None if nothing)."""
+    if st.role_switch or not (st.subject and st.predicate):
+        return None
+    choice = st.defender_choice
+    if choice == DefenderChoice.ACCEPT:
+        return thesis(st.subject, st.predicate)
+    if not st.reason:
+        return None
+    if choice == DefenderChoice.REASON_NOT_ESTABLISHED:
+        prop = thesis(st.subject, st.reason)
+    elif choice == DefenderChoice.NO_PERVASION:
+        prop = thesis(f"{PERVADER}is {st.reason}", f"necessarily {st.predicate}")
+    else:
+        return None
+    return prop.negated() if prop else None
+
+
+class CommitmentIndex:
+    """Each step's commitment, filed by proposition.
+
+    Kept between moves like TranscriptCache: update() re-files the steps a
+    move changed and files any appended ones. Who holds a commitment is
+    read off the step's role labels when a conflict is checked, so a role
+    switch needs no re-filing.
+    """
+
+    def __init__(self):
+        self.props = []    # per step: Proposition or None
+        self.holders = {}  # Proposition -> indices of the steps committed to it
+
+    def update(self, steps, indices=()):
+        for i in indices:
+            if i < len(self.props):
+                self._file(i, step_commitment(steps[i]))
+        for i in range(len(self.props), len(steps)):
+            self.props.append(None)
+            self._file(i, step_commitment(steps[i]))
+        return self
+
+    def _file(self, i, prop):
+        old = self.props[i]
+        if old == prop:
+            return
+        if old is not None:
+            holders = self.holders[old]
+            holders.discard(i)
+            if not holders:
+                del self.holders[old]
+        self.props[i] = prop
+        if prop is not None:
+            self.holders.setdefault(prop, set()).add(i)
+
+    def conflict(self, steps, i):
+        """The earliest step before ``i`` where the same player, as defender,
+        committed to the opposite of their answer on step ``i``."""
+        prop = self.props[i] if i < len(self.props) else None
+        if prop is None:
+            return None
+        flipped = steps[i].effective_flipped
+        earlier = [j for j in self.holders.get(prop.negated(), ())
+                   if j < i and steps[j].effective_flipped == flipped]
+        return min(earlier) if earlier else None
+
+    def tsar_suggestion(self, steps, i):
+        """The contradiction to point out on step ``i`` if a Tsar is open there."""
+        st = steps[i]
+        if st.tsar_called or TSAR_OPTION not in st.challenger_options:
+            return None
+        j = self.conflict(steps, i)
+        if j is None:
+            return None
+        return {"step": j, "earlier": str(self.props[j]), "now": str(self.props[i])}
@@ -0,0 +1,338 @@
+"""What the Compare diagrams have established about pairs of phenomena.
+
+Each diagram choice is a fact about two terms A and B:
+
+    Mutually inclusive      A and B pervade each other
+    Mutually exclusive      nothing is both
+    3 possibilities (down)  A pervades B, but not the other way round
+    3 possibilities (up)    B pervades A, but not the other way round
+    4 possibilities         some things are both, neither pervades the other
+
+RelationBase stores these facts over interned term ids. Pervasion between
+terms is kept in a PervasionGraph, so subset chains close transitively.
+The other facts are one int bitset per term (a compact sparse row of the
+relation matrix), and they are read through that closure:
+- whatever falls under a term disjoint from B is disjoint from B too;
+- if some X under A falls outside some Y over B, A does not pervade B.
+possible() narrows the five diagrams down to those still consistent
+with everything known, and add() refuses a fact that would contradict
+it. That keeps the base consistent, and it is how a diagram choice gets
+checked when it is entered.
+
+Each debate has a RelationIndex, re-checked in step order. CORPUS counts
+the facts the debates this process holds have established, like the
+pervasion corpus, and gives them back when a debate edits, undoes or
+drops them. It only narrows the diagrams suggested to other debates: a
+choice is a conflict only if it contradicts its own debate.
+"""
+import threading
+import weakref
+from collections import deque
+
+from debate_engine import Diagram
+from pervasion import PervasionGraph, iter_bits
+from propositions import normalize_term
+
+ALL_DIAGRAMS = tuple(Diagram)
+
+
+class RelationBase:
+    def __init__(self):
+        self.subsets = PervasionGraph()
+        self.terms = self.subsets.terms
+        self.disjoint = []     # id -> bitset of terms directly disjoint from it
+        self.outside = []      # id -> bitset of terms Y it was said not to pervade
+        self.outside_of = []   # id -> bitset of terms X said not to pervade it
+        self.meets = []        # id -> bitset of terms said to share members with it
+        self.marks = {}        # (row, x, y) -> how many recorded facts set that bit
+
+    def _id(self, term):
+        tid = self.subsets.intern(term)
+        while len(self.disjoint) < len(self.terms):
+            for row in (self.disjoint, self.outside, self.outside_of, self.meets):
+                row.append(0)
+        return tid
+
+    def _under(self, a, b):
+        """Whether whatever is ``a`` is necessarily ``b``."""
+        return a == b or bool(self.subsets.up(a) >> b & 1)
+
+    def _not_under(self, a, b):
+        """Whether ``a`` is known not to pervade ``b``."""
+        below_a = self.subsets.down(a)
+        return any(self.outside_of[y] & below_a for y in iter_bits(self.subsets.up(b)))
+
+    def _apart(self, a, b):
+        above_b = self.subsets.up(b)
+        return any(self.disjoint[x] & above_b for x in iter_bits(self.subsets.up(a)))
+
+    def possible(self, a, b):
+        """The diagrams for (a, b) that don't contradict what is known."""
+        ids = self.terms.ids
+        a, b = normalize_term(a), normalize_term(b)
+        if a == b:
+            return (Diagram.MUTUALLY_INCLUSIVE,)
+        if a not in ids or b not in ids:
+            return ALL_DIAGRAMS
+        a, b = ids[a], ids[b]
+        a_in_b, b_in_a = self._under(a, b), self._under(b, a)
+        apart = self._apart(a, b)
+        a_out = apart or self._not_under(a, b)
+        b_out = apart or self._not_under(b, a)
+        meet = a_in_b or b_in_a or bool(self.meets[a] >> b & 1)
+        allowed = {
+            Diagram.MUTUALLY_INCLUSIVE: not (a_out or b_out),
+            Diagram.MUTUALLY_EXCLUSIVE: not meet,
+            Diagram.THREE_DOWN: not (a_out or b_in_a),
+            Diagram.THREE_UP: not (b_out or a_in_b),
+            Diagram.FOUR: not (a_in_b or b_in_a or apart),
+        }
+        return tuple(d for d in ALL_DIAGRAMS if allowed[d])
+
+    def add(self, a, b, diagram):
+        """Record ``diagram`` for (a, b); False (and nothing recorded) if it
+        contradicts what is known."""
+        if diagram not in self.possible(a, b):
+            return False
+        a, b = normalize_term(a), normalize_term(b)
+        if a == b:
+            return True
+        self._record(self._id(a), self._id(b), diagram, 1)
+        return True
+
+    def remove(self, a, b, diagram):
+        """Take back one add() of ``diagram`` for (a, b)."""
+        a, b = normalize_term(a), normalize_term(b)
+        if a != b:
+            self._record(self.terms.ids[a], self.terms.ids[b], diagram, -1)
+
+    def _record(self, a, b, diagram, n):
+        # n is 1 to record the fact, -1 to take it back
+        if diagram == Diagram.MUTUALLY_INCLUSIVE:
+            self._pervades(a, b, n)
+            self._pervades(b, a, n)
+        elif diagram == Diagram.MUTUALLY_EXCLUSIVE:
+            self._mark("disjoint", a, b, n)
+            self._mark("disjoint", b, a, n)
+        elif diagram == Diagram.THREE_DOWN:
+            self._pervades(a, b, n)
+            self._outside(b, a, n)
+        elif diagram == Diagram.THREE_UP:
+            self._pervades(b, a, n)
+            self._outside(a, b, n)
+        else:
+            self._outside(a, b, n)
+            self._outside(b, a, n)
+            self._mark("meets", a, b, n)
+            self._mark("meets", b, a, n)
+
+    def _pervades(self, a, b, n):
+        terms = self.terms.terms
+        if n > 0:
+            self.subsets.add(terms[a], terms[b])
+        else:
+            self.subsets.remove(terms[a], terms[b])
+
+    def _outside(self, x, y, n):
+        self._mark("outside", x, y, n)
+        self._mark("outside_of", y, x, n)
+
+    def _mark(self, row, x, y, n):
+        """Count a fact setting bit y of ``row``[x] (n=1) or one fewer (n=-1)."""
+        count = self.marks.pop((row, x, y), 0) + n
+        bits = getattr(self, row)
+        if count:
+            self.marks[(row, x, y)] = count
+            bits[x] |= 1 << y
+        else:
+            bits[x] &= ~(1 << y)
+
+
+class CorpusRelations:
+    """The relations established by the debates this process holds.
+
+    A fact's count is the number of debates establishing it. A fact that
+    contradicts the base when it is first counted waits in ``pending``.
+    Retracting a fact takes its bits back out of the base (each bit counts
+    the facts that set it); possible() can then only have changed for
+    terms over or under the fact's two, so the pending facts naming one of
+    those are tried again. A term no fact in the base names gives its id
+    back. Indexes that are garbage collected hand their facts to
+    release(), which only queues them, as in CorpusGraph.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.base = RelationBase()
+        self.counts = {}   # (a, b, diagram) -> how many debates establish it
+        self.pending = {}  # counted facts left out of the base -> when they were counted
+        self.waiting = {}  # term -> the pending facts naming it
+        self.uses = {}     # term id -> how many facts in the base name it
+        self._counted = 0
+        self._released = deque()
+
+    def establish(self, fact):
+        with self.lock:
+            self._drain()
+            count = self.counts.get(fact, 0)
+            self.counts[fact] = count + 1
+            if not count and not self._admit(fact):
+                self._counted += 1
+                self.pending[fact] = self._counted
+                for term in fact_terms(fact):
+                    self.waiting.setdefault(term, set()).add(fact)
+
+    def retract(self, fact):
+        with self.lock:
+            self._drain()
+            self._remove(fact)
+
+    def release(self, facts):
+        """Retract ``facts`` before the next call; safe from a finalizer."""
+        self._released.append(facts)
+
+    def possible(self, a, b):
+        with self.lock:
+            self._drain()
+            return self.base.possible(a, b)
+
+    def _admit(self, fact):
+        if not self.base.add(*fact):
+            return False
+        self._use(fact, 1)
+        return True
+
+    def _remove(self, fact):
+        if self.counts[fact] > 1:
+            self.counts[fact] -= 1
+            return
+        del self.counts[fact]
+        if fact in self.pending:
+            self._unwait(fact)
+            return
+        nearby = self._nearby(fact)
+        self.base.remove(*fact)
+        self._use(fact, -1)
+        for waiting in sorted(nearby, key=self.pending.get):
+            if self._admit(waiting):
+                self._unwait(waiting)
+
+    def _nearby(self, fact):
+        """The pending facts naming a term over or under one of ``fact``'s."""
+        terms = fact_terms(fact)
+        if not terms or not self.waiting:
+            return set()
+        ids, subsets = self.base.terms.ids, self.base.subsets
+        region = 0
+        for term in terms:
+            region |= subsets.up(ids[term]) | subsets.down(ids[term])
+        if region.bit_count() < len(self.waiting):
+            names = self.base.terms.terms
+            near = (names[t] for t in iter_bits(region))
+        else:
+            near = (t for t in self.waiting if t in ids and region >> ids[t] & 1)
+        return {f for term in near for f in self.waiting.get(term, ())}
+
+    def _unwait(self, fact):
+        del self.pending[fact]
+        for term in fact_terms(fact):
+            self.waiting[term].discard(fact)
+            if not self.waiting[term]:
+                del self.waiting[term]
+
+    def _use(self, fact, n):
+        terms = self.base.terms
+        for term in fact_terms(fact):
+            tid = terms.ids[term]
+            count = self.uses.pop(tid, 0) + n
+            if count:
+                self.uses[tid] = count
+            else:
+                terms.release(tid)
+
+    def _drain(self):
+        while self._released:
+            for fact in self._released.popleft():
+                self._remove(fact)
+
+
+def fact_terms(fact):
+    """The normalized terms a fact names (none if it relates a term to itself)."""
+    a, b = normalize_term(fact[0]), normalize_term(fact[1])
+    return () if a == b else {a, b}
+
+
+CORPUS = CorpusRelations()
+
+
+def step_relation(st):
+    """The (a, b, diagram) a Compare on ``st`` settled, if any."""
+    if st.compare_a and st.compare_b and st.compare_option in ALL_DIAGRAMS:
+        return st.compare_a, st.compare_b, st.compare_option
+    return None
+
+
+class RelationIndex:
+    """One debate's diagram choices, each checked against the ones before it.
+
+    A choice that contradicts earlier steps is not recorded and its step
+    index is listed in ``conflicts`` instead. Appended steps are checked as
+    they come; editing an earlier choice re-checks them all. The recorded
+    facts are counted in the corpus.
+    """
+
+    def __init__(self, corpus=CORPUS):
+        self.corpus = corpus
+        self.base = RelationBase()
+        self.facts = []  # per step: (a, b, diagram) or None
+        self.conflicts = set()
+        self.shared = set()  # the facts the corpus counts for this debate
+        if corpus is not None:
+            weakref.finalize(self, corpus.release, self.shared)
+
+    def update(self, steps, indices=()):
+        facts = self.facts
+        before = set(self.shared)
+        if any(i < len(facts) and step_relation(steps[i]) != facts[i] for i in indices):
+            self.base, self.facts, self.conflicts = RelationBase(), [], set()
+            self.shared.clear()
+        for i in range(len(self.facts), len(steps)):
+            fact = step_relation(steps[i])
+            self.facts.append(fact)
+            if fact is not None:
+                self._check(i, fact)
+        if self.corpus is not None:
+            for fact in before - self.shared:
+                self.corpus.retract(fact)
+            for fact in self.shared - before:
+                self.corpus.establish(fact)
+        return self
+
+    def _check(self, i, fact):
+        if not self.base.add(*fact):
+            self.conflicts.add(i)
+        else:
+            a, b, diagram = fact
+            self.shared.add((normalize_term(a), normalize_term(b), diagram))
+
+    def possible(self, a, b):
+        """Diagrams left for (a, b) by this debate, then by the corpus."""
+        left = self.base.possible(a, b)
+        if self.corpus is not None:
+            corpus_left = self.corpus.possible(a, b)
+            left = tuple(d for d in left if d in corpus_left) or left
+        return left
+
+    def hints(self, st, i):
+        """What to tell the players about the Compare on step ``i``."""
+        if not (st.compare_a and st.compare_b):
+            return {}
+        if not st.compare_option:
+            left = self.possible(st.compare_a, st.compare_b)
+            return {"diagrams": list(left)} if len(left) < len(ALL_DIAGRAMS) else {}
+        if i not in self.conflicts:
+            return {}
+        return {"diagram_conflict": {
+            "chosen": st.compare_option,
+            "possible": list(self.base.possible(st.compare_a, st.compare_b)),
+        }}
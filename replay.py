@@ -0,0 +1,338 @@
+"""Replay recorded debates through the turn logic and check its invariants.
+
+    flask debates replay archive.jsonl
+    flask debates replay archive.jsonl --save baseline.jsonl   # record the outcome
+    flask debates replay baseline.jsonl --workers 8            # compare to it later
+
+Each line of the input is one recorded debate:
+
+    {"id": "...", "flipped": "0", "moves": [{"type": "consequence", ...}, ...],
+     "steps": [...]}
+
+``moves`` are the typed moves of the JSON API, in the order they were
+played. ``steps`` (optional) is the state the debate should end in, as
+pack_step() dicts. --save writes each debate back out with the steps the
+replay ended in, so replaying the saved file after a rule change lists
+every debate that now ends differently.
+
+A record without ``moves``, like the ones `flask debates export` writes,
+is rebuilt from its steps: at every turn the replay plays the move that
+fills in what the recorded step holds for it (see recorded_move()). A
+Why? leaves its reason in challenger_reason too, so that is played as a
+Why? and its answer. Edits that no move makes (a reason changed after
+the defender answered, say) show up as "diverged".
+
+Every move goes through DebateEngine, which dispatches on
+determine_turn_state() and runs the transitions a posted form runs.
+Around each move the replay checks that
+- the engine's TurnIndex picks the same step as pick_active_index();
+- the incremental role labels match compute_role_labels();
+- a called Tsar is answered before anything else is played;
+- no Why? is still waiting for its reason when roles switch.
+Each problem is reported once per debate, at the first move it shows up.
+
+Debates are spread over a process pool in chunks of raw lines, so the
+workers do the JSON parsing too and the parent only tallies results.
+"""
+import json
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+
+import click
+from flask.cli import AppGroup
+
+from debate_engine import (
+    ASK_OPTION, COMPARE_OPTION, GENERAL_CHALLENGER_OPTIONS, TSAR_OPTION, WHY_OPTION,
+    DebateEngine, MoveError, Step, build_step, compute_role_labels, current_role_labels,
+    determine_turn_state, pick_active_index,
+)
+from debate_store import pack_step
+
+CHUNK_SIZE = 64
+# Rebuilding from steps gives up after this many moves per recorded step
+MOVES_PER_STEP = 16
+
+
+def labels(steps):
+    return [(st.cha_label, st.def_label, st.effective_flipped) for st in steps]
+
+
+def plain(value):
+    """Choices by their text: replayed steps hold enum members."""
+    return value.value if isinstance(value, Enum) else value
+
+
+def step_diff(expected, got):
+    """Where replayed steps first differ from the recorded ones, or None."""
+    for i, (want, have) in enumerate(zip(expected, got)):
+        if want != have:
+            field = min(f for f in want.keys() | have.keys() if want.get(f) != have.get(f))
+            return f"step {i} {field}: recorded {plain(want.get(field))!r}, replayed {plain(have.get(field))!r}"
+    if len(expected) != len(got):
+        return f"recorded {len(expected)} steps, replayed {len(got)}"
+    return None
+
+
+def recorded_move(steps, recorded):
+    """The move that takes ``steps`` one turn closer to the ``recorded``
+    steps, or None if there is none."""
+    i = pick_active_index(steps)
+    cur, want = steps[i], recorded[i] if i < len(recorded) else Step()
+    mode = determine_turn_state(cur)["mode"]
+    move = None
+    if mode == "new_consequence":
+        if want.subject and want.predicate:
+            why = want.reason and want.challenger_reason == want.reason
+            move = {"type": "consequence", "subject": want.subject, "copula": want.copula,
+                    "predicate": want.predicate, "reason": "" if why else want.reason}
+    elif mode == "defender_choice":
+        choice = WHY_OPTION if want.reason and not cur.reason else want.defender_choice
+        move = {"type": "respond", "choice": choice} if choice else None
+    elif mode == "need_reason":
+        move = {"type": "complete_reason", "reason": want.reason} if want.reason else None
+    elif mode == "ask_question":
+        move = {"type": "ask", "question": want.question_text} if want.question_text else None
+    elif mode == "answer_question":
+        move = {"type": "answer", "answer": want.answer_text} if want.answer_text else None
+    elif mode == "compare_names":
+        if want.compare_a and want.compare_b:
+            move = {"type": "compare", "a": want.compare_a, "b": want.compare_b}
+    elif mode == "compare_choice":
+        move = {"type": "diagram", "option": want.compare_option} if want.compare_option else None
+    elif mode == "tsar_decide":
+        if want.contradiction_choice:
+            move = {"type": "tsar_reply", "choice": want.contradiction_choice}
+    elif cur.challenger_choice and cur.challenger_choice not in GENERAL_CHALLENGER_OPTIONS:
+        if want.challenger_reason:
+            move = {"type": "challenge", "reason": want.challenger_reason}
+    else:
+        move = challenger_move(steps, cur, want, recorded)
+    if move is None and len(recorded) > len(steps) and recorded[len(steps)].role_switch:
+        move = {"type": "switch_roles"}
+    return move
+
+
+def challenger_move(steps, cur, want, recorded):
+    # Nothing is left unanswered when the challenger has the menu, so a
+    # recorded role switch is played as soon as it is the next step
+    if len(recorded) > len(steps) and recorded[len(steps)].role_switch:
+        return {"type": "switch_roles"}
+    # Ask, Compare and Tsar leave their fields on the step; play the ones
+    # the recorded step has and this one hasn't, its final choice last
+    asides = (
+        (ASK_OPTION, bool(want.question_text), bool(cur.question_text)),
+        (COMPARE_OPTION, bool(want.compare_a), bool(cur.compare_a)),
+        (TSAR_OPTION, want.tsar_called, cur.tsar_called),
+    )
+    for option, wanted, done in sorted(asides, key=lambda aside: aside[0] == want.challenger_choice):
+        wanted = wanted or option == want.challenger_choice
+        if wanted and not done and cur.challenger_choice != option:
+            return {"type": "challenge", "choice": option}
+    choice = want.challenger_choice
+    if not choice or choice == cur.challenger_choice or choice in (ASK_OPTION, COMPARE_OPTION, TSAR_OPTION):
+        return None
+    if choice in GENERAL_CHALLENGER_OPTIONS:
+        return {"type": "challenge", "choice": choice}
+    return {"type": "challenge", "choice": choice, "reason": want.challenger_reason}
+
+
+class Replay:
+    """One recorded debate played move by move, collecting problems."""
+
+    def __init__(self, record):
+        self.flipped = "1" if str(record.get("flipped", "0")) == "1" else "0"
+        self.steps = [build_step({})]
+        compute_role_labels(self.steps, self.flipped)
+        self.index = None
+        self.problems = {}  # kind -> first message
+        self.moves = record.get("moves")
+        if self.moves is None:
+            self.moves = self.rebuilt_moves(record.get("steps") or [])
+
+    def rebuilt_moves(self, packed):
+        """Moves that replay the recorded ``packed`` steps, worked out one
+        at a time from where the replay has got to."""
+        try:
+            recorded = [Step.from_dict(d) for d in packed]
+        except (TypeError, AttributeError) as e:
+            self.problems["bad_record"] = f"steps: {e}"
+            return
+        for _ in range(MOVES_PER_STEP * len(recorded)):
+            move = recorded_move(self.steps, recorded)
+            if move is None:
+                return
+            yield move
+
+    def problem(self, kind, k, message):
+        self.problems.setdefault(kind, f"move {k + 1}: {message}")
+
+    def run(self):
+        """Play the moves; returns how many were played, or None on a crash."""
+        played = 0
+        for k, move in enumerate(self.moves):
+            if not isinstance(move, dict):
+                self.problem("bad_move", k, "not a JSON object")
+                return k
+            try:
+                if not self.play(k, move):
+                    return k
+            except Exception as e:  # a rule change that crashes is a finding, not a reason to stop
+                self.problem("crashed", k, f"{type(e).__name__}: {e}")
+                return None
+            played = k + 1
+        return played
+
+    def play(self, k, move):
+        steps = self.steps
+        modes = [determine_turn_state(st)["mode"] for st in steps]
+        kind = move.get("type")
+        for i, mode in enumerate(modes):
+            if mode == "tsar_decide" and kind != "tsar_reply":
+                self.problem("tsar_unanswered", k, f"{kind!r} played while the Tsar on step {i} is unanswered")
+            elif mode == "need_reason" and kind == "switch_roles":
+                self.problem("why_hanging", k, f"roles switched while the Why? on step {i} has no reason")
+
+        # One engine per move, as in a request; only the index carries over
+        engine = DebateEngine(steps, self.flipped, index=self.index)
+        self.index = engine.index
+        try:
+            engine.apply(move)
+        except MoveError as e:
+            self.problem("rejected", k, str(e))
+            return False
+
+        active = engine.active_index()
+        expected = pick_active_index(steps)
+        if active != expected:
+            self.problem("active_step", k, f"TurnIndex picks step {active}, pick_active_index() step {expected}")
+        incremental = labels(steps)
+        current = current_role_labels(steps, self.flipped)
+        if compute_role_labels(steps, self.flipped) != current or labels(steps) != incremental:
+            self.problem("role_labels", k, "incremental role labels differ from compute_role_labels()")
+        return True
+
+
+def replay_record(record, save=False):
+    """Replay one parsed record; returns its result dict."""
+    replay = Replay(record)
+    played = replay.run()
+    result = {
+        "id": record.get("id"),
+        "moves": played or 0,
+        "steps": len(replay.steps),
+        "problems": replay.problems,
+    }
+    if played is not None:
+        packed = [pack_step(st) for st in replay.steps]
+        if "steps" in record:
+            diff = step_diff(record["steps"], packed)
+            if diff:
+                replay.problems["diverged"] = diff
+        if save:
+            result["saved"] = json.dumps(dict(record, steps=packed), separators=(",", ":"))
+    return result
+
+
+def replay_chunk(lines, save=False):
+    """Replay (line number, raw JSON line) pairs; runs in the worker processes."""
+    results = []
+    for lineno, line in lines:
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("not a JSON object")
+        except ValueError as e:
+            results.append({"line": lineno, "id": None, "moves": 0, "steps": 0,
+                            "problems": {"bad_record": str(e)}})
+            continue
+        results.append(dict(replay_record(record, save), line=lineno))
+    return results
+
+
+def read_chunks(path, size=CHUNK_SIZE):
+    chunk = []
+    with open(path, encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            if line.strip():
+                chunk.append((lineno, line))
+                if len(chunk) == size:
+                    yield chunk
+                    chunk = []
+    if chunk:
+        yield chunk
+
+
+def replay_file(path, workers=None, save=False, chunk_size=CHUNK_SIZE):
+    """Yield result dicts for every debate in ``path``, in file order.
+
+    With more than one worker, chunks go to a process pool; at most two
+    per worker are in flight, so a large archive is never read whole.
+    """
+    chunks = read_chunks(path, chunk_size)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in chunks:
+            yield from replay_chunk(chunk, save)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(replay_chunk, chunk, save))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+debates_cli = AppGroup("debates", help="Work with recorded debates.")
+
+
+@debates_cli.command("replay")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--workers", "-w", type=int, default=None,
+              help="Worker processes (default: one per CPU; 1 replays in this process).")
+@click.option("--save", type=click.Path(dir_okay=False),
+              help="Write each debate with its replayed steps here, to compare against later.")
+@click.option("--show", type=int, default=20, show_default=True,
+              help="How many problem debates to list.")
+def replay_command(path, workers, save, show):
+    """Replay the debates in a JSONL file and check the turn invariants."""
+    totals = Counter()
+    kinds = Counter()
+    shown = 0
+    out = open(save, "w", encoding="utf-8") if save else None
+    start = time.perf_counter()
+    try:
+        for result in replay_file(path, workers, save=bool(save)):
+            totals["debates"] += 1
+            totals["moves"] += result["moves"]
+            totals["steps"] += result["steps"]
+            if out is not None and "saved" in result:
+                out.write(result["saved"] + "\n")
+            if result["problems"]:
+                totals["failed"] += 1
+                kinds.update(result["problems"].keys())
+                if shown < show:
+                    shown += 1
+                    name = result["id"] or "(no id)"
+                    for kind, message in result["problems"].items():
+                        click.echo(f"line {result['line']} [{name}] {kind}: {message}")
+    finally:
+        if out is not None:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    rate = 1 / elapsed if elapsed else 0
+    click.echo(
+        f"{totals['debates']:,} debates, {totals['moves']:,} moves, {totals['steps']:,} steps "
+        f"in {elapsed:.2f}s ({totals['debates'] * rate:,.0f} debates/s, "
+        f"{totals['moves'] * rate:,.0f} moves/s)"
+    )
+    if kinds:
+        click.echo(f"{totals['failed']:,} debates with problems: "
+                   + ", ".join(f"{kind} {n:,}" for kind, n in kinds.most_common()))
+        raise SystemExit(1)
+    click.echo("All invariants held.")
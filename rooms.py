@@ -0,0 +1,106 @@
+"""Tournament rooms: named debates that judges and spectators can watch.
+
+A room is a stored debate plus a name and, optionally, the tournament it
+belongs to; its id is the debate's id. Players use the debate's pages
+(/debates/<id>?player=1|2). Spectators get a read-only page at
+/rooms/<id>, kept current by a stream of their own (see watch_event() in
+app.py).
+
+The registry is an SQLite table, in its own file (DEBATE_ROOMS_DB) so
+every worker shares it, or in memory with the memory store. In the
+second case each worker knows only the rooms it owns (see sharding.py),
+and the room list is gathered from all of them.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+MAX_NAME = 80
+
+
+class RoomError(ValueError):
+    """A room that can't be created as asked."""
+
+
+def clean_room_names(name, tournament=""):
+    """(name, tournament) with whitespace collapsed; raises RoomError if unusable."""
+    name, tournament = " ".join(name.split()), " ".join(tournament.split())
+    if not name:
+        raise RoomError("A room needs a name")
+    if len(name) > MAX_NAME or len(tournament) > MAX_NAME:
+        raise RoomError(f"Names are at most {MAX_NAME} characters")
+    return name, tournament
+
+
+class RoomRegistry:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rooms (
+            id         TEXT PRIMARY KEY,
+            name       TEXT NOT NULL,
+            tournament TEXT NOT NULL DEFAULT '',
+            created    REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS rooms_by_tournament ON rooms (tournament, created);
+    """
+    COLUMNS = ("id", "name", "tournament", "created")
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._conn as conn:
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+
+    @property
+    def _connection(self):
+        # Callers hold self._lock
+        if self._pid != os.getpid():  # forked by gunicorn --preload: reconnect
+            self._open()
+        return self._conn
+
+    def create(self, debate_id, name, tournament=""):
+        """Register a room for ``debate_id``; raises RoomError for a bad name."""
+        name, tournament = clean_room_names(name, tournament)
+        room = dict(zip(self.COLUMNS, (debate_id, name, tournament, time.time())))
+        with self._lock, self._connection as conn:
+            conn.execute("INSERT INTO rooms (id, name, tournament, created) VALUES (?, ?, ?, ?)",
+                         tuple(room.values()))
+        return room
+
+    def get(self, debate_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, name, tournament, created FROM rooms WHERE id = ?", (debate_id,)
+            ).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def list(self, tournament=None):
+        """Every room (of ``tournament``, if given), oldest first."""
+        sql = "SELECT id, name, tournament, created FROM rooms"
+        args = ()
+        if tournament is not None:
+            sql += " WHERE tournament = ?"
+            args = (tournament,)
+        with self._lock:
+            rows = self._connection.execute(sql + " ORDER BY created, id", args).fetchall()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    def delete(self, debate_id):
+        with self._lock, self._connection as conn:
+            conn.execute("DELETE FROM rooms WHERE id = ?", (debate_id,))
+
+
+def open_room_registry(path=None):
+    """The registry at DEBATE_ROOMS_DB, or an in-memory one for the memory store."""
+    path = path or os.environ.get("DEBATE_ROOMS_DB")
+    if not path:
+        kind = os.environ.get("DEBATE_STORE", "memory").lower()
+        path = ":memory:" if kind == "memory" else "rooms.sqlite3"
+    return RoomRegistry(path)
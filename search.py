@@ -0,0 +1,190 @@
+"""Full-text search over the steps of stored debates.
+
+Each step is one row of an SQLite FTS5 table (an inverted index), with a
+column per transcript field. save_debate() re-indexes the steps a move
+dirtied, so the index stays current without rescanning debates. Queries
+look like
+
+    sound                       any field contains "sound"
+    "because of being product"  a phrase
+    subject:sound reason:prod*  field filters; a trailing * matches a prefix
+    tsar:denied                 Tsars the defender denied
+
+and every term must match the same step. Results come newest-indexed
+first, which lets FTS5 stop after the first ``limit`` matches instead of
+ranking them all.
+
+The index lives in its own SQLite file (DEBATE_SEARCH_DB), so every
+worker process shares it. With the memory store it is kept in memory,
+one per worker, and /search gathers the results of every shard.
+"""
+import os
+import re
+import sqlite3
+import threading
+
+from debate_engine import TsarReply
+
+# Searchable column -> what it holds
+FIELDS = {
+    "subject":    "the consequence's subject",
+    "predicate":  "the consequence's predicate",
+    "reason":     "the consequence's reason",
+    "defender":   "the defender's answer",
+    "challenger": "the challenger's reply and its reason",
+    "question":   "an Ask question",
+    "answer":     "the answer to it",
+    "compare":    "the two compared terms",
+    "diagram":    "the diagram chosen for them",
+    "tsar":       '"called", then "admitted", "denied" or "pending"',
+}
+
+MAX_LIMIT = 500
+
+_TERM = re.compile(r'(?:([a-z]+):)?(?:"([^"]*)"|(\S+))')
+
+
+class QueryError(ValueError):
+    """A search query that can't be run."""
+
+
+def step_document(st):
+    """The searchable text of one step, by column (None for nothing to index)."""
+    if st.role_switch:
+        return None
+    tsar = ""
+    if st.tsar_called:
+        reply = {TsarReply.ADMIT: "admitted", TsarReply.DENY: "denied"}.get(st.contradiction_choice)
+        tsar = f"called {reply or 'pending'}"
+    doc = {
+        "subject": st.subject,
+        "predicate": st.predicate,
+        "reason": st.reason,
+        "defender": st.defender_choice,
+        "challenger": f"{st.challenger_choice} {st.challenger_reason}".strip(),
+        "question": st.question_text,
+        "answer": st.answer_text,
+        "compare": f"{st.compare_a} {st.compare_b}".strip(),
+        "diagram": st.compare_option,
+        "tsar": tsar,
+    }
+    return doc if any(doc.values()) else None
+
+
+def parse_query(query):
+    """Turn a search query into an FTS5 MATCH expression.
+
+    Every term is quoted, so nothing the user types is read as FTS5 syntax.
+    """
+    parts = []
+    for m in _TERM.finditer(query.strip()):
+        field, phrase, word = m.groups()
+        if field and field not in FIELDS:
+            raise QueryError(f"Unknown field {field!r}; use one of {', '.join(FIELDS)}")
+        text = phrase if phrase is not None else word
+        prefix = phrase is None and text.endswith("*")
+        text = text.rstrip("*") if prefix else text
+        if not text.strip():
+            continue
+        term = '"' + text.replace('"', '""') + '"' + (" *" if prefix else "")
+        parts.append(f"{field} : {term}" if field else term)
+    if not parts:
+        raise QueryError("Empty search")
+    return " AND ".join(parts)
+
+
+class SearchIndex:
+    SCHEMA = f"""
+        CREATE TABLE IF NOT EXISTS indexed_steps (
+            id        INTEGER PRIMARY KEY,
+            debate_id TEXT NOT NULL,
+            idx       INTEGER NOT NULL,
+            UNIQUE (debate_id, idx)
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS step_text USING fts5(
+            {", ".join(FIELDS)},
+            tokenize = 'unicode61 remove_diacritics 2'
+        );
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        # One connection per process: an in-memory database exists only on
+        # the connection that created it, and searches are short anyway.
+        self._pid = os.getpid()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._conn as conn:
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+
+    @property
+    def _connection(self):
+        # Callers hold self._lock
+        if self._pid != os.getpid():  # forked by gunicorn --preload: reconnect
+            self._open()
+        return self._conn
+
+    def update(self, debate_id, steps, dirty=None):
+        """Re-index ``dirty`` steps of a debate (all of them if None)."""
+        indices = range(len(steps)) if dirty is None else sorted(i for i in dirty if i < len(steps))
+        docs = [(i, step_document(steps[i])) for i in indices]
+        with self._lock, self._connection as conn:
+            for i, doc in docs:
+                row = conn.execute("SELECT id FROM indexed_steps WHERE debate_id = ? AND idx = ?",
+                                   (debate_id, i)).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM step_text WHERE rowid = ?", row)
+                if doc is None:
+                    continue
+                if row is None:
+                    row = (conn.execute("INSERT INTO indexed_steps (debate_id, idx) VALUES (?, ?)",
+                                        (debate_id, i)).lastrowid,)
+                conn.execute(f"INSERT INTO step_text (rowid, {', '.join(FIELDS)}) "
+                             f"VALUES (?{', ?' * len(FIELDS)})",
+                             (row[0], *(doc[f] for f in FIELDS)))
+            self._drop(conn, debate_id, len(steps))
+
+    def delete(self, debate_id):
+        with self._lock, self._connection as conn:
+            self._drop(conn, debate_id, 0)
+
+    def _drop(self, conn, debate_id, start):
+        rows = conn.execute("SELECT id FROM indexed_steps WHERE debate_id = ? AND idx >= ?",
+                            (debate_id, start)).fetchall()
+        if rows:
+            conn.executemany("DELETE FROM step_text WHERE rowid = ?", rows)
+            conn.executemany("DELETE FROM indexed_steps WHERE id = ?", rows)
+
+    def search(self, query, limit=50):
+        """Matching steps, newest indexed first: dicts of debate_id, step and
+        the step's non-empty fields. Raises QueryError for a bad query."""
+        match = parse_query(query)
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        sql = (f"SELECT s.debate_id, s.idx, {', '.join('t.' + f for f in FIELDS)} "
+               "FROM step_text t JOIN indexed_steps s ON s.id = t.rowid "
+               "WHERE step_text MATCH ? ORDER BY t.rowid DESC LIMIT ?")
+        try:
+            with self._lock:
+                rows = self._connection.execute(sql, (match, limit)).fetchall()
+        except sqlite3.OperationalError as e:
+            raise QueryError(str(e)) from None
+        return [
+            {"debate_id": row[0], "step": row[1],
+             "fields": {f: v for f, v in zip(FIELDS, row[2:]) if v}}
+            for row in rows
+        ]
+
+
+def open_search_index(path=None):
+    """The index at DEBATE_SEARCH_DB, or an in-memory one for the memory store."""
+    path = path or os.environ.get("DEBATE_SEARCH_DB")
+    if not path:
+        kind = os.environ.get("DEBATE_STORE", "memory").lower()
+        path = ":memory:" if kind == "memory" else "search.sqlite3"
+    return SearchIndex(path)
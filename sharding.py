@@ -0,0 +1,167 @@
+"""Debates sharded over gunicorn workers by consistent hashing.
+
+With more than one worker, every debate (and so every tournament room)
+belongs to one worker, its shard, picked by a hash ring over the debate
+id. Everything the app keeps per process then stays in one place: the
+memory store, the undo history, the derived indexes and the event
+streams. EventBroker stands in for a shared message broker: a debate's
+players and spectators all stream from its owner, so an in-process
+broker reaches every one of them, and each move is encoded once.
+
+A request for a debate that reaches another worker is forwarded to the
+owner over the owner's Unix socket, and the response (an event stream
+included) is passed back as it arrives. New debates get ids that hash
+to the worker creating them, so creating one never needs the extra hop.
+
+gunicorn.conf.py numbers the workers 0..n-1 (a restarted worker takes
+over the number of the one it replaces) and calls join() in each. Each
+shard has POINTS places on the ring, so adding a worker moves about
+1/n of the debates. With the memory store those are lost, so change the
+number of workers only between tournaments. With one worker (or under
+flask run) nothing is forwarded.
+"""
+import bisect
+import hashlib
+import http.client
+import json
+import os
+import socket
+from urllib.parse import quote
+
+from flask import Response, jsonify, request
+
+from debate_store import new_debate_id
+
+POINTS = 64
+
+# Set on requests one shard forwards to another, so they are never forwarded again
+FORWARDED = "X-Debate-Shard"
+
+# Headers that describe one connection, not the message
+HOP_BY_HOP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+    "transfer-encoding", "upgrade", FORWARDED.lower(),
+}
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing of keys onto nodes, POINTS places per node."""
+
+    def __init__(self, nodes, points=POINTS):
+        ring = sorted((_hash(f"{node}:{i}"), node) for node in nodes for i in range(points))
+        self._hashes = [h for h, _ in ring]
+        self._nodes = [node for _, node in ring]
+
+    def node_for(self, key):
+        i = bisect.bisect(self._hashes, _hash(key))
+        return self._nodes[i % len(self._nodes)]
+
+
+class Shards:
+    """Which shard this process is, and who owns what."""
+
+    def __init__(self):
+        self.index = 0
+        self.count = 1
+        self.socket_dir = None
+        self.ring = None
+
+    def join(self, index, count, socket_dir):
+        self.index, self.count, self.socket_dir = index, count, socket_dir
+        self.ring = HashRing(range(count)) if count > 1 else None
+
+    def owner(self, debate_id):
+        return self.ring.node_for(debate_id) if self.ring else 0
+
+    def new_id(self):
+        """A new debate id that this shard owns."""
+        while True:
+            debate_id = new_debate_id()
+            if self.owner(debate_id) == self.index:
+                return debate_id
+
+    def socket_path(self, index):
+        return os.path.join(self.socket_dir, f"shard-{index}.sock")
+
+
+shards = Shards()
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+def send(index, method, path, body=None, headers=()):
+    """Send one request to shard ``index``: (connection, response)."""
+    conn = _UnixConnection(shards.socket_path(index))
+    conn.request(method, path, body=body, headers=dict(headers, **{FORWARDED: str(shards.index)}))
+    return conn, conn.getresponse()
+
+
+def forward(index):
+    """Pass the current request to shard ``index`` and stream its response back."""
+    path = quote(request.script_root + request.path)
+    if request.query_string:
+        path += "?" + request.query_string.decode("latin-1")
+    headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP}
+    try:
+        conn, upstream = send(index, request.method, path, request.get_data(), headers)
+    except OSError:
+        return jsonify(error=f"Shard {index}, which holds this debate, is not answering"), 503
+
+    def body():
+        try:
+            while chunk := upstream.read1(65536):
+                yield chunk
+        finally:
+            conn.close()
+
+    return Response(body(), status=upstream.status,
+                    headers=[(k, v) for k, v in upstream.getheaders() if k.lower() not in HOP_BY_HOP])
+
+
+def gather(path):
+    """GET ``path`` (JSON) from every other shard; the shards that fail are skipped."""
+    results = []
+    for index in range(shards.count):
+        if index == shards.index:
+            continue
+        try:
+            conn, response = send(index, "GET", path)
+            try:
+                if response.status == 200:
+                    results.append(json.loads(response.read()))
+            finally:
+                conn.close()
+        except (OSError, ValueError):
+            continue
+    return results
+
+
+def _route():
+    if shards.count == 1 or FORWARDED in request.headers:
+        return None
+    debate_id = (request.view_args or {}).get("debate_id")
+    if debate_id is None and request.method == "POST" and request.endpoint == "debates.home":
+        request.get_data()  # keep the raw body for forwarding; form parsing reads the copy
+        debate_id = request.form.get("debate_id")
+    if not debate_id:
+        return None
+    owner = shards.owner(debate_id)
+    return None if owner == shards.index else forward(owner)
+
+
+def init_app(app):
+    """Forward requests for debates owned by another shard."""
+    app.before_request(_route)
@@ -0,0 +1,166 @@
+"""Local harness for two-device debates over Server-Sent Events.
+
+    python sse_harness.py                      # two players, 60 moves
+    python sse_harness.py --watchers 1000      # plus 1,000 extra open streams
+
+Serves the app with gevent's WSGI server on a free localhost port, the way
+the gevent gunicorn worker would. It then opens one event stream per player
+(plus --watchers more on the same debate) and plays a synthetic debate
+through the JSON API. Each move is made by the player whose turn it is,
+judging by the turn's player label.
+
+Every stream must see every move, in order and with the turn that the
+move's response reported. The harness prints the push latency (move
+posted -> event received) and exits non-zero on any mismatch.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import http.client  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import statistics  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+
+import gevent  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+from app import create_app  # noqa: E402
+from debate_engine import Step  # noqa: E402
+from synthetic import new_plan, next_move  # noqa: E402
+
+
+class Stream:
+    """One EventSource-like client, reading an event stream in a greenlet."""
+
+    def __init__(self, port, path, name):
+        self.name = name
+        self.events = []  # (rev, turn, received_at)
+        self.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        self.conn.request("GET", path, headers={"Accept": "text/event-stream"})
+        self.response = self.conn.getresponse()
+        assert self.response.status == 200, self.response.status
+        self.greenlet = gevent.spawn(self._read)
+
+    def _read(self):
+        event, data = "message", ""
+        while True:
+            line = self.response.readline()
+            if not line:
+                return
+            line = line.decode().rstrip("\n")
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = line[6:]
+            elif line == "":
+                if event == "move":
+                    payload = json.loads(data)
+                    self.events.append((payload["rev"], payload["turn"], time.perf_counter()))
+                elif event == "reload":
+                    self.events.append((json.loads(data)["rev"], "reload", time.perf_counter()))
+                event, data = "message", ""
+
+    def close(self):
+        self.greenlet.kill()
+        self.conn.close()
+
+
+def api(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    conn.close()
+    return response.status, data
+
+
+def run(moves=60, watchers=0, seed=0):
+    server = WSGIServer(("127.0.0.1", 0), create_app(), log=None)
+    server.start()
+    port = server.server_port
+    rng = random.Random(seed)
+    try:
+        status, created = api(port, "POST", "/api/debates", {})
+        assert status == 201, created
+        debate_id = created["debate_id"]
+        _, state = api(port, "GET", f"/api/debates/{debate_id}")
+        rev = 1
+
+        path = f"/debates/{debate_id}/events?rev={rev}"
+        players = {p: Stream(port, path, f"Player {p}") for p in ("1", "2")}
+        others = [Stream(port, path, f"watcher {n}") for n in range(watchers)]
+        streams = list(players.values()) + others
+        gevent.sleep(0.2)  # let every stream subscribe
+
+        steps = [Step.from_dict(d) for d in state["steps"]]
+        turn = state["turn"]
+        plans, sent = {}, []
+        for _ in range(moves):
+            i = turn["index"]
+            if i not in plans:
+                plans[i] = new_plan(rng)
+            mover = turn["player"].split(" ")[1]
+            move = next_move(rng, turn["mode"], steps[i], plans[i])
+            posted = time.perf_counter()
+            status, result = api(port, "POST", f"/api/debates/{debate_id}/moves", move)
+            assert status == 200, result
+            rev += 1
+            sent.append((rev, result["turn"], posted, mover))
+            for changed in result["changed"]:
+                steps[changed["index"]] = Step.from_dict(changed)
+            steps.extend(Step.from_dict(d) for d in result["appended"])
+            turn = result["turn"]
+
+        deadline = time.time() + 10
+        while time.time() < deadline and any(len(s.events) < len(sent) for s in streams):
+            gevent.sleep(0.05)
+
+        failures, latencies = 0, []
+        for stream in streams:
+            got = [(r, t) for r, t, _ in stream.events]
+            want = [(r, t) for r, t, _, _ in sent]
+            if got != want:
+                failures += 1
+                first = next((n for n, pair in enumerate(zip(got, want)) if pair[0] != pair[1]),
+                             min(len(got), len(want)))
+                print(f"{stream.name}: {len(got)} of {len(want)} events, first difference at "
+                      f"move {first}: got {got[first:first + 1]}, expected {want[first:first + 1]}",
+                      file=sys.stderr)
+                continue
+            latencies.extend(
+                (received - posted) * 1e3
+                for (_, _, received), (_, _, posted, _) in zip(stream.events, sent)
+            )
+        for stream in streams:
+            stream.close()
+
+        movers = {m for *_, m in sent}
+        print(f"{len(sent)} moves by players {sorted(movers)}, {len(streams)} streams")
+        if latencies:
+            latencies.sort()
+            print(f"push latency: median {statistics.median(latencies):.2f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms, "
+                  f"max {latencies[-1]:.2f} ms")
+        print("OK" if not failures else f"{failures} streams missed or reordered events")
+        return failures
+    finally:
+        server.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--moves", type=int, default=60)
+    parser.add_argument("--watchers", type=int, default=0,
+                        help="extra streams on the same debate")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    sys.exit(1 if run(args.moves, args.watchers, args.seed) else 0)
+
+
+if __name__ == "__main__":
+    main()
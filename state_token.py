@@ -0,0 +1,44 @@
+"""A debate carried by the page as one signed token (DEBATE_STORE=token).
+
+For deployments without server-side storage. Instead of a hidden input
+per field per step, the page posts back a single "state" field: the
+debate's steps (non-default fields only) and bookkeeping as compact JSON,
+zlib-compressed and signed by itsdangerous with SECRET_KEY. Any worker
+that shares the key can serve any request. A token whose fields were
+edited (say a flipped tsar_called) fails the signature check.
+
+The preface is left out because its textarea always posts it.
+"""
+from itsdangerous import BadSignature, URLSafeSerializer  # noqa: F401 (re-exported)
+
+from debate_engine import Step, compute_role_labels
+from debate_store import pack_step
+
+TOKEN_VERSION = 1
+
+
+class StateTokens:
+    def __init__(self, secret_key):
+        # URLSafeSerializer zlib-compresses the payload whenever that helps
+        self.serializer = URLSafeSerializer(secret_key, salt="debate-state")
+
+    def dumps(self, debate):
+        return self.serializer.dumps({
+            "v": TOKEN_VERSION,
+            "flipped": debate["flipped"],
+            "replay": debate.get("replay", []),
+            "panel": debate.get("panel", -1),
+            "steps": [pack_step(st) for st in debate["steps"]],
+        })
+
+    def loads(self, token):
+        """The debate in ``token``; raises BadSignature if it was tampered with."""
+        data = self.serializer.loads(token)
+        if not isinstance(data, dict) or data.get("v") != TOKEN_VERSION:
+            raise BadSignature("Unsupported state token")
+        steps = [Step.from_dict(d) for d in data["steps"]] or [Step().refresh()]
+        compute_role_labels(steps, data["flipped"])
+        return {
+            "steps": steps, "flipped": data["flipped"], "preface": "", "rev": 0,
+            "replay": data["replay"], "panel": data["panel"],
+        }
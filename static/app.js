@@ -0,0 +1,206 @@
+// Preserve scroll position across postbacks
+(function(){
+  const KEY = "debate-scrollY";
+  try{
+    const y = parseInt(localStorage.getItem(KEY), 10);
+    if (!isNaN(y)) { window.scrollTo(0, y); }
+  }catch(e){}
+  window.addEventListener('beforeunload', function(){
+    try{ localStorage.setItem(KEY, String(window.scrollY)); }catch(e){}
+  });
+})();
+
+// Venn previews for every compare select (cards and Turn Panel)
+function escapeSvg(t){
+  return String(t).replace(/[&<>"]/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;'}[c]));
+}
+function renderVenn(sel){
+  const box = document.getElementById(sel.dataset.venn);
+  if (!box) return;
+  const A = escapeSvg(sel.dataset.a || ""), B = escapeSvg(sel.dataset.b || "");
+  const clip = "left-" + sel.dataset.venn;
+  function svgWrap(inner){return `<svg width="520" height="320" viewBox="0 0 520 320" xmlns="http://www.w3.org/2000/svg"><rect x="1" y="1" width="518" height="318" rx="16" fill="#fff" stroke="#e7d9bd"/>${inner}</svg>`;}
+  function label(x,y,t,a='middle'){return `<text x="${x}" y="${y}" font-family="system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial" font-size="15" fill="#333" text-anchor="${a}">${t}</text>`;}
+  let svg="";
+  switch(sel.value){
+    case "Mutually inclusive": {const cx=260,cy=160,r=110; svg=svgWrap(`<circle cx="${cx}" cy="${cy}" r="${r}" fill="#FCE9B3" stroke="#E7C56A"/>${label(cx,cy-85, A+" = "+B)}${label(260,300,"All and only the same members")}`); break;}
+    case "Mutually exclusive": {const r=95,cy=165,l=170,rX=350,g=12; svg=svgWrap(`<circle cx="${l}" cy="${cy}" r="${r}" fill="#FFE2A0" stroke="#E7C56A"/><circle cx="${rX+g}" cy="${cy}" r="${r}" fill="#F6A9A6" stroke="#E7A4A0"/>${label(l,cy,A)}${label(rX+g,cy,B)}${label(260,300,"No overlap")}`); break;}
+    case "3 possibilities (down)": {const cx=260,cy=165,R=120,r=72; svg=svgWrap(`<circle cx="${cx}" cy="${cy}" r="${R}" fill="none" stroke="#E7A4A0" stroke-width="2"/><circle cx="${cx}" cy="${cy}" r="${r}" fill="#FFE2A0" stroke="#E7C56A"/>${label(cx,cy-90,B)}${label(cx,cy,A)}${label(260,300, A+" ⊂ "+B)}`); break;}
+    case "3 possibilities (up)": {const cx=260,cy=165,R=120,r=72; svg=svgWrap(`<circle cx="${cx}" cy="${cy}" r="${R}" fill="none" stroke="#E7C56A" stroke-width="2"/><circle cx="${cx}" cy="${cy}" r="${r}" fill="#F6A9A6" stroke="#E7A4A0"/>${label(cx,cy-90,A)}${label(cx,cy,B)}${label(260,300, B+" ⊂ "+A)}`); break;}
+    case "4 possibilities": {const cy=165,r=95,l=220,rX=300; const lf="#FFE2A0", rf="#F6A9A6", ov="#EFCF95"; svg=svgWrap(`<defs><clipPath id="${clip}"><circle cx="${l}" cy="${cy}" r="${r}"/></clipPath></defs><circle cx="${l}" cy="${cy}" r="${r}" fill="${lf}" stroke="#E7C56A"/><circle cx="${rX}" cy="${cy}" r="${r}" fill="${rf}" stroke="#E7A4A0"/><g clip-path="url(#${clip})"><circle cx="${rX}" cy="${cy}" r="${r}" fill="${ov}"/></g>${label(l-48,cy,A)}${label(rX+48,cy,B)}${label(260,300,"Partial overlap")}`); break;}
+    default: svg=svgWrap(`<text x="260" y="170" font-size="14" fill="#7b6a55" text-anchor="middle">Pick an option to preview…</text>`);
+  }
+  box.innerHTML = svg;
+}
+function initVenns(root){
+  root.querySelectorAll('select[data-venn]').forEach(renderVenn);
+}
+document.addEventListener('change', function(e){
+  if (e.target.matches && e.target.matches('select[data-venn]')) renderVenn(e.target);
+});
+initVenns(document);
+
+// Once the server holds the debate, post only what this move changed
+// and patch the returned cards in place instead of reloading the page.
+// On a player's own device (?player=1|2) the other player's moves
+// arrive over Server-Sent Events and are patched in the same way.
+(function(){
+  const form = document.getElementById('debateForm');
+  if (!form || !form.elements['debate_id'].value) return;
+  const debateId = form.elements['debate_id'].value;
+  const base = '/debates/' + encodeURIComponent(debateId);
+  const revInput = form.elements['rev'];
+  const me = form.dataset.player;
+  let bypass = false;
+
+  // Give the debate its own URL, so a reload or a restored tab comes back to it
+  if (location.pathname === '/' && window.history && history.replaceState){
+    history.replaceState(null, '', base);
+  }
+  function reloadPage(){ location.assign(base + location.search); }
+
+  function changed(el){
+    if (el.tagName === 'SELECT'){
+      return Array.from(el.options).some(o => o.selected !== o.defaultSelected);
+    }
+    return el.value !== el.defaultValue;
+  }
+  function stripUnchanged(){
+    const off = [];
+    for (const el of Array.from(form.elements)){
+      if (!el.name || el.disabled || el.type === 'submit') continue;
+      if (el.name === 'debate_id' || el.name === 'rev') continue;
+      if (!changed(el)){ el.disabled = true; off.push(el); }
+    }
+    return off;
+  }
+  function fragment(html){
+    const t = document.createElement('template');
+    t.innerHTML = html.trim();
+    return t.content;
+  }
+  function applyTurn(player){
+    if (!me) return;
+    const bar = document.getElementById('turnbar');
+    const mine = player.startsWith('Player ' + me + ' ');
+    bar.dataset.turnPlayer = player;
+    for (const el of bar.querySelectorAll('input, select, textarea, button')){
+      if (el.name === 'generate_transcript' || el.name === 'close_transcript') continue;
+      el.disabled = !mine;
+    }
+    const inner = bar.querySelector('.inner');
+    if (!mine && inner){
+      const note = document.createElement('div');
+      note.className = 'hint';
+      note.textContent = 'Waiting for ' + player + '…';
+      inner.prepend(note);
+    }
+  }
+  function patch(data){
+    const stack = document.getElementById('steps');
+    for (const [i, html] of data.cards){
+      const frag = fragment(html);
+      const old = document.getElementById('step-' + i);
+      if (old) old.replaceWith(frag); else stack.appendChild(frag);
+    }
+    const bar = document.getElementById('turnbar');
+    bar.replaceChildren(fragment(data.turnbar));
+    form.elements['step_count'].value = data.step_count;
+    form.elements['step_count'].defaultValue = String(data.step_count);
+    const preface = form.elements['preface_text'];
+    preface.defaultValue = preface.value;
+    revInput.value = revInput.defaultValue = String(data.rev);
+    initVenns(document);
+    applyTurn(data.turn.player);
+  }
+  function currentRev(){ return parseInt(revInput.value, 10) || 0; }
+  function fallback(submitter){
+    bypass = true;
+    if (form.requestSubmit) form.requestSubmit(submitter || undefined); else form.submit();
+  }
+
+  form.addEventListener('submit', function(e){
+    if (bypass){ stripUnchanged(); return; }
+    if (!window.fetch) { stripUnchanged(); return; }
+    // Undo, Redo and branch buttons post to their own route and reload
+    if (e.submitter && e.submitter.hasAttribute('formaction')) { stripUnchanged(); return; }
+    e.preventDefault();
+    const submitter = e.submitter;
+    const off = stripUnchanged();
+    let body;
+    try{
+      body = new FormData(form, submitter);
+    }catch(err){
+      body = new FormData(form);
+      if (submitter && submitter.name) body.append(submitter.name, submitter.value);
+    }
+    off.forEach(el => { el.disabled = false; });
+
+    fetch(base + '/fragments', {method:'POST', body:body})
+      .then(r => {
+        if (r.status === 409) { reloadPage(); return null; }
+        if (!r.ok) throw new Error(r.status);
+        return r.json();
+      })
+      .then(data => { if (data && data.rev >= currentRev()) patch(data); })
+      .catch(() => fallback(submitter));
+  });
+
+  if (me){
+    applyTurn(document.getElementById('turnbar').dataset.turnPlayer || '');
+    if (window.EventSource){
+      const events = new EventSource(base + '/events?rev=' + currentRev());
+      events.addEventListener('move', function(e){
+        const data = JSON.parse(e.data);
+        if (data.rev > currentRev()) patch(data);
+      });
+      events.addEventListener('reload', reloadPage);
+    }
+  }
+})();
+
+// A spectator's page (/rooms/<id>): patch in the cards each move changes
+(function(){
+  const watch = document.getElementById('watch');
+  if (!watch || !window.EventSource) return;
+  let rev = parseInt(watch.dataset.rev, 10) || 0;
+  function fragment(html){
+    const t = document.createElement('template');
+    t.innerHTML = html.trim();
+    return t.content;
+  }
+  const events = new EventSource(watch.dataset.events);
+  events.addEventListener('move', function(e){
+    const data = JSON.parse(e.data);
+    if (data.rev <= rev) return;
+    rev = data.rev;
+    const stack = document.getElementById('steps');
+    for (const [i, html] of data.cards){
+      const old = document.getElementById('step-' + i);
+      if (old) old.replaceWith(fragment(html)); else stack.appendChild(fragment(html));
+    }
+    for (const card of stack.querySelectorAll('.watch-card.current')){
+      if (card.id !== 'step-' + data.turn.index) card.classList.remove('current');
+    }
+    document.getElementById('turnbar').replaceChildren(fragment(data.status));
+  });
+  events.addEventListener('reload', () => location.reload());
+})();
+
+// Transcript copy + toast (if transcript is present)
+function copyTranscript(){
+  const el = document.getElementById('transcriptText');
+  if(!el) return;
+  const text = el.innerText || el.textContent || "";
+  const toast = document.getElementById('toast');
+  function showToast(){ toast.classList.add('show'); setTimeout(()=>toast.classList.remove('show'), 1400); }
+  if (navigator.clipboard && navigator.clipboard.writeText){
+    navigator.clipboard.writeText(text).then(showToast).catch(fallback);
+  } else { fallback(); }
+  function fallback(){
+    const range=document.createRange(), sel=window.getSelection();
+    range.selectNodeContents(el); sel.removeAllRanges(); sel.addRange(range);
+    try{ document.execCommand('copy'); }catch(e){}
+    sel.removeAllRanges(); showToast();
+  }
+}
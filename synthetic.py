@@ -0,0 +1,132 @@
+"""Synthetic debates for benchmarks and load tests.
+
+synthetic_debate() plays a debate through DebateEngine, so every step it
+produces is one the app itself could have reached. Each consequence
+follows one of the SCENARIOS below, picked at random.
+"""
+import random
+
+from debate_engine import (
+    ASK_OPTION, COMPARE_CHOICES, COMPARE_OPTION, GENERAL_CHALLENGER_OPTIONS, NEW_CONSEQ_OPT,
+    TSAR_OPTION, DebateEngine, DefenderChoice, TsarReply, build_step, compute_role_labels,
+)
+
+TERMS = (
+    "sound", "a pot", "a pillar", "space", "a product", "a functional thing",
+    "an existent", "an object of knowledge", "a person", "the color of a white conch",
+    "a consciousness", "a table", "red", "white", "a sprout", "a seed",
+)
+QUALITIES = (
+    "impermanent", "permanent", "a product", "a functional thing", "a color",
+    "matter", "a phenomenon", "an established base", "momentary", "made by causes",
+)
+QUESTIONS = (
+    "What is the definition of a functional thing?",
+    "Is there a common locus of the two?",
+    "Does it arise from causes and conditions?",
+)
+ANSWERS = (
+    "That which is able to perform a function.",
+    "Yes, there is one.",
+    "It does.",
+)
+
+# Weighted mix of what happens to each consequence
+SCENARIOS = (
+    ("accept", 3),
+    ("why", 2),
+    ("reason_not_established", 3),
+    ("no_pervasion", 3),
+    ("ask", 2),
+    ("compare", 2),
+    ("tsar", 1),
+    ("switch_roles", 1),
+)
+
+
+def synthetic_debate(n_steps, seed=0, flipped="0"):
+    """Play a debate until it has ``n_steps`` steps and return them, labelled."""
+    rng = random.Random(seed)
+    steps = [build_step({})]
+    compute_role_labels(steps, flipped)
+    index = None
+    plans = {}
+
+    while len(steps) < n_steps:
+        # One engine per move, as in a request; only the index carries over
+        engine = DebateEngine(steps, flipped, index=index)
+        index = engine.index
+        state = engine.turn_state()
+        i = state["index"]
+        st = steps[i]
+        if i not in plans:
+            plans[i] = new_plan(rng)
+        engine.apply(next_move(rng, state["mode"], st, plans[i]))
+
+    del steps[n_steps:]
+    return steps
+
+
+def new_plan(rng):
+    """Pick the scenario one consequence will follow."""
+    names = [name for name, _ in SCENARIOS]
+    weights = [weight for _, weight in SCENARIOS]
+    return {"scenario": rng.choices(names, weights)[0], "done": False}
+
+
+def next_move(rng, mode, st, plan):
+    """The move that continues ``plan`` for step ``st`` in turn ``mode``."""
+    scenario = plan["scenario"]
+
+    if mode == "new_consequence":
+        return {
+            "type": "consequence",
+            "subject": rng.choice(TERMS),
+            "copula": "is",
+            "predicate": rng.choice(QUALITIES),
+            "reason": "" if scenario == "why" else rng.choice(QUALITIES),
+        }
+
+    if mode == "defender_choice":
+        if scenario == "why" and not st.reason:
+            choice = DefenderChoice.WHY
+        elif scenario == "reason_not_established":
+            choice = DefenderChoice.REASON_NOT_ESTABLISHED
+        elif scenario == "no_pervasion":
+            choice = DefenderChoice.NO_PERVASION
+        else:
+            choice = DefenderChoice.ACCEPT
+        return {"type": "respond", "choice": choice}
+
+    if mode == "need_reason":
+        return {"type": "complete_reason", "reason": rng.choice(QUALITIES)}
+    if mode == "ask_question":
+        return {"type": "ask", "question": rng.choice(QUESTIONS)}
+    if mode == "answer_question":
+        return {"type": "answer", "answer": rng.choice(ANSWERS)}
+    if mode == "compare_names":
+        a, b = rng.sample(TERMS, 2)
+        return {"type": "compare", "a": a, "b": b}
+    if mode == "compare_choice":
+        return {"type": "diagram", "option": rng.choice(COMPARE_CHOICES)}
+    if mode == "tsar_decide":
+        return {"type": "tsar_reply", "choice": rng.choice(tuple(TsarReply))}
+
+    # challenger_menu
+    if st.challenger_choice and st.challenger_choice not in GENERAL_CHALLENGER_OPTIONS:
+        # A reasoning reply that still needs its "because of being …"
+        return {"type": "challenge", "reason": rng.choice(QUALITIES)}
+    if not plan["done"]:
+        plan["done"] = True
+        if scenario in ("reason_not_established", "no_pervasion"):
+            return {"type": "challenge", "choice": rng.choice(st.challenger_options[:2]),
+                    "reason": rng.choice(QUALITIES)}
+        if scenario == "ask":
+            return {"type": "challenge", "choice": ASK_OPTION}
+        if scenario == "compare":
+            return {"type": "challenge", "choice": COMPARE_OPTION}
+        if scenario == "tsar":
+            return {"type": "challenge", "choice": TSAR_OPTION}
+        if scenario == "switch_roles":
+            return {"type": "switch_roles"}
+    return {"type": "challenge", "choice": NEW_CONSEQ_OPT}
@@ -0,0 +1,76 @@
+"""Property test: TurnIndex.active() agrees with a full rescan.
+
+    python -m pytest test_turn_index.py
+
+Each debate is a synthetic one (see synthetic.py) of random length with
+a TurnIndex built over it. Random edits are then applied the way a
+form post applies them: one field of one step is set to a value that
+field holds somewhere in the debate (or cleared), the step is rebuilt
+with build_step() and re-filed with TurnIndex.update(). Now and then a
+fresh step is appended instead. After every edit the index's answer must
+match reference_active_index(), and so must pick_active_index()'s.
+
+reference_active_index() is pick_active_index() as it was before the
+replay command made it a single pass: one scan from the end per turn
+mode. It is frozen here so that neither faster version checks itself.
+"""
+import random
+
+import pytest
+
+from debate_engine import (
+    STEP_FIELDS, TURN_PRIORITY, TurnIndex, build_step, determine_turn_state, pick_active_index,
+)
+from synthetic import synthetic_debate
+
+DEBATES = 100
+EDITS = 200
+
+
+def reference_active_index(steps):
+    for mode in TURN_PRIORITY:
+        for i in range(len(steps) - 1, -1, -1):
+            if determine_turn_state(steps[i])["mode"] == mode:
+                return i
+    for i in range(len(steps) - 1, -1, -1):
+        if determine_turn_state(steps[i])["mode"] != "role_flip_marker":
+            return i
+    return max(0, len(steps) - 1)
+
+
+def field_values(steps):
+    """{field: the values it takes in ``steps``, plus its default}."""
+    values = {field: {default} for field, default in STEP_FIELDS.items()}
+    for st in steps:
+        for field, value in st.form_fields().items():
+            values[field].add(value)
+    return {field: sorted(vals) for field, vals in values.items()}
+
+
+@pytest.mark.parametrize("seed", range(DEBATES))
+def test_turn_index_matches_rescan(seed):
+    rng = random.Random(seed)
+    steps = synthetic_debate(rng.randint(1, 60), seed=seed)
+    values = field_values(steps)
+    index = TurnIndex(steps)
+    assert index.active() == pick_active_index(steps) == reference_active_index(steps)
+    for n in range(EDITS):
+        if rng.random() < 0.05:
+            steps.append(build_step({}))
+            i, what = len(steps) - 1, "appended a step"
+        else:
+            i = rng.randrange(len(steps))
+            field = rng.choice(tuple(STEP_FIELDS))
+            fields = steps[i].form_fields()
+            fields[field] = rng.choice(values[field])
+            steps[i] = build_step(fields)
+            what = f"set {field}_{i} = {str(fields[field])!r}"
+        index.update(i)
+        want = reference_active_index(steps)
+        assert index.active() == want, f"edit {n} ({what}): TurnIndex.active()"
+        assert pick_active_index(steps) == want, f"edit {n} ({what}): pick_active_index()"
+
+
+def test_only_role_switches():
+    steps = [build_step({"role_switch": "1"}), build_step({"role_switch": "1"})]
+    assert TurnIndex(steps).active() == pick_active_index(steps) == reference_active_index(steps) == 1
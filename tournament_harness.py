@@ -0,0 +1,189 @@
+"""Load test for tournament rooms: how many rooms and spectators one node holds.
+
+    python tournament_harness.py                                # 10, 25, 50 rooms x 20 spectators
+    python tournament_harness.py --rooms 50,100 --spectators 10,40 --moves 15
+    python tournament_harness.py --port 8000 --rooms 20         # a running server
+
+Runs stages of growing size, each one a fresh set of rooms. In a stage
+every room is created through /api/rooms and gets its two players'
+streams plus --spectators spectator streams (/rooms/<id>/events). The
+rooms are then played at once, one greenlet per room making a move every
+--interval seconds (with jitter) through the JSON API, as in
+sse_harness.py.
+
+Every stream must see every move of its room, in order and with the turn
+the move's response reported (spectators get the turn without the hints
+for the players). A stage holds if no stream misses or
+reorders an event and the p99 push latency (move posted -> event
+received, over all streams) stays under --p99. The harness prints a
+line per stage and the largest stage that held, and stops at the first
+that doesn't (or that can't connect every stream).
+
+Without --port the app is served in this process with gevent's WSGI
+server, like one gevent gunicorn worker, so the client and the server
+share the CPU: the figures are a lower bound for a node. Against a
+gunicorn with several workers, streams reaching a worker that doesn't
+own the room are forwarded (see sharding.py) and count against both
+workers' worker_connections.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import random  # noqa: E402
+import resource  # noqa: E402
+import statistics  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+
+import gevent  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+from debate_engine import Step  # noqa: E402
+from sse_harness import Stream, api  # noqa: E402
+from synthetic import new_plan, next_move  # noqa: E402
+
+
+def play(port, debate_id, moves, interval, rng, sent):
+    """Play ``moves`` moves in one room, recording (rev, turn, posted_at) in ``sent``."""
+    _, state = api(port, "GET", f"/api/debates/{debate_id}")
+    steps = [Step.from_dict(d) for d in state["steps"]]
+    turn = state["turn"]
+    rev, plans = 1, {}
+    for _ in range(moves):
+        gevent.sleep(interval * rng.uniform(0.5, 1.5))
+        i = turn["index"]
+        if i not in plans:
+            plans[i] = new_plan(rng)
+        move = next_move(rng, turn["mode"], steps[i], plans[i])
+        posted = time.perf_counter()
+        status, result = api(port, "POST", f"/api/debates/{debate_id}/moves", move)
+        assert status == 200, result
+        rev += 1
+        sent.append((rev, result["turn"], posted))
+        for changed in result["changed"]:
+            steps[changed["index"]] = Step.from_dict(changed)
+        steps.extend(Step.from_dict(d) for d in result["appended"])
+        turn = result["turn"]
+
+
+def seen(events):
+    return [(rev, turn) if turn == "reload" else (rev, turn["index"], turn["mode"], turn["player"])
+            for rev, turn, _ in events]
+
+
+def run_stage(port, rooms, spectators, moves, interval, rng):
+    """One stage: (streams, moves made, latencies in ms, streams that failed)."""
+    tournament = f"load {rooms}x{spectators} {rng.getrandbits(32):08x}"
+    ids = []
+    for n in range(rooms):
+        status, room = api(port, "POST", "/api/rooms", {"name": f"Table {n + 1}", "tournament": tournament})
+        assert status == 201, room
+        ids.append(room["id"])
+
+    streams = {}
+    for debate_id in ids:
+        streams[debate_id] = [Stream(port, f"/debates/{debate_id}/events?rev=1", f"{debate_id} Player {p}")
+                              for p in (1, 2)]
+        streams[debate_id] += [Stream(port, f"/rooms/{debate_id}/events?rev=1", f"{debate_id} spectator {n}")
+                               for n in range(spectators)]
+    gevent.sleep(0.5)  # let every stream subscribe
+
+    sent = {debate_id: [] for debate_id in ids}
+    players = [gevent.spawn(play, port, debate_id, moves, interval, random.Random(rng.random()),
+                            sent[debate_id]) for debate_id in ids]
+    gevent.joinall(players, raise_error=True)
+
+    deadline = time.time() + 10
+    while time.time() < deadline and any(
+        len(s.events) < len(sent[debate_id]) for debate_id, room in streams.items() for s in room
+    ):
+        gevent.sleep(0.05)
+
+    failures, latencies = 0, []
+    for debate_id, room in streams.items():
+        want = seen(sent[debate_id])
+        for stream in room:
+            if seen(stream.events) != want:
+                failures += 1
+                continue
+            latencies.extend((received - posted) * 1e3
+                             for (_, _, received), (_, _, posted) in zip(stream.events, sent[debate_id]))
+    for room in streams.values():
+        for stream in room:
+            stream.close()
+    return sum(map(len, streams.values())), sum(map(len, sent.values())), latencies, failures
+
+
+def percentile(values, q):
+    return values[max(int(len(values) * q) - 1, 0)]
+
+
+def run(port, stages, moves, interval, p99_limit, seed=0, in_process=True):
+    rng = random.Random(seed)
+    held = None
+    print(f"{'rooms':>5} {'spect/room':>10} {'streams':>7} {'moves':>5} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'max ms':>7} {'failed':>6} {'maxrss MB':>9}")
+    for rooms, spectators in stages:
+        try:
+            streams, made, latencies, failures = run_stage(port, rooms, spectators, moves, interval, rng)
+        except (OSError, AssertionError) as e:  # refused, timed out, or an error status
+            print(f"{rooms:>5} {spectators:>10} failed: {e!r}")
+            break
+        latencies.sort()
+        p50 = statistics.median(latencies) if latencies else float("nan")
+        p99 = percentile(latencies, 0.99) if latencies else float("nan")
+        top = latencies[-1] if latencies else float("nan")
+        # ru_maxrss is in kB; the server's memory only when it runs in this process
+        rss = f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}" if in_process else "-"
+        print(f"{rooms:>5} {spectators:>10} {streams:>7} {made:>5} "
+              f"{p50:>7.1f} {p99:>7.1f} {top:>7.1f} {failures:>6} {rss:>9}")
+        if failures or not p99 < p99_limit:
+            break
+        held = (rooms, spectators, streams)
+    if held:
+        print(f"held: {held[0]} rooms x {held[1]} spectators ({held[2]} streams), "
+              f"p99 under {p99_limit:g} ms")
+    else:
+        print(f"no stage held with p99 under {p99_limit:g} ms")
+    return held
+
+
+def sizes(text):
+    return [int(n) for n in text.split(",")]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rooms", type=sizes, default=[10, 25, 50],
+                        help="comma-separated room counts, one stage each")
+    parser.add_argument("--spectators", type=sizes, default=[20],
+                        help="comma-separated spectators per room; every pair with --rooms is a stage")
+    parser.add_argument("--moves", type=int, default=20, help="moves played in each room")
+    parser.add_argument("--interval", type=float, default=0.5,
+                        help="mean seconds between a room's moves")
+    parser.add_argument("--p99", type=float, default=250.0, help="push latency limit, ms")
+    parser.add_argument("--port", type=int, help="test a server already running on this port")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    stages = sorted(((r, s) for r in args.rooms for s in args.spectators),
+                    key=lambda stage: stage[0] * (stage[1] + 2))
+
+    server = None
+    port = args.port
+    if port is None:
+        from app import create_app
+        server = WSGIServer(("127.0.0.1", 0), create_app(), log=None)
+        server.start()
+        port = server.server_port
+    try:
+        held = run(port, stages, args.moves, args.interval, args.p99, args.seed, server is not None)
+    finally:
+        if server is not None:
+            server.stop()
+    sys.exit(0 if held else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Plain-text transcripts of a debate.
+
+make_transcript() renders from scratch; TranscriptCache keeps each step's
+lines between moves so only changed or relabelled steps are rendered again.
+"""
+from debate_engine import ASK_OPTION, TSAR_OPTION
+
+
+def preface_lines(preface):
+    if not preface.strip():
+        return []
+    return ["Preface / Discussion Summary:", preface.strip(), ""]
+
+
+def step_lines(idx, st):
+    """The transcript lines for step number ``idx`` (1-based)."""
+    lines = []
+
+    # Role-switch marker line
+    if st.role_switch:
+        lines.append(f"— Roles switched: From here on, {st.switch_to_cha} and {st.switch_to_def}.")
+        return lines
+
+    cha = st.cha_label
+    deff = st.def_label
+
+    # Consequence
+    if st.subject and st.predicate and st.reason:
+        lines.append(f"{idx}. It follows that {st.subject} {st.copula} "
+                     f"{st.predicate}, because of being {st.reason}.")
+    elif st.subject and st.predicate and not st.reason:
+        lines.append(f"{idx}. It follows that {st.subject} {st.copula} {st.predicate} (reason pending).")
+
+    # Defender response
+    if st.defender_choice:
+        lines.append(f"   {deff}: {st.defender_choice}")
+
+    # Why? pending
+    if st.need_reason and not st.reason:
+        lines.append(f"   {cha}: (awaiting completion of the reason)")
+
+    # Ask — persist regardless of later moves
+    if st.question_text or st.answer_text:
+        if st.question_text:
+            lines.append(f"   {cha} — Question: {st.question_text}")
+        if st.answer_text:
+            lines.append(f"   {deff} — Answer: {st.answer_text}")
+
+    # Generic challenger follow-ups (not Tsar/Ask)
+    if st.challenger_choice and st.challenger_choice not in (TSAR_OPTION, ASK_OPTION):
+        msg = st.challenger_choice
+        if st.challenger_reason:
+            msg += f" — because of being {st.challenger_reason}"
+        lines.append(f"   {cha}: {msg}")
+
+    # Compare — persist regardless of later moves
+    if st.compare_a or st.compare_b:
+        lines.append(f"   {cha} — Compare: "
+                     f"What is the relationship between {st.compare_a} and {st.compare_b}?")
+    if st.compare_option:
+        lines.append(f"   {deff} — Diagram choice: {st.compare_option}")
+
+    # Tsar — persist regardless of later moves
+    if st.tsar_called or st.challenger_choice == TSAR_OPTION or st.contradiction_choice:
+        lines.append(f"   {cha}: Tsar! You contradicted yourself.")
+        if st.contradiction_choice:
+            lines.append(f"   {deff}: {st.contradiction_choice}")
+
+    return lines
+
+
+def make_transcript(steps, preface=""):
+    lines = preface_lines(preface)
+    for idx, st in enumerate(steps, 1):
+        lines.extend(step_lines(idx, st))
+    return lines
+
+
+class TranscriptCache:
+    """Per-step transcript lines for one debate, reused across moves.
+
+    An entry stays valid while it belongs to the same Step object, the
+    step hasn't been reported changed via invalidate(), and its role labels
+    are unchanged (a role switch relabels every later step). Steps are
+    only ever appended, so cached "N." numbering never shifts.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def invalidate(self, indices):
+        for i in indices:
+            if i < len(self.entries):
+                self.entries[i] = None
+
+    def step_lines(self, steps):
+        """Yield each step's lines, rendering only stale entries."""
+        entries = self.entries
+        for i, st in enumerate(steps):
+            entry = entries[i] if i < len(entries) else None
+            if entry is None or entry[0] is not st or entry[1] != st.cha_label \
+                    or entry[2] != st.switch_to_cha:
+                entry = (st, st.cha_label, st.switch_to_cha, step_lines(i + 1, st))
+                if i < len(entries):
+                    entries[i] = entry
+                else:
+                    entries.append(entry)
+            yield entry[3]
+        del entries[len(steps):]
+
+    def lines(self, steps, preface=""):
+        lines = preface_lines(preface)
+        for chunk in self.step_lines(steps):
+            lines.extend(chunk)
+        return lines